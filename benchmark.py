@@ -0,0 +1,355 @@
+"""
+ Benchmarks of the main LoadGenome stages on synthetic ERCOT-like inputs of configurable size.
+ Results are saved as JSON (one file per run, tagged with the git commit) for comparison between commits.
+ Options are described at bottom of script
+"""
+
+import json
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from load_profile import (
+    generate_16_region_load_profiles,
+    load_by_16_region,
+    percentage_of_whole_for_each,
+    read_ercot_load_profile,
+    write_outputs,
+)
+from pyramid import write_scenario_pyramids
+from summary import write_scenario_summaries
+
+CDR_ZONES = ["COAST", "EAST", "FWEST", "NORTH", "NCENT", "SOUTH", "SCENT", "WEST"]
+
+# ERCOT column names as found in the input spreadsheets
+ERCOT_COLUMNS = {
+    "COAST": "COAST",
+    "EAST": "EAST",
+    "FWEST": "FAR_WEST",
+    "NORTH": "NORTH",
+    "NCENT": "NORTH_C",
+    "SOUTH": "SOUTHERN",
+    "SCENT": "SOUTH_C",
+    "WEST": "WEST",
+}
+
+
+def synthetic_load_profile(n_hours=8760, year=2019, seed=0):
+    """Returns a load profile in the format of read_ercot_load_profile, with n_hours
+    evenly spaced intervals over a (non leap) year labeled like ERCOT's hour ending labels
+
+    Args:
+        n_hours (int): number of intervals, e.g. 8760 (hourly) or 35040 (15 minute)
+        year (int): year of profile
+        seed (int): random seed
+
+    Returns:
+        pandas.DataFrame: "Hour Ending" column and one column per cdr zone
+    """
+    rng = np.random.default_rng(seed)
+    hour_ending = pd.date_range(
+        pd.Timestamp(year=year, month=1, day=1),
+        periods=n_hours + 1,
+        freq=pd.Timedelta(days=365) / n_hours,
+    )[1:]
+
+    # ERCOT labels midnight as 24:00 of the previous day
+    midnight = (hour_ending.hour == 0) & (hour_ending.minute == 0)
+    labels = np.where(
+        midnight,
+        (hour_ending - pd.Timedelta(days=1)).strftime("%m/%d/%Y 24:00"),
+        hour_ending.strftime("%m/%d/%Y %H:%M"),
+    )
+
+    hours = np.arange(n_hours) * 8760 / n_hours
+    shape = (
+        1
+        + 0.3 * np.sin(2 * np.pi * (hours / 24 - 0.3))
+        + 0.2 * np.cos(2 * np.pi * (hours / 8760 - 0.55))
+    )
+    df = pd.DataFrame({"Hour Ending": labels})
+    for zone_number, zone in enumerate(CDR_ZONES):
+        df[zone] = (1000 + 2000 * zone_number) * shape * rng.uniform(
+            0.95, 1.05, n_hours
+        )
+
+    return df
+
+
+def synthetic_county_population_data(
+    n_counties=250, n_regions=16, years=range(1997, 2022), seed=0
+):
+    """Returns county population data in the format of read_county_population_data
+
+    Args:
+        n_counties (int): number of counties (or other geographies)
+        n_regions (int): number of model regions
+        years (list): population years
+        seed (int): random seed
+
+    Returns:
+        pandas.DataFrame: county, fips, cdr_zone, model_region and one population column per year
+    """
+    rng = np.random.default_rng(seed)
+    # every cdr zone and model region has at least one county
+    cdr_zones = np.resize(CDR_ZONES, n_counties)
+    model_regions = np.resize(np.arange(1, n_regions + 1), n_counties)
+    rng.shuffle(model_regions)
+
+    df = pd.DataFrame(
+        {
+            "county": [f"county_{number}" for number in range(n_counties)],
+            "fips": 48001 + 2 * np.arange(n_counties),
+            "cdr_zone": cdr_zones,
+            "model_region": [f"{region}_region{region}" for region in model_regions],
+        }
+    )
+    population = rng.lognormal(10, 1.5, n_counties)
+    growth = rng.normal(1.01, 0.01, n_counties)
+    for year_number, year in enumerate(years):
+        df[str(year)] = np.round(population * growth**year_number)
+
+    return df
+
+
+def synthetic_ev_loads(n_hours=24, model_years=range(2015, 2051)):
+    """Returns EV loads in the format of ev_extra_loads.csv with n_hours rows"""
+    hours = np.arange(n_hours) * 24 / n_hours
+    shape = 1 + np.cos(2 * np.pi * (hours - 1) / 24)
+    df = pd.DataFrame({"Hour": np.arange(n_hours)})
+    for year_number, year in enumerate(model_years):
+        df[str(year)] = 800 * year_number * shape
+
+    return df
+
+
+# default input size, matching the current ERCOT inputs
+DEFAULT_SIZE = {
+    "n_hours": 8760,
+    "n_counties": 250,
+    "n_regions": 16,
+    "n_model_years": 2,
+    "n_weather_years": 1,
+}
+
+
+def measure(function, repeats=3):
+    """Returns result of function, best wall time of repeats (in seconds) and peak
+    memory allocated during one call (in bytes, from tracemalloc)"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, min(times), peak
+
+
+def benchmark_size(
+    n_hours=8760,
+    n_counties=250,
+    n_regions=16,
+    n_model_years=2,
+    n_weather_years=1,
+    repeats=3,
+    include_excel=False,
+):
+    """Times each stage for one input size
+
+    Args:
+        n_hours (int): intervals per year
+        n_counties (int): number of counties
+        n_regions (int): number of model regions
+        n_model_years (int): number of model years per weather year
+        n_weather_years (int): number of base profiles
+        repeats (int): timing repeats, the best is kept
+        include_excel (bool): also time read_ercot_load_profile on a synthetic spreadsheet (slow to write)
+
+    Returns:
+        list: dict of stage, seconds and peak_bytes for each stage
+    """
+    base_year = "2019"
+    model_years = list(range(2021, 2021 + n_model_years))
+    county_population_data = synthetic_county_population_data(n_counties, n_regions)
+    ev_loads = synthetic_ev_loads(24 if n_hours == 8760 else n_hours)
+    base_profiles = [
+        synthetic_load_profile(n_hours, seed=seed) for seed in range(n_weather_years)
+    ]
+
+    county_data = county_population_data.rename(columns={base_year: "population"})
+    county_data["cdr_zone_percent"] = percentage_of_whole_for_each(
+        county_data, "population", "cdr_zone"
+    )
+
+    def generate_all():
+        return [
+            generate_16_region_load_profiles(
+                base_profile,
+                base_year=base_year,
+                model_years=model_years,
+                county_population_data=county_population_data,
+                ev_loads=ev_loads,
+                outputs_to_file=False,
+            )
+            for base_profile in base_profiles
+        ]
+
+    stages = {
+        "load_by_16_region": lambda: load_by_16_region(
+            base_profiles[0], county_population_data=county_data
+        ),
+        "generate_16_region_load_profiles": generate_all,
+    }
+
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        profiles = generate_all()
+        # one scenario name (see output_store.scenario_key) per weather year and model year
+        files = {
+            temp_dir / f"load_base{int(base_year) + number}_model{model_year}.csv": df
+            for number, out in enumerate(profiles)
+            for model_year, df in out.items()
+        }
+        # writes alone, so their times compare with runs from before summaries were written
+        stages["write_csv"] = lambda: write_outputs(files, temp_dir, summarize=False)
+        stages["write_store"] = lambda: write_outputs(
+            files, temp_dir, output_format="store", summarize=False
+        )
+
+        def write_summaries():
+            write_scenario_summaries(temp_dir, files)
+            # pyramids are only built for hourly years (see pyramid.py)
+            if n_hours == 8760:
+                write_scenario_pyramids(temp_dir, files)
+
+        stages["write_summaries"] = write_summaries
+
+        if include_excel:
+            excel_file = temp_dir / "load.xlsx"
+            spreadsheet = base_profiles[0].rename(columns=ERCOT_COLUMNS)
+            spreadsheet["ERCOT"] = spreadsheet[list(ERCOT_COLUMNS.values())].sum(axis=1)
+            spreadsheet.to_excel(excel_file, index=False)
+            stages["read_ercot_load_profile"] = lambda: read_ercot_load_profile(
+                excel_file
+            )
+            read_ercot_load_profile(excel_file, cache_dir=temp_dir / "cache")
+            stages["read_ercot_load_profile_cached"] = lambda: read_ercot_load_profile(
+                excel_file, cache_dir=temp_dir / "cache"
+            )
+
+        for stage, function in stages.items():
+            _, seconds, peak_bytes = measure(function, repeats)
+            results.append(
+                {"stage": stage, "seconds": seconds, "peak_bytes": peak_bytes}
+            )
+
+    return results
+
+
+def run_benchmarks(sizes, results_dir=None, repeats=3, include_excel=False):
+    """Runs benchmark_size for each size, prints a table and saves results
+
+    Args:
+        sizes (list): of dicts with keyword arguments of benchmark_size (missing ones are from DEFAULT_SIZE)
+        results_dir (pathlib.Path): directory for results JSON, not saved if None
+        repeats (int): timing repeats, the best is kept
+        include_excel (bool): see benchmark_size
+
+    Returns:
+        pandas.DataFrame: one row per size and stage
+    """
+    rows = []
+    for size in sizes:
+        size = DEFAULT_SIZE | size
+        for result in benchmark_size(
+            **size, repeats=repeats, include_excel=include_excel
+        ):
+            rows.append(size | result)
+    results = pd.DataFrame(rows)
+    print(results.to_string(index=False))
+
+    if results_dir is not None:
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                cwd=Path(__file__).parent,
+            ).stdout.strip()
+        except OSError:
+            commit = ""
+
+        run = {
+            "commit": commit,
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "results": rows,
+        }
+        results_dir = Path(results_dir)
+        results_dir.mkdir(parents=True, exist_ok=True)
+        results_file = results_dir / f"benchmark_{commit or 'unknown'}_{datetime.now():%Y%m%d%H%M%S}.json"
+        results_file.write_text(json.dumps(run, indent=1))
+        print(f"saved {results_file}")
+
+    return results
+
+
+def compare_benchmarks(old_file, new_file):
+    """Returns table comparing two saved benchmark runs, with new/old ratios of time and memory
+
+    Args:
+        old_file (pathlib.Path): results JSON of the reference run
+        new_file (pathlib.Path): results JSON of the run to compare
+
+    Returns:
+        pandas.DataFrame: one row per size and stage present in both runs
+    """
+    old = pd.DataFrame(json.loads(Path(old_file).read_text())["results"])
+    new = pd.DataFrame(json.loads(Path(new_file).read_text())["results"])
+    keys = [column for column in old.columns if column not in ("seconds", "peak_bytes")]
+
+    comparison = old.merge(new, on=keys, suffixes=("_old", "_new"))
+    comparison["time_ratio"] = comparison["seconds_new"] / comparison["seconds_old"]
+    comparison["memory_ratio"] = (
+        comparison["peak_bytes_new"] / comparison["peak_bytes_old"]
+    )
+
+    return comparison
+
+
+if __name__ == "__main__":
+    ###### OPTIONS ######
+
+    results_dir = Path("benchmarks")  # location of saved results (None to not save)
+    repeats = 3  # timing repeats, best is kept
+    include_excel = False  # also time reading a synthetic spreadsheet (slow to create)
+
+    # input sizes, each benchmarked separately (scaling curves vary one size at a time)
+    sizes = [
+        {"n_hours": 8760, "n_counties": 250},
+        {"n_hours": 8760, "n_counties": 5000},
+        {"n_hours": 35040, "n_counties": 250},
+        {"n_hours": 8760, "n_counties": 250, "n_model_years": 30},
+        {"n_hours": 8760, "n_counties": 250, "n_weather_years": 20},
+    ]
+
+    ###### END OPTIONS ######
+    run_benchmarks(
+        sizes, results_dir=results_dir, repeats=repeats, include_excel=include_excel
+    )
@@ -0,0 +1,200 @@
+"""
+ Continuous multi-year chronologies, e.g. 2002-2022 weather years stitched together,
+ each scaled to the same model year (for multi-year GenX runs and resource adequacy studies).
+
+ Weather years are read, split and scaled one at a time, in order, and written to a single
+ file as they are generated, so memory use doesn't grow with the number of years chained.
+ Options are described at bottom of script
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from extra_functions import profile_timestamps
+from load_profile import (
+    generate_16_region_load_profiles,
+    read_county_population_data,
+    read_ercot_load_profile,
+)
+
+
+def chronology_timestamps(base_profile):
+    """Returns the beginning of each interval of a weather year's profile once leap days are
+    dropped (the rows of its outputs), tz-aware in America/Chicago, so daylight saving time
+    is followed (see extra_functions.ercot_timestamps)"""
+    timestamps, leap_day = profile_timestamps(base_profile)
+    return timestamps[~leap_day]
+
+
+def iter_chronology(
+    load_files,
+    model_year,
+    county_population_data,
+    ev_loads,
+    scaling_factor=1.018,
+    intermediate_year=None,
+    intermediate_load=None,
+    cache_dir=None,
+    dtype="float64",
+    schemes=None,
+    population_weighting="base_year",
+):
+    """Yields the profile of each weather year in order, scaled to model_year, with a
+    continuous Time_Index (from 1) and the weather year's timestamps
+
+    Args:
+        load_files (dict): keys are weather (base) years, values are paths to load files
+        model_year (numeric): Year every weather year is scaled to
+        county_population_data (pandas.DataFrame): Contains population data for each county for each year
+        ev_loads (pandas.DataFrame): Contains EV load data for each model year
+        scaling_factor (float like): Factor to scale load by each year
+        intermediate_year (numeric or str): Year of intermediate profile, optional
+        intermediate_load (pandas.DataFrame): Load profile for scaling to intermediate year
+        cache_dir (pathlib.Path): directory for parsed input files, see read_ercot_load_profile
+        dtype (str): "float64" or "float32", see generate_16_region_load_profiles
+        schemes (dict): county -> region aggregation schemes, see generate_16_region_load_profiles
+        population_weighting (str): "base_year" or "model_year", see generate_16_region_load_profiles
+
+    Yields:
+        pandas.DataFrame: profile of one weather year, index is Time_Index, first column is "timestamp".
+                          If schemes is given, dicts of scheme name to such profiles
+    """
+    hours_before = 0
+    for weather_year in sorted(load_files, key=int):
+        base_profile = read_ercot_load_profile(
+            load_files[weather_year], cache_dir=cache_dir
+        )
+
+        out = generate_16_region_load_profiles(
+            base_profile,
+            base_year=str(weather_year),
+            model_years=[model_year],
+            county_population_data=county_population_data,
+            ev_loads=ev_loads,
+            scaling_factor=scaling_factor,
+            intermediate_year=intermediate_year,
+            intermediate_load=intermediate_load,
+            outputs_to_file=False,
+            dtype=dtype,
+            schemes=schemes,
+            population_weighting=population_weighting,
+        )
+        profiles = (
+            {scheme: files[model_year] for scheme, files in out.items()}
+            if schemes is not None
+            else {None: out[model_year]}
+        )
+
+        timestamps = chronology_timestamps(base_profile)
+        n_hours = len(next(iter(profiles.values())))
+        assert n_hours == len(
+            timestamps
+        ), f"{weather_year} profile has {n_hours} hours, but {len(timestamps)} timestamps"
+        time_index = pd.Index(
+            np.arange(hours_before + 1, hours_before + n_hours + 1), name="Time_Index"
+        )
+        hours_before += n_hours
+
+        for profile in profiles.values():
+            profile.index = time_index
+            profile.insert(0, "timestamp", timestamps)
+
+        yield profiles if schemes is not None else profiles[None]
+
+
+def write_chronology(output_file, chunks):
+    """Writes the profiles yielded by iter_chronology to a single CSV (per scheme), one weather
+    year at a time. Files are written under a temporary name and renamed when complete
+
+    Args:
+        output_file (pathlib.Path): CSV file to write, or dict of scheme name to CSV file
+                                    when iter_chronology was given schemes
+        chunks (iterable): profiles, as yielded by iter_chronology
+
+    Returns:
+        int: number of hours written
+    """
+    output_files = output_file if isinstance(output_file, dict) else {None: output_file}
+    temp_files = {}
+    for scheme, file in output_files.items():
+        file = Path(file)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        temp_files[scheme] = file.with_name(f"{file.name}.{os.getpid()}.tmp")
+
+    handles = {}
+    n_hours = 0
+    try:
+        for scheme, temp_file in temp_files.items():
+            handles[scheme] = open(temp_file, "w", newline="")
+        for chunk in chunks:
+            if not isinstance(chunk, dict):
+                chunk = {None: chunk}
+            for scheme, profile in chunk.items():
+                profile.to_csv(handles[scheme], header=n_hours == 0)
+            n_hours += len(profile)
+    except BaseException:
+        # no partial files are left behind
+        for handle in handles.values():
+            handle.close()
+        for temp_file in temp_files.values():
+            temp_file.unlink(missing_ok=True)
+        raise
+    for handle in handles.values():
+        handle.close()
+
+    for scheme, temp_file in temp_files.items():
+        os.replace(temp_file, output_files[scheme])
+
+    return n_hours
+
+
+if __name__ == "__main__":
+    ###### OPTIONS ######
+
+    input_dir = Path("inputs")  # location of input files
+    output_file = Path("outputs") / "chronology_2002_2021_model2030.csv"  # output file
+    data_dir = Path(
+        "data"
+    )  # location of data, looks for "county_population_data.csv" and "ev_extra_loads.csv"
+    cache_dir = input_dir / ".cache"  # location of parsed input files (None to disable)
+
+    # weather years to chain, in order
+    load_files = {
+        str(year): input_dir / f"{year}_ercot_hourly_load_data.xls"
+        for year in range(2002, 2015)
+    }
+    load_files.update({"2015": input_dir / "native_load_2015.xls"})
+    load_files.update(
+        {
+            str(year): input_dir / f"native_Load_{year}.xlsx"
+            for year in range(2016, 2018)
+        }
+    )
+    load_files.update(
+        {
+            str(year): input_dir / f"Native_Load_{year}.xlsx"
+            for year in range(2018, 2021)
+        }
+    )
+    load_files.update({"2021": input_dir / "Native_Load_2021_NOShed.xlsx"})
+
+    # model year every weather year is scaled to
+    model_year = 2030
+
+    ###### END OPTIONS ######
+    n_hours = write_chronology(
+        output_file,
+        iter_chronology(
+            load_files,
+            model_year,
+            county_population_data=read_county_population_data(
+                data_dir / "county_population_data.csv"
+            ),
+            ev_loads=pd.read_csv(data_dir / "ev_extra_loads.csv"),
+            cache_dir=cache_dir,
+        ),
+    )
+    print(f"wrote {n_hours} hours to {output_file}")
@@ -0,0 +1,590 @@
+"""
+ Out-of-core generation, for runs whose outputs do not fit in memory at once (e.g. county
+ level schemes with hundreds of regions, or many base and model years).
+
+ Work is split into a graph of small tasks: for each base year, a prepare task drops its leap
+ days and splits its whole year once (for the total energy model years are scaled from), then
+ a task per chunk of model years and chunk of hours splits only those hours of the base profile
+ (see the hours of load_profile.generate_16_region_load_array) and writes them into a
+ preallocated scratch array on disk, and a task per model year writes the finished output
+ (CSV or store, with its summary and pyramid) once every slice of it is computed. run_task_graph runs tasks on a
+ process pool as their dependencies finish, so peak memory is set by the chunk sizes (and
+ one scenario being written), not by the size or number of outputs. Outputs are identical
+ to those of load_profile.main.
+ Options are described at bottom of script
+"""
+
+import functools
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from extra_functions import DEFAULT_SCHEMES, aggregation_regions, profile_timestamps
+from load_profile import (
+    generate_16_region_load_array,
+    population_allocation,
+    read_county_population_data,
+    read_ercot_load_profile,
+    split_by_region,
+    write_outputs,
+    zone_load_array,
+)
+from manifest import (
+    read_manifest,
+    scenario_records,
+    stale_model_years,
+    update_manifest,
+    write_manifest,
+)
+from output_store import output_file, scenario_key, scheme_output_dir, write_store_index
+from summary import write_summary_index
+from sweep import init_worker, read_worker_profile, worker_data
+
+
+def hour_chunks(n_hours, chunk_hours=1752):
+    """Returns slices of chunk_hours hours (the last may be shorter) covering n_hours
+
+    Args:
+        n_hours (int): hours of the profile, once leap days are dropped
+        chunk_hours (int): hours per chunk, a multiple of 24 so that 24 hour EV loads
+                           line up with the days of every chunk
+
+    Returns:
+        list: of slices
+    """
+    if chunk_hours % 24:
+        raise ValueError(f"chunk_hours must be a multiple of 24, got {chunk_hours}")
+
+    return [
+        slice(start, min(start + chunk_hours, n_hours))
+        for start in range(0, n_hours, chunk_hours)
+    ]
+
+
+def _scratch_file(scratch_dir, scheme, base_year, model_year, intermediate_year):
+    """Returns path of the scratch array of an output"""
+    key = scenario_key(base_year, model_year, intermediate_year)
+    return Path(scratch_dir) / f"{scheme}.{key}.npy"
+
+
+def _prepare(base_year, load_file, model_years, options):
+    """Finds the rows of a base profile once leap days are dropped, splits its whole year once
+    for the total load model years are scaled from (with the allocation of a whole year run
+    of model_years), and preallocates the scratch arrays of its outputs
+
+    Returns:
+        dict: "rows" (positions of the profile's rows without leap days), "n_hours" and "base_total"
+              (see load_profile.split_by_region)
+    """
+    base_profile = read_worker_profile(load_file)
+    _, leap_day = profile_timestamps(base_profile)
+    rows = np.flatnonzero(~leap_day)
+
+    allocation, _, names_by_scheme, names_cdr_region = population_allocation(
+        worker_data["county_populations"],
+        base_year,
+        model_years,
+        schemes=options["schemes"],
+        population_weighting=options["population_weighting"],
+    )
+    _, base_total = split_by_region(
+        zone_load_array(base_profile, names_cdr_region)[rows],
+        allocation[:1],
+        names_by_scheme,
+    )
+
+    for scheme, names in names_by_scheme.items():
+        for model_year in model_years:
+            np.lib.format.open_memmap(
+                _scratch_file(
+                    options["scratch_dir"],
+                    scheme,
+                    base_year,
+                    model_year,
+                    options["intermediate_year"],
+                ),
+                mode="w+",
+                dtype=options["dtype"],
+                shape=(len(rows), len(names)),
+            )
+
+    return {"rows": rows, "n_hours": len(rows), "base_total": base_total}
+
+
+def _compute(base_year, load_file, model_years, hours, prepared, options):
+    """Computes hours of the outputs of some model years, writing them to their scratch arrays.
+    Only the rows of those hours are split, see _prepare"""
+    intermediate_load = None
+    if options["intermediate_file"] is not None:
+        intermediate_load = read_worker_profile(options["intermediate_file"])
+
+    # every task of a worker process computes into the same buffer (one per shape and dtype),
+    # as its slice is copied to the scratch arrays before the next task
+    n_regions = sum(len(names) for names in options["names_by_scheme"].values())
+    shape = (len(model_years), hours.stop - hours.start, n_regions)
+    buffer_key = (shape, options["dtype"])
+    buffers = worker_data.setdefault("buffers", {})
+    if buffer_key not in buffers:
+        buffers[buffer_key] = np.empty(shape, dtype=options["dtype"])
+
+    loads, names_by_scheme = generate_16_region_load_array(
+        read_worker_profile(load_file).iloc[prepared["rows"][hours]],
+        base_year=base_year,
+        model_years=model_years,
+        county_population_data=worker_data["county_populations"],
+        ev_loads=worker_data["ev_loads"],
+        scaling_factor=options["scaling_factor"],
+        intermediate_year=options["intermediate_year"],
+        intermediate_load=intermediate_load,
+        dtype=options["dtype"],
+        schemes=options["schemes"],
+        population_weighting=options["population_weighting"],
+        ev_weights=options["ev_weights"],
+        ev_region_column=options["ev_region_column"],
+        hours=hours,
+        base_total=prepared["base_total"],
+        out=buffers[buffer_key],
+    )
+
+    column_start = 0
+    for scheme, names in names_by_scheme.items():
+        for model_year, load in zip(model_years, loads):
+            scratch = np.load(
+                _scratch_file(
+                    options["scratch_dir"],
+                    scheme,
+                    base_year,
+                    model_year,
+                    options["intermediate_year"],
+                ),
+                mmap_mode="r+",
+            )
+            scratch[hours] = load[:, column_start : column_start + len(names)]
+            scratch.flush()
+            del scratch
+        column_start += len(names)
+
+
+def _finish(base_year, model_year, options):
+    """Writes the outputs of a model year (of every scheme) from their scratch arrays,
+    and removes the scratch arrays"""
+    for scheme, names in options["names_by_scheme"].items():
+        scheme_dir = scheme_output_dir(options["output_dir"], scheme)
+        file = output_file(scheme_dir, base_year, model_year, options["intermediate_year"])
+        file.parent.mkdir(parents=True, exist_ok=True)
+
+        scratch_file = _scratch_file(
+            options["scratch_dir"],
+            scheme,
+            base_year,
+            model_year,
+            options["intermediate_year"],
+        )
+        df = pd.DataFrame(np.load(scratch_file), columns=names)
+        write_outputs(
+            {file: df},
+            scheme_dir,
+            output_format=options["output_format"],
+            # rebuilt once all tasks are done
+            update_index=False,
+        )
+        del df
+        scratch_file.unlink()
+
+
+def _compute_tasks(base_year, load_file, model_years, options, chunk_hours, chunk_years, prepared):
+    """Returns the compute and finish tasks of a base year, once its prepare task is done
+    (so that hour chunks cover the hours of its profile), see chunked_tasks"""
+    prepare = ("prepare", base_year)
+    step = chunk_years or len(model_years)
+
+    tasks = {}
+    for year_start in range(0, len(model_years), step):
+        years = model_years[year_start : year_start + step]
+        computes = []
+        for hours in hour_chunks(prepared["n_hours"], chunk_hours):
+            compute = ("compute", base_year, tuple(years), hours.start)
+            tasks[compute] = {
+                "function": _compute,
+                "args": (base_year, load_file, years, hours, prepared, options),
+                "depends": [prepare],
+            }
+            computes.append(compute)
+
+        for model_year in years:
+            tasks[("finish", base_year, model_year)] = {
+                "function": _finish,
+                "args": (base_year, model_year, options),
+                "depends": computes,
+            }
+
+    return tasks
+
+
+def chunked_tasks(
+    load_files,
+    model_years,
+    options,
+    chunk_hours=1752,
+    chunk_years=1,
+):
+    """Returns graph of tasks generating every output in chunks. Nothing is computed
+    until the graph is run, see run_task_graph. The graph starts with a prepare task per
+    base year, which expands into the compute and finish tasks of its outputs
+
+    Args:
+        load_files (dict): keys are base years, values are paths to load files
+        model_years (dict or list): model years of each base year (if dict, keyed like load_files)
+        options (dict): generation options shared by every task, see run_chunked
+        chunk_hours (int): hours computed per task, see hour_chunks
+        chunk_years (int): model years computed per task, all of a base year's if None
+
+    Returns:
+        dict: keys are task names, values are dicts of "function", "args", "depends"
+              (names of tasks that must finish first) and optionally "expand" (called with the
+              task's result, returns tasks added to the graph), in the order tasks should start
+    """
+    tasks = {}
+    for base_year, load_file in load_files.items():
+        base_model_years = (
+            model_years[base_year] if isinstance(model_years, dict) else model_years
+        )
+        base_model_years = list(base_model_years)
+
+        tasks[("prepare", base_year)] = {
+            "function": _prepare,
+            "args": (base_year, load_file, base_model_years, options),
+            "depends": [],
+            "expand": functools.partial(
+                _compute_tasks,
+                base_year,
+                load_file,
+                base_model_years,
+                options,
+                chunk_hours,
+                chunk_years,
+            ),
+        }
+
+    return tasks
+
+
+def run_task_graph(tasks, max_workers=None, initializer=None, initargs=(), on_done=None):
+    """Runs a task graph (see chunked_tasks), starting each task once its dependencies are done.
+    Ready tasks start in graph order with at most two per worker queued, so earlier outputs
+    are finished (and their scratch arrays removed) before later ones are started. Tasks
+    added by a finished task's "expand" start before the tasks already waiting
+
+    Args:
+        tasks (dict): keys are task names, values are dicts of "function", "args", "depends"
+                      and optionally "expand"
+        max_workers (int): number of worker processes, defaults to number of CPUs.
+                           If 1, tasks are run in this process
+        initializer (callable): run once in each worker process (and in this one if max_workers is 1)
+        initargs (tuple): arguments of initializer
+        on_done (callable): called with the name and result of each task as it finishes
+
+    Returns:
+        dict: keys are task names, values are results (of added tasks too)
+    """
+    results = {}
+    waiting = dict(tasks)
+
+    def ready():
+        return [
+            (name, task)
+            for name, task in waiting.items()
+            if all(depend in results for depend in task["depends"])
+        ]
+
+    def finished(name, task, result):
+        nonlocal waiting
+        results[name] = result
+        if "expand" in task:
+            waiting = {**task["expand"](result), **waiting}
+        if on_done is not None:
+            on_done(name, result)
+
+    if max_workers == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        while waiting:
+            if not ready():
+                raise ValueError(f"tasks with unknown dependencies: {list(waiting)}")
+            name, task = ready()[0]
+            del waiting[name]
+            finished(name, task, task["function"](*task["args"]))
+        return results
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=initializer, initargs=initargs
+    ) as pool:
+        max_running = 2 * (max_workers or os.cpu_count())
+        running = {}
+        while waiting or running:
+            for name, task in ready():
+                if len(running) >= max_running:
+                    break
+                running[pool.submit(task["function"], *task["args"])] = (name, task)
+                del waiting[name]
+
+            if not running:
+                raise ValueError(f"tasks with unknown dependencies: {list(waiting)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, task = running.pop(future)
+                # raises errors of worker processes
+                finished(name, task, future.result())
+
+    return results
+
+
+def run_chunked(
+    output_dir,
+    data_dir,
+    load_files,
+    model_years,
+    intermediate_year=None,
+    intermediate_file=None,
+    scaling_factor=1.018,
+    ev_file="ev_extra_loads.csv",
+    cache_dir=None,
+    scratch_dir=None,
+    output_format="csv",
+    incremental=False,
+    chunk_hours=1752,
+    chunk_years=1,
+    max_workers=None,
+    print_timing=True,
+    dtype="float64",
+    schemes=None,
+    population_weighting="base_year",
+    ev_weights=None,
+    ev_region_column="model_region",
+):
+    """Generates and writes profiles of every base year and model year in chunks,
+    with the same outputs as load_profile.main
+
+    Args:
+        output_dir (pathlib.Path): directory for output files
+        data_dir (pathlib.Path): directory containing county_population_data.csv and ev_file
+        load_files (dict): keys are base years, values are paths to load files
+        model_years (list): list of years the model needs load data for
+        intermediate_year (numeric or str): Year of intermediate profile, see generate_16_region_load_profiles
+        intermediate_file (pathlib.Path): load file of intermediate year
+        scaling_factor (float like): Factor to scale load by each year
+        ev_file (str): name of EV load file in data_dir
+        cache_dir (pathlib.Path): directory for parsed input files, see read_ercot_load_profile
+        scratch_dir (pathlib.Path): directory for scratch arrays of outputs being computed
+                                    (removed as each output is written), defaults to output_dir / ".chunks"
+        output_format (str): "csv" or "store", see write_outputs
+        incremental (bool): only rebuild outputs whose inputs changed, see manifest.py
+        chunk_hours (int): hours computed per task, see hour_chunks
+        chunk_years (int): model years computed per task (all of a base year's if None)
+        max_workers (int): number of worker processes, see run_task_graph
+        print_timing (bool): print number of tasks and time taken
+        dtype (str): "float64" or "float32", see generate_16_region_load_profiles
+        schemes (dict): county -> region aggregation schemes, see extra_functions.aggregation_regions
+        population_weighting (str): "base_year" or "model_year", see generate_16_region_load_profiles
+        ev_weights (str): column EV load is split by, see generate_16_region_load_profiles
+        ev_region_column (str): column of EV regions, see generate_16_region_load_profiles
+
+    Returns:
+        int: number of tasks run
+    """
+    if schemes is None:
+        schemes = DEFAULT_SCHEMES
+    if scratch_dir is None:
+        scratch_dir = Path(output_dir) / ".chunks"
+    if intermediate_year and intermediate_file is None:
+        raise ValueError("intermediate_file is needed for intermediate_year")
+
+    county_populations = read_county_population_data(
+        data_dir / "county_population_data.csv"
+    )
+    _, names_by_scheme = aggregation_regions(county_populations, schemes)
+
+    # model years to build of each base year (and their manifest records)
+    stale_years = {base_year: list(model_years) for base_year in load_files}
+    records = {}
+    if incremental:
+        manifest = read_manifest(output_dir)
+        ev_loads = pd.read_csv(data_dir / ev_file)
+        intermediate_load = None
+        if intermediate_file is not None:
+            intermediate_load = read_ercot_load_profile(
+                intermediate_file, cache_dir=cache_dir
+            )
+
+        for base_year, load_file in load_files.items():
+            records[base_year] = scenario_records(
+                output_dir,
+                load_file=load_file,
+                base_year=base_year,
+                model_years=model_years,
+                county_population_data=county_populations,
+                ev_loads=ev_loads,
+                scaling_factor=scaling_factor,
+                intermediate_year=intermediate_year,
+                intermediate_load=intermediate_load,
+                dtype=dtype,
+                schemes=schemes,
+                population_weighting=population_weighting,
+                ev_weights=ev_weights,
+                ev_region_column=ev_region_column,
+            )
+            stale_years[base_year] = stale_model_years(
+                manifest, output_dir, records[base_year], output_format=output_format
+            )
+    stale_files = {
+        base_year: load_file
+        for base_year, load_file in load_files.items()
+        if stale_years[base_year]
+    }
+
+    options = {
+        "output_dir": output_dir,
+        "scratch_dir": scratch_dir,
+        "output_format": output_format,
+        "names_by_scheme": names_by_scheme,
+        "intermediate_year": intermediate_year,
+        "intermediate_file": intermediate_file,
+        "scaling_factor": scaling_factor,
+        "dtype": dtype,
+        "schemes": schemes,
+        "population_weighting": population_weighting,
+        "ev_weights": ev_weights,
+        "ev_region_column": ev_region_column,
+    }
+    tasks = chunked_tasks(
+        stale_files,
+        stale_years,
+        options,
+        chunk_hours=chunk_hours,
+        chunk_years=chunk_years,
+    )
+
+    # base year -> model years whose outputs are not written yet
+    unfinished = {base_year: set(stale_years[base_year]) for base_year in stale_files}
+
+    def on_done(name, result):
+        if name[0] != "finish":
+            return
+        _, base_year, model_year = name
+        unfinished[base_year].discard(model_year)
+        if incremental and not unfinished[base_year]:
+            # written after each base year, so an interrupted run can resume
+            update_manifest(
+                manifest,
+                records[base_year],
+                stale_years[base_year],
+                output_format=output_format,
+            )
+            write_manifest(output_dir, manifest)
+
+    start = time.perf_counter()
+    Path(scratch_dir).mkdir(parents=True, exist_ok=True)
+    results = run_task_graph(
+        tasks,
+        max_workers=max_workers,
+        initializer=init_worker,
+        initargs=(data_dir, ev_file, cache_dir),
+        on_done=on_done,
+    )
+    # scratch arrays are removed as outputs are written
+    if not any(Path(scratch_dir).iterdir()):
+        Path(scratch_dir).rmdir()
+
+    if results:
+        for scheme in schemes:
+            scheme_dir = scheme_output_dir(output_dir, scheme)
+            write_summary_index(scheme_dir)
+            if output_format == "store":
+                write_store_index(scheme_dir / "store")
+
+    if print_timing:
+        print(f"{len(results)} tasks in {time.perf_counter() - start:.2f} s")
+
+    return len(results)
+
+
+if __name__ == "__main__":
+    ###### OPTIONS ######
+
+    input_dir = Path("inputs")  # location of input files
+    output_dir = Path("outputs")  # location of output files
+    data_dir = Path(
+        "data"
+    )  # location of data, looks for "county_population_data.csv" and ev_file
+    cache_dir = input_dir / ".cache"  # location of parsed input files (None to disable)
+    scratch_dir = None  # location of outputs being computed (None for output_dir / ".chunks")
+    output_format = "csv"  # "csv" files or binary "store" (see output_store.py)
+    incremental = True  # only rebuild outputs whose inputs changed (see manifest.py)
+    dtype = "float64"  # "float64" or "float32" (half the memory and shorter CSV values)
+    chunk_hours = 1752  # hours computed per task, a multiple of 24
+    chunk_years = 1  # model years computed per task
+    max_workers = None  # worker processes (None for number of CPUs, 1 to run in this process)
+
+    # county -> region aggregation schemes, all computed in one pass (see README)
+    schemes = {
+        "model_region": {"column": "model_region"},
+        # "county": {"column": "county"},
+    }
+    population_weighting = "base_year"  # split load with "base_year" or "model_year" population (see README)
+    ev_weights = None  # county_population_data column EV load is split by (None for population, see README)
+    ev_region_column = "model_region"  # county_population_data column of EV regions, for per region EV loads
+
+    # base years (weather years)
+    load_files = {
+        str(year): input_dir / f"{year}_ercot_hourly_load_data.xls"
+        for year in range(2002, 2015)
+    }
+    load_files.update({"2015": input_dir / "native_load_2015.xls"})
+    load_files.update(
+        {
+            str(year): input_dir / f"native_Load_{year}.xlsx"
+            for year in range(2016, 2018)
+        }
+    )
+    load_files.update(
+        {
+            str(year): input_dir / f"Native_Load_{year}.xlsx"
+            for year in range(2018, 2021)
+        }
+    )
+    load_files.update({"2021": input_dir / "Native_Load_2021_NOShed.xlsx"})
+
+    # select model years (final load year)
+    model_years = [2030, 2035]  # list
+
+    # select load profile and year for intermediate load scaling
+    # (if None, no intermediate load scaling is done)
+    intermediate_file = None  # input_dir / "Native_Load_2021_NOShed.xlsx"
+    intermediate_year = None  # 2021
+
+    ###### END OPTIONS ######
+    run_chunked(
+        output_dir=output_dir,
+        data_dir=data_dir,
+        load_files=load_files,
+        model_years=model_years,
+        intermediate_year=intermediate_year,
+        intermediate_file=intermediate_file,
+        cache_dir=cache_dir,
+        scratch_dir=scratch_dir,
+        output_format=output_format,
+        incremental=incremental,
+        chunk_hours=chunk_hours,
+        chunk_years=chunk_years,
+        max_workers=max_workers,
+        dtype=dtype,
+        schemes=schemes,
+        population_weighting=population_weighting,
+        ev_weights=ev_weights,
+        ev_region_column=ev_region_column,
+    )
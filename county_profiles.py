@@ -0,0 +1,242 @@
+"""
+ On-demand county (or custom geography) load profiles, built on the same population
+ weights as the model region profiles of load_profile.py.
+
+ A county's profile is its share of its cdr zone's load, scaled to each model year like
+ the model region profiles, plus its share of the EV load, allocated like the model region
+ profiles' (per EV region, by population or ev_weights, see load_profile.ev_allocation).
+ Summing the profiles of a model region's counties gives that region's profile.
+ Only the requested counties and hours are computed, and the per county weights and
+ base profiles (after leap day removal) are memoized, so repeated queries are cheap.
+"""
+
+import numpy as np
+import pandas as pd
+
+from extra_functions import cached, drop_leap_days, new_lru_cache
+from load_profile import (
+    ev_allocation,
+    ev_load_tensor,
+    indicator_matrix,
+    population_by_year,
+    year_scaling_factors,
+    zone_load_array,
+)
+
+# county weights by (population year, hash of county data), see county_weights
+_county_weight_cache = new_lru_cache(64)
+
+# base profile zone loads by (hash of profile, zones), see _zone_loads
+_zone_load_cache = new_lru_cache(16)
+
+
+def _hash(df):
+    return pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()
+
+
+def county_weights(county_population_data, population_year):
+    """Returns each county's cdr zone, model region and weights for one population year
+
+    Args:
+        county_population_data (pandas.DataFrame): Contains "county", "cdr_zone", "model_region" and population_year
+        population_year (str): population column used for weighting
+
+    Returns:
+        pandas.DataFrame: index is county, columns are cdr_zone, model_region,
+                          zone_weight (fraction of its cdr zone's population) and
+                          ev_weight (fraction of total population, for splitting EV load)
+    """
+    population_year = str(population_year)
+    county_data = county_population_data[
+        ["county", "cdr_zone", "model_region", population_year]
+    ]
+    key = (population_year, _hash(county_data))
+
+    def build():
+        population = county_data[population_year]
+        weights = county_data[["county", "cdr_zone", "model_region"]].set_index("county")
+        weights["zone_weight"] = (
+            population / population.groupby(county_data["cdr_zone"]).transform("sum")
+        ).to_numpy()
+        weights["ev_weight"] = (population / population.sum()).to_numpy()
+        return weights
+
+    return cached(_county_weight_cache, key, build)
+
+
+def _zone_loads(base_profile, zones):
+    """Returns (hour, zone) array of base profile with leap day removed, and its total energy"""
+    key = (_hash(base_profile), tuple(zones))
+
+    def build():
+        zone_loads = zone_load_array(drop_leap_days(base_profile), zones)
+        return zone_loads, zone_loads.sum()
+
+    return cached(_zone_load_cache, key, build)
+
+
+def county_load_profiles(
+    base_profile,
+    base_year,
+    model_years,
+    county_population_data,
+    ev_loads,
+    counties=None,
+    hours=None,
+    groups=None,
+    scaling_factor=1.018,
+    intermediate_year=None,
+    intermediate_load=None,
+    population_weighting="base_year",
+    trend_years=10,
+    ev_weights=None,
+    ev_region_column="model_region",
+):
+    """Returns load profiles of selected counties (or groups of counties) for each model year
+
+    Args:
+        base_profile (pandas.DataFrame): Load profile for base year
+        base_year (numeric or str): Year of initial profile
+        model_years (list): list of years the model needs load data for
+        county_population_data (pandas.DataFrame): Contains population data for each county for each year
+        ev_loads (pandas.DataFrame): Contains EV load data for each model year (24 or 8760 hours),
+                                     optionally per region (see load_profile.ev_load_tensor)
+        counties (list): counties to compute, all if None
+        hours (list or slice): hours (positions in the year, as in output files) to compute, all if None
+        groups (dict or pandas.Series): maps counties to a custom geography, whose profiles
+                                        (sums of their counties) are returned instead of counties'
+        scaling_factor (float like): Factor to scale load by each year
+        intermediate_year (numeric or str): Year of intermediate profile, see generate_16_region_load_profiles
+        intermediate_load (pandas.DataFrame): Load profile for scaling to intermediate year
+        population_weighting (str): "base_year" or "model_year", see generate_16_region_load_profiles
+        trend_years (int): see load_profile.population_by_year
+        ev_weights (str): column of county_population_data EV load is split between counties by,
+                          if None, population (see population_weighting)
+        ev_region_column (str): column of county_population_data containing the EV region of each county,
+                                used when EV loads are per region
+
+    Returns:
+        dict: keys are model years, values are load profiles (index is hour, columns are counties or groups)
+    """
+    base_year = str(base_year)
+    weights = county_weights(county_population_data, base_year)
+    if counties is not None:
+        weights = weights.loc[list(counties)]
+
+    zones = sorted(set(county_population_data["cdr_zone"]))
+    zone_loads, base_total = _zone_loads(base_profile, zones)
+
+    hour_index = np.arange(len(zone_loads))
+    if hours is not None:
+        hour_index = hour_index[hours]
+
+    # population of every county, (model year or 1, county)
+    if population_weighting == "model_year":
+        population = population_by_year(
+            county_population_data, model_years, trend_years
+        ).to_numpy().T
+    else:
+        population = county_population_data[base_year].to_numpy(dtype=float)[None, :]
+
+    # (county, selected county) and (selected county, county or group) indicator matrices
+    selected = indicator_matrix(county_population_data["county"], weights.index)
+    if groups is not None:
+        group_names = pd.Series(groups).reindex(weights.index)
+        columns = pd.Index(sorted(set(group_names.dropna())))
+        grouped = indicator_matrix(group_names, columns)
+    else:
+        columns = weights.index
+        grouped = np.eye(len(weights))
+
+    # (model year or 1, zone, county or group) weights
+    if population_weighting == "model_year":
+        county_zones = indicator_matrix(county_population_data["cdr_zone"], zones)
+        zone_fraction = population / (population @ county_zones @ county_zones.T)
+        zone_weights = np.einsum(
+            "yn,nz,nc->yzc", zone_fraction, county_zones, selected @ grouped
+        )
+    else:
+        zone_weights = np.zeros((len(zones), len(weights)))
+        zone_weights[
+            pd.Categorical(weights["cdr_zone"], categories=zones).codes,
+            np.arange(len(weights)),
+        ] = weights["zone_weight"]
+        zone_weights = (zone_weights @ grouped)[None]
+
+    # (model year or 1, hour, county) loads of the base year, only for the selected hours and counties
+    base_loads = zone_loads[hour_index] @ zone_weights
+
+    year_factors = year_scaling_factors(
+        base_year,
+        model_years,
+        base_total,
+        scaling_factor=scaling_factor,
+        intermediate_year=intermediate_year,
+        intermediate_load=intermediate_load,
+    )
+
+    # EV load of every EV region, split between the selected counties like the model regions' EV load
+    ev_load, ev_regions = ev_load_tensor(ev_loads, model_years)
+    # 24 hour EV loads repeat every day
+    ev_load = ev_load[:, hour_index % ev_load.shape[1]]
+    ev_split = ev_allocation(
+        (
+            county_population_data[ev_weights].to_numpy()
+            if ev_weights is not None
+            else population
+        ),
+        pd.DataFrame({"county": county_population_data["county"]}),
+        {"county": list(weights.index)},
+        ev_regions=ev_regions,
+        county_ev_regions=(
+            county_population_data[ev_region_column] if ev_regions else None
+        ),
+    )
+    # (model year, hour, county or group)
+    ev_county_loads = ev_load @ (ev_split @ grouped)
+
+    out = {}
+    for i, (model_year, year_factor) in enumerate(zip(model_years, year_factors)):
+        out[model_year] = pd.DataFrame(
+            year_factor * base_loads[i % len(base_loads)] + ev_county_loads[i],
+            index=hour_index,
+            columns=columns,
+        )
+
+    return out
+
+
+def iter_county_load_profiles(
+    base_profile,
+    base_year,
+    model_years,
+    county_population_data,
+    ev_loads,
+    counties=None,
+    chunk_size=50,
+    **kwargs,
+):
+    """Yields county load profiles in chunks of chunk_size counties, so that profiles of
+    every county can be exported without holding them all in memory
+
+    Args:
+        counties (list): counties to compute, all if None
+        chunk_size (int): number of counties per chunk
+        **kwargs: other arguments of county_load_profiles
+
+    Yields:
+        dict: keys are model years, values are load profiles of a chunk of counties
+    """
+    if counties is None:
+        counties = list(county_weights(county_population_data, base_year).index)
+
+    for start in range(0, len(counties), chunk_size):
+        yield county_load_profiles(
+            base_profile,
+            base_year,
+            model_years,
+            county_population_data,
+            ev_loads,
+            counties=counties[start : start + chunk_size],
+            **kwargs,
+        )
@@ -0,0 +1,492 @@
+"""
+ Monte Carlo ensembles of load profiles: seeded draws over weather (base) year, annual
+ load growth (scaling_factor) and EV adoption, summarized with streaming statistics.
+
+ A member's profile is linear in its draws: growth * P + adoption * E, where P is the split
+ (and intermediate scaled) base profile of its weather year and E the EV load by region,
+ both from generate_16_region_load_array. Members are built in batches with one broadcast,
+ and only the statistics are kept: per hour and region percentiles (from histograms with
+ exact per cell bounds), mean and standard deviation, and each member's regional peaks, annual
+ energy and coincident system peak. A chosen subset of members can be written out.
+ Options are described at bottom of script
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from extra_functions import DEFAULT_SCHEMES
+from load_profile import (
+    generate_16_region_load_array,
+    read_county_population_data,
+    read_ercot_load_profile,
+)
+from output_store import scheme_output_dir
+
+# histogram cells (hour x region x bin) counted per call of np.bincount
+BINCOUNT_CELLS = 2**21
+
+
+def _draw(rng, spec, n):
+    """Returns n draws of a distribution spec: a number (constant), a list (uniform choice),
+    or a dict with "distribution" "normal" (mean, std), "uniform" (low, high) or
+    "triangular" (low, mode, high)"""
+    if isinstance(spec, dict):
+        spec = dict(spec)
+        distribution = spec.pop("distribution")
+        if distribution == "normal":
+            return rng.normal(spec["mean"], spec["std"], n)
+        if distribution == "uniform":
+            return rng.uniform(spec["low"], spec["high"], n)
+        if distribution == "triangular":
+            return rng.triangular(spec["low"], spec["mode"], spec["high"], n)
+        raise ValueError(f"Unknown distribution {distribution}")
+    if isinstance(spec, (list, tuple)):
+        return rng.choice(np.asarray(spec, dtype=float), n)
+
+    return np.full(n, float(spec))
+
+
+def ensemble_draws(
+    n_members, weather_years, scaling_factor=1.018, ev_adoption=1.0, seed=0
+):
+    """Returns the seeded draws of each ensemble member
+
+    Args:
+        n_members (int): number of members
+        weather_years (list or dict): weather (base) years drawn uniformly, or dict of
+                                      weather year to probability
+        scaling_factor: annual load growth, a number, list of values or distribution dict (see _draw)
+        ev_adoption: factor EV load is multiplied by, a number, list of values or distribution dict
+                     (negative draws are set to 0)
+        seed (int): seed of the random generator, the same seed gives the same draws
+
+    Returns:
+        pandas.DataFrame: index is member, columns are weather_year, scaling_factor and ev_adoption
+    """
+    rng = np.random.default_rng(seed)
+
+    probabilities = None
+    if isinstance(weather_years, dict):
+        probabilities = np.asarray(list(weather_years.values()), dtype=float)
+        probabilities /= probabilities.sum()
+    weather_years = [str(year) for year in weather_years]
+
+    draws = pd.DataFrame(
+        {
+            "weather_year": np.asarray(weather_years)[
+                rng.choice(len(weather_years), n_members, p=probabilities)
+            ],
+            "scaling_factor": _draw(rng, scaling_factor, n_members),
+            "ev_adoption": np.maximum(_draw(rng, ev_adoption, n_members), 0.0),
+        }
+    )
+    draws.index.name = "member"
+
+    return draws
+
+
+def _growth_years(base_year, model_year, intermediate_year):
+    """Returns years of growth from the base (or intermediate) year, see year_scaling_factors"""
+    if intermediate_year and int(base_year) < int(intermediate_year):
+        return int(model_year) - int(intermediate_year)
+
+    return int(model_year) - int(base_year)
+
+
+def ensemble_components(
+    base_profile,
+    base_year,
+    model_year,
+    county_population_data,
+    ev_loads,
+    intermediate_year=None,
+    intermediate_load=None,
+    **kwargs,
+):
+    """Returns the two components of every member of a weather year, shape (hour, region):
+    the split base profile (scaled to the intermediate year if any, without annual growth)
+    and the EV load by region of model_year
+
+    Args:
+        **kwargs: other arguments of generate_16_region_load_array (schemes, population_weighting, ...)
+
+    Returns:
+        tuple: base component, EV component and dict of scheme name to list of region names
+    """
+    year_column = str(model_year)
+    no_ev = ev_loads.copy()
+    no_ev[year_column] = 0.0
+
+    components = {}
+    for name, year_ev_loads in (("base", no_ev), ("total", ev_loads)):
+        loads, names_by_scheme = generate_16_region_load_array(
+            base_profile,
+            base_year=base_year,
+            model_years=[model_year],
+            county_population_data=county_population_data,
+            ev_loads=year_ev_loads,
+            scaling_factor=1.0,
+            intermediate_year=intermediate_year,
+            intermediate_load=intermediate_load,
+            **kwargs,
+        )
+        components[name] = loads[0]
+
+    return (
+        components["base"],
+        components["total"] - components["base"],
+        names_by_scheme,
+    )
+
+
+def _cell_bounds(components, draws, growth_years):
+    """Returns exact (hour, region) minimum and maximum over all members, from the extremes
+    of each weather year's draws (members are linear in growth and adoption)"""
+    low = high = None
+    for weather_year, (base, ev) in components.items():
+        year_draws = draws[draws["weather_year"] == weather_year]
+        if year_draws.empty:
+            continue
+        growth = year_draws["scaling_factor"].to_numpy() ** growth_years[weather_year]
+        for g in (growth.min(), growth.max()):
+            for a in (
+                year_draws["ev_adoption"].min(),
+                year_draws["ev_adoption"].max(),
+            ):
+                corner = g * base + a * ev
+                low = corner if low is None else np.minimum(low, corner)
+                high = corner if high is None else np.maximum(high, corner)
+
+    return low, high
+
+
+def _add_to_histogram(counts, loads, low, width, n_bins):
+    """Adds a batch of member loads (member, hour, region) to (hour, region, bin) counts"""
+    n_hours, n_regions = loads.shape[1:]
+    bins = np.floor(
+        np.divide(loads - low, width, out=np.zeros_like(loads), where=width > 0)
+    )
+    bins = np.clip(bins, 0, n_bins - 1).astype(np.int64)
+
+    # counted a block of hours at a time, so the bincount buffer stays small
+    block_hours = max(1, BINCOUNT_CELLS // (n_regions * n_bins))
+    for start in range(0, n_hours, block_hours):
+        block = bins[:, start : start + block_hours]
+        cells = np.arange(block.shape[1] * n_regions).reshape(block.shape[1:]) * n_bins
+        counts[start : start + block_hours] += np.bincount(
+            (cells + block).ravel(), minlength=cells.size * n_bins
+        ).reshape(counts[start : start + block_hours].shape).astype(counts.dtype)
+
+
+def _histogram_percentiles(counts, low, width, percentiles, n_bins):
+    """Returns (percentile, hour, region) values from histogram counts, interpolated within bins"""
+    n_members = counts[0, 0].sum()
+    out = np.empty((len(percentiles),) + counts.shape[:2])
+
+    block_hours = max(1, BINCOUNT_CELLS // (counts.shape[1] * n_bins))
+    for start in range(0, counts.shape[0], block_hours):
+        block = slice(start, start + block_hours)
+        cumulative = counts[block].cumsum(axis=-1, dtype=np.int64)
+        for number, percentile in enumerate(percentiles):
+            rank = percentile / 100 * n_members
+            # first bin reaching the rank
+            bin_number = (cumulative < rank).sum(axis=-1).clip(max=n_bins - 1)
+            below = np.take_along_axis(
+                cumulative, bin_number[..., None] - 1, axis=-1
+            )[..., 0] * (bin_number > 0)
+            in_bin = np.take_along_axis(counts[block], bin_number[..., None], axis=-1)[
+                ..., 0
+            ]
+            fraction = np.divide(
+                rank - below,
+                in_bin,
+                out=np.zeros(in_bin.shape),
+                where=in_bin > 0,
+            ).clip(0, 1)
+            out[number, block] = low[block] + width[block] * (bin_number + fraction)
+
+    return out
+
+
+def run_ensemble(
+    load_files,
+    model_year,
+    county_population_data,
+    ev_loads,
+    draws,
+    intermediate_year=None,
+    intermediate_load=None,
+    cache_dir=None,
+    percentiles=(5, 10, 50, 90, 95),
+    n_bins=128,
+    batch_size=64,
+    schemes=None,
+    write_members=(),
+    output_dir=None,
+    **kwargs,
+):
+    """Generates every member of an ensemble in batches and returns its statistics
+
+    Args:
+        load_files (dict): keys are weather (base) years, values are paths to load files
+        model_year (numeric): Year members are scaled to
+        county_population_data (pandas.DataFrame): Contains population data for each county for each year
+        ev_loads (pandas.DataFrame): Contains EV load data for each model year, see ev_load_tensor
+        draws (pandas.DataFrame): from ensemble_draws
+        intermediate_year (numeric or str): Year of intermediate profile, optional
+        intermediate_load (pandas.DataFrame): Load profile for scaling to intermediate year
+        cache_dir (pathlib.Path): directory for parsed input files, see read_ercot_load_profile
+        percentiles (list): hourly percentiles to compute (0 to 100)
+        n_bins (int): histogram bins per hour and region, percentiles are accurate to
+                      (maximum - minimum) / n_bins of each hour and region
+        batch_size (int): members generated at once, each takes 8760 * regions * 8 bytes
+        schemes (dict): county -> region aggregation schemes, see generate_16_region_load_profiles
+        write_members (list): members whose profiles are written to
+                              output_dir / scheme / "members" / f"member_{member}.csv"
+        output_dir (pathlib.Path): directory for member files, needed if write_members is not empty
+        **kwargs: other arguments of generate_16_region_load_array (population_weighting, ev_weights, ...)
+
+    Returns:
+        dict: "percentiles" (dict of percentile to (hour, region) profile), "mean" and "std"
+              (hour, region) profiles, "peak" and "energy" of each region of each member
+              (member, region), and "system_peak" of each member (the highest hourly sum of
+              the scheme's regions). If schemes is given, dict of scheme name to such dicts
+    """
+    write_members = set(write_members)
+    if write_members and output_dir is None:
+        raise ValueError("output_dir is needed to write members")
+
+    model_year = int(model_year)
+    weather_years = sorted(set(draws["weather_year"]), key=int)
+
+    components = {}
+    growth_years = {}
+    for weather_year in weather_years:
+        base_profile = read_ercot_load_profile(
+            load_files[weather_year], cache_dir=cache_dir
+        )
+        base, ev, names_by_scheme = ensemble_components(
+            base_profile,
+            weather_year,
+            model_year,
+            county_population_data,
+            ev_loads,
+            intermediate_year=intermediate_year,
+            intermediate_load=intermediate_load,
+            schemes=schemes,
+            **kwargs,
+        )
+        components[weather_year] = (base, ev)
+        growth_years[weather_year] = _growth_years(
+            weather_year, model_year, intermediate_year
+        )
+
+    low, high = _cell_bounds(components, draws, growth_years)
+    width = (high - low) / n_bins
+    n_hours, n_regions = low.shape
+
+    counts = np.zeros((n_hours, n_regions, n_bins), dtype=np.uint32)
+    mean = np.zeros((n_hours, n_regions))
+    squares = np.zeros((n_hours, n_regions))
+    n_done = 0
+    peak = np.empty((len(draws), n_regions))
+    energy = np.empty((len(draws), n_regions))
+    system_peak = np.empty((len(draws), len(names_by_scheme)))
+    members = {}
+    scheme_columns = {}
+    column_start = 0
+    for scheme, names in names_by_scheme.items():
+        scheme_columns[scheme] = slice(column_start, column_start + len(names))
+        column_start += len(names)
+
+    positions = pd.Series(np.arange(len(draws)), index=draws.index)
+    for weather_year in weather_years:
+        base, ev = components[weather_year]
+        year_members = draws.index[draws["weather_year"] == weather_year]
+        for start in range(0, len(year_members), batch_size):
+            batch = draws.loc[year_members[start : start + batch_size]]
+            growth = batch["scaling_factor"].to_numpy() ** growth_years[weather_year]
+            adoption = batch["ev_adoption"].to_numpy()
+
+            # (member, hour, region)
+            loads = (
+                growth[:, None, None] * base[None]
+                + adoption[:, None, None] * ev[None]
+            )
+
+            _add_to_histogram(counts, loads, low, width, n_bins)
+
+            # mean and sum of squared deviations, merged batch by batch (Chan et al.)
+            n_batch = len(loads)
+            batch_mean = loads.mean(axis=0)
+            delta = batch_mean - mean
+            mean += delta * n_batch / (n_done + n_batch)
+            squares += ((loads - batch_mean) ** 2).sum(axis=0) + delta**2 * (
+                n_done * n_batch / (n_done + n_batch)
+            )
+            n_done += n_batch
+
+            rows = positions[batch.index].to_numpy()
+            peak[rows] = loads.max(axis=1)
+            energy[rows] = loads.sum(axis=1)
+            for number, columns in enumerate(scheme_columns.values()):
+                # coincident peak: highest hour of the sum of regions
+                system_peak[rows, number] = loads[:, :, columns].sum(axis=2).max(axis=1)
+
+            for member, load in zip(batch.index, loads):
+                if member in write_members:
+                    members[member] = load
+
+    hourly_percentiles = _histogram_percentiles(counts, low, width, percentiles, n_bins)
+    std = np.sqrt(squares / max(n_done - 1, 1))
+
+    out = {}
+    for number, (scheme, names) in enumerate(names_by_scheme.items()):
+        columns = scheme_columns[scheme]
+
+        def frame(values, index=None):
+            return pd.DataFrame(values[:, columns], index=index, columns=names)
+
+        out[scheme] = {
+            "percentiles": {
+                percentile: frame(values)
+                for percentile, values in zip(percentiles, hourly_percentiles)
+            },
+            "mean": frame(mean),
+            "std": frame(std),
+            "peak": frame(peak, draws.index),
+            "energy": frame(energy, draws.index),
+            "system_peak": pd.Series(system_peak[:, number], index=draws.index),
+        }
+
+        if members:
+            member_dir = scheme_output_dir(output_dir, scheme) / "members"
+            member_dir.mkdir(parents=True, exist_ok=True)
+            for member, load in members.items():
+                frame(load).to_csv(member_dir / f"member_{member}.csv")
+
+    return out if schemes is not None else out["model_region"]
+
+
+def ensemble_summary(stats, draws, percentiles=(5, 10, 50, 90, 95)):
+    """Returns distributions of each member's system and regional peak and annual energy
+
+    Args:
+        stats (dict): statistics of one scheme, from run_ensemble
+        draws (pandas.DataFrame): from ensemble_draws
+        percentiles (list): percentiles of the distributions (0 to 100)
+
+    Returns:
+        tuple: draws with each member's system (sum of regions) energy, coincident system peak
+               and the sum of its regional peaks, and (percentile, region) DataFrames of peak and
+               annual energy, with a last "system" column of the system peak and energy
+    """
+    members = draws.assign(
+        energy=stats["energy"].sum(axis=1),
+        system_peak=stats["system_peak"],
+        sum_of_regional_peaks=stats["peak"].sum(axis=1),
+    )
+    quantiles = [percentile / 100 for percentile in percentiles]
+    peak = (
+        stats["peak"]
+        .assign(system=members["system_peak"])
+        .quantile(quantiles)
+        .set_axis(list(percentiles))
+    )
+    energy = (
+        stats["energy"]
+        .assign(system=members["energy"])
+        .quantile(quantiles)
+        .set_axis(list(percentiles))
+    )
+    peak.index.name = energy.index.name = "percentile"
+
+    return members, peak, energy
+
+
+def write_ensemble(output_dir, stats, draws, summary_percentiles=(5, 10, 50, 90, 95)):
+    """Writes ensemble statistics of one scheme to output_dir: hourly percentile, mean and
+    standard deviation profiles, each member's draws and totals, and peak and energy distributions"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for percentile, df in stats["percentiles"].items():
+        df.to_csv(output_dir / f"ensemble_p{percentile:g}.csv")
+    stats["mean"].to_csv(output_dir / "ensemble_mean.csv")
+    stats["std"].to_csv(output_dir / "ensemble_std.csv")
+
+    members, peak, energy = ensemble_summary(stats, draws, summary_percentiles)
+    members.to_csv(output_dir / "ensemble_members.csv")
+    peak.to_csv(output_dir / "ensemble_peak_distribution.csv")
+    energy.to_csv(output_dir / "ensemble_energy_distribution.csv")
+
+
+if __name__ == "__main__":
+    ###### OPTIONS ######
+
+    input_dir = Path("inputs")  # location of input files
+    output_dir = Path("outputs") / "ensemble"  # location of ensemble statistics
+    data_dir = Path(
+        "data"
+    )  # location of data, looks for "county_population_data.csv" and "ev_extra_loads.csv"
+    cache_dir = input_dir / ".cache"  # location of parsed input files (None to disable)
+
+    model_year = 2035  # year every member is scaled to
+    n_members = 1000  # number of members
+    seed = 0  # seed of the draws, the same seed gives the same ensemble
+    batch_size = 64  # members generated at once (8760 * 16 * 8 bytes each)
+    n_bins = 128  # histogram bins per hour and region (percentile resolution)
+    percentiles = (5, 10, 50, 90, 95)  # hourly percentiles to write
+    write_members = [0, 1, 2]  # members whose profiles are written (empty for none)
+
+    # distributions of the draws (a number, a list of values, or a dict, see README)
+    scaling_factor = {"distribution": "normal", "mean": 1.018, "std": 0.004}
+    ev_adoption = {"distribution": "triangular", "low": 0.5, "mode": 1.0, "high": 2.0}
+
+    # weather years drawn from (uniformly)
+    load_files = {
+        str(year): input_dir / f"{year}_ercot_hourly_load_data.xls"
+        for year in range(2002, 2015)
+    }
+    load_files.update({"2015": input_dir / "native_load_2015.xls"})
+    load_files.update(
+        {
+            str(year): input_dir / f"native_Load_{year}.xlsx"
+            for year in range(2016, 2018)
+        }
+    )
+    load_files.update(
+        {
+            str(year): input_dir / f"Native_Load_{year}.xlsx"
+            for year in range(2018, 2021)
+        }
+    )
+    load_files.update({"2021": input_dir / "Native_Load_2021_NOShed.xlsx"})
+
+    ###### END OPTIONS ######
+    draws = ensemble_draws(
+        n_members,
+        list(load_files),
+        scaling_factor=scaling_factor,
+        ev_adoption=ev_adoption,
+        seed=seed,
+    )
+    stats = run_ensemble(
+        load_files,
+        model_year,
+        county_population_data=read_county_population_data(
+            data_dir / "county_population_data.csv"
+        ),
+        ev_loads=pd.read_csv(data_dir / "ev_extra_loads.csv"),
+        draws=draws,
+        cache_dir=cache_dir,
+        percentiles=percentiles,
+        n_bins=n_bins,
+        batch_size=batch_size,
+        schemes=DEFAULT_SCHEMES,
+        write_members=write_members,
+        output_dir=output_dir,
+    )
+    for scheme, scheme_stats in stats.items():
+        write_ensemble(scheme_output_dir(output_dir, scheme), scheme_stats, draws)
+    print(f"wrote statistics of {n_members} members to {output_dir}")
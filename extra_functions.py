@@ -1,3 +1,7 @@
+import re
+import threading
+from collections import OrderedDict
+
 import pandas as pd
 
 
@@ -34,6 +38,72 @@ def process_county_region_mapping(county_data, region_column):
     return county_data
 
 
+# county -> region aggregation schemes, see aggregation_regions
+DEFAULT_SCHEMES = {"model_region": {"column": "model_region"}}
+
+
+def region_sort_key(name):
+    """Sort key ordering region names by their numeric prefix (e.g. "2_x" before "10_y"),
+    names without one come after, alphabetically"""
+    match = re.match(r"\d+", str(name))
+    if match:
+        return (0, int(match[0]), str(name))
+
+    return (1, 0, str(name))
+
+
+def aggregation_regions(county_population_data, schemes=None):
+    """Returns each county's region under each aggregation scheme and the order of each scheme's regions
+
+    Args:
+        county_population_data (pandas.DataFrame): Contains "county" and any region columns used by schemes
+        schemes (dict): keys are scheme names, values are dicts with either
+                        "column": column of county_population_data containing each county's region, or
+                        "mapping": dict of county to region, or path to a CSV with county and region columns,
+                        and optionally "order": list of the scheme's regions in output order
+                        (if missing, regions are ordered by numeric prefix, see region_sort_key).
+                        If None, DEFAULT_SCHEMES (the model_region column)
+
+    Returns:
+        tuple: pandas.DataFrame of regions (same index as county_population_data, one column per scheme)
+               and dict of scheme name to list of regions
+    """
+    if schemes is None:
+        schemes = DEFAULT_SCHEMES
+
+    regions = pd.DataFrame(index=county_population_data.index)
+    orders = {}
+    for scheme, spec in schemes.items():
+        if "column" in spec:
+            scheme_regions = county_population_data[spec["column"]]
+        else:
+            mapping = spec["mapping"]
+            if not isinstance(mapping, dict):
+                mapping_file = pd.read_csv(mapping)
+                mapping = dict(zip(mapping_file.iloc[:, 0], mapping_file.iloc[:, 1]))
+            scheme_regions = county_population_data["county"].map(mapping)
+
+        unmapped = county_population_data["county"][scheme_regions.isna()]
+        if len(unmapped):
+            raise ValueError(
+                f"counties without a region in scheme {scheme}: {list(unmapped)}"
+            )
+
+        order = spec.get("order")
+        if order is None:
+            order = sorted(set(scheme_regions), key=region_sort_key)
+        elif set(scheme_regions) - set(order):
+            raise ValueError(
+                f"regions missing from order of scheme {scheme}: "
+                f"{sorted(set(scheme_regions) - set(order))}"
+            )
+
+        regions[scheme] = scheme_regions
+        orders[scheme] = list(order)
+
+    return regions, orders
+
+
 # def EV_load_by_model_region(load_zones, ev_data, county_regions):
 #     # Finding the total population of ERCOT
 #     NON_LOAD = county_regions[county_regions.cdr_zone.isin(["non-load", "none"])]
@@ -99,10 +169,10 @@ def separate_date_time(df):
         pandas.DataFrame: DataFrame with separate columns for Year, Month, Day, and Period
     """
 
-    df["Year"] = [d.year for d in df["date_time"]]
-    df["Month"] = [d.month for d in df["date_time"]]
-    df["Day"] = [d.day for d in df["date_time"]]
-    df["Period"] = [d.hour for d in df["date_time"]]
+    df["Year"] = df["date_time"].dt.year
+    df["Month"] = df["date_time"].dt.month
+    df["Day"] = df["date_time"].dt.day
+    df["Period"] = df["date_time"].dt.hour
     df = df.drop(columns=["date_time"])
 
     # Rearrange columns
@@ -113,9 +183,149 @@ def separate_date_time(df):
     return df
 
 
+def ercot_timestamps(hour_ending):
+    """Parses ERCOT hour ending labels into the (tz-aware, America/Chicago) beginning of each interval.
+
+    Handles both ERCOT formats in bulk, including files that mix them:
+        "01/01/2018 01:00" ... "01/01/2018 24:00", with the repeated fall back hour labeled "02:00 DST"
+        "2002-01-01 01:00:00.003" ... "2002-01-01 23:59:59.997" (off by a few milliseconds)
+    The first of two identical (fall back) intervals is daylight time and the second standard time.
+    Intervals that would begin in the skipped spring forward hour (older files label that hour
+    "03:00" rather than "02:00") begin an hour earlier, in standard time.
+    The interval length is the most common step between labels, so sub-hourly data also works.
+
+    Args:
+        hour_ending (pandas.Series): hour ending labels (strings or datetimes)
+
+    Returns:
+        pandas.DatetimeIndex: beginning of each interval, same length as hour_ending
+    """
+    hour_ending = pd.Series(hour_ending).reset_index(drop=True)
+
+    if pd.api.types.is_datetime64_any_dtype(hour_ending):
+        times = hour_ending
+    else:
+        labels = hour_ending.astype(str).str.removesuffix("DST").str.rstrip()
+
+        # dates and times of day repeat, so each unique one is only parsed once
+        date_codes, dates = pd.factorize(labels.str[:10])
+        time_codes, times_of_day = pd.factorize(labels.str[11:])
+        times_of_day = pd.Series(times_of_day)
+        times_of_day = times_of_day.where(
+            times_of_day.str.count(":") > 1, times_of_day + ":00"
+        )
+
+        # "24:00" parses as a full day, i.e. midnight of the next day
+        times = pd.Series(
+            pd.to_datetime(pd.Series(dates), format="mixed").to_numpy()[date_codes]
+            + pd.to_timedelta(times_of_day).to_numpy()[time_codes]
+        )
+
+    times = times.dt.round("min")
+    interval = times.diff().mode().iloc[0]
+    interval_beginning = times - interval
+
+    return pd.DatetimeIndex(interval_beginning).tz_localize(
+        "America/Chicago",
+        ambiguous=~interval_beginning.duplicated(keep="first").to_numpy(),
+        nonexistent=-pd.Timedelta(hours=1),
+    )
+
+
+def new_lru_cache(max_size):
+    """Returns an empty least recently used cache of at most max_size entries, see cached"""
+    return {"entries": OrderedDict(), "max_size": max_size, "lock": threading.Lock()}
+
+
+def cached(cache, key, load):
+    """Returns cached value of key, calling load() and evicting the least recently used
+    entry when it is not in the cache. Safe to call from several threads (load may then
+    run more than once for the same key)
+
+    Args:
+        cache (dict): see new_lru_cache
+        key (hashable): key of value
+        load (callable): returns the value of key
+
+    Returns:
+        value of key
+    """
+    entries = cache["entries"]
+    with cache["lock"]:
+        if key in entries:
+            entries.move_to_end(key)
+            return entries[key]
+
+    value = load()
+    with cache["lock"]:
+        entries[key] = value
+        while len(entries) > cache["max_size"]:
+            entries.popitem(last=False)
+
+    return value
+
+
+# parsed timestamps and leap day masks by hash of hour ending labels (a few per weather
+# year), see profile_timestamps
+_timestamp_cache = new_lru_cache(64)
+
+
+def profile_timestamps(profile, time_column="Hour Ending"):
+    """Returns ercot_timestamps of a profile and which of its intervals begin on Feb 29.
+    Labels are only parsed once per distinct time column (hashing them is several times
+    faster than parsing), so repeated calls on the same base profile are cheap
+
+    Args:
+        profile (pandas.DataFrame): load profile with ERCOT hour ending labels in time_column
+        time_column (str): column with hour ending labels
+
+    Returns:
+        tuple: pandas.DatetimeIndex (see ercot_timestamps) and numpy.ndarray leap day mask
+    """
+    key = (
+        pd.util.hash_pandas_object(profile[time_column], index=False).to_numpy().tobytes()
+    )
+
+    def parse():
+        timestamps = ercot_timestamps(profile[time_column])
+        leap_day = (timestamps.month == 2) & (timestamps.day == 29)
+        return timestamps, leap_day
+
+    return cached(_timestamp_cache, key, parse)
+
+
+def drop_leap_days(profile, time_column="Hour Ending"):
+    """Drops every interval beginning on Feb 29 (by calendar date, not row position)
+
+    Args:
+        profile (pandas.DataFrame): load profile with ERCOT hour ending labels in time_column
+        time_column (str): column with hour ending labels
+
+    Returns:
+        pandas.DataFrame: profile without leap days, with a new RangeIndex
+    """
+    _, leap_day = profile_timestamps(profile, time_column)
+
+    return profile[~leap_day].reset_index(drop=True)
+
+
+def drop_repeated_dst_hours(profile, time_column="Hour Ending"):
+    """Drops the second (standard time) occurrence of the intervals repeated when DST ends
+
+    Args:
+        profile (pandas.DataFrame): load profile with ERCOT hour ending labels in time_column
+        time_column (str): column with hour ending labels
+
+    Returns:
+        pandas.DataFrame: profile with one interval per local clock time, with a new RangeIndex
+    """
+    timestamps = ercot_timestamps(profile[time_column]).tz_localize(None)
+
+    return profile[~timestamps.duplicated(keep="first")].reset_index(drop=True)
+
+
 def ERCOT_hour_ending_to_datetime(base_profile):
-    """Gets timeseries of ERCOT load profile, does something with adjusting for DST
-    TODO Document or prove necessity of this function
+    """Gets timeseries of ERCOT load profile as the local (clock) time at the beginning of each hour
 
     Args:
         base_profile (pandas.DataFrame): load profile
@@ -124,35 +334,9 @@ def ERCOT_hour_ending_to_datetime(base_profile):
         pandas.DataFrame: DataFrame with separate columns for Year, Month, Day, and Period
     """
     date_time = pd.DataFrame()
-
-    times = base_profile["Hour Ending"]
-    times7 = times.copy()
-    times2 = []
-
-    for i in range(len(times)):
-        if "DST" in times[i]:
-            times[i] = times[i].replace("DST", "")
-        for j in range(1, 10):
-            hour_check = " 0%s:" % str(j)
-            hour_new = " 0%s:" % str(j - 1)
-            if hour_check in times[i]:
-                times2.append(times[i].replace(hour_check, hour_new))
-        for j in range(10, 11):
-            hour_check = " %s:" % str(j)
-            hour_new = " 0%s:" % str(j - 1)
-            if hour_check in times[i]:
-                times2.append(times[i].replace(hour_check, hour_new))
-        for j in range(11, 25):
-            hour_check = " %s:" % str(j)
-            hour_new = " %s:" % str(j - 1)
-            if hour_check in times[i]:
-                times2.append(times[i].replace(hour_check, hour_new))
-
-    date_time["date_time"] = pd.to_datetime(times2, infer_datetime_format=True)
+    date_time["date_time"] = ercot_timestamps(base_profile["Hour Ending"]).tz_localize(
+        None
+    )
     date_time = separate_date_time(date_time)
 
     return date_time
-
-
-def set_tz(q):
-    return q.tz_localize("America/Chicago", ambiguous=True)
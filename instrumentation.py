@@ -0,0 +1,197 @@
+"""
+ Optional per-stage instrumentation of LoadGenome runs.
+
+ A run report is a dict holding a list of stage records and a list of callbacks.
+ Code wraps each stage in `with stage(report, "name", ...) as record:` and may add
+ "rows" and "bytes" to the record. When the stage ends, its wall time, CPU time and
+ memory are added, the record is appended to the report and every callback is called
+ with it (e.g. for progress bars or telemetry).
+ When report is None, stages are not recorded and cost nothing.
+
+ Memory of a stage is its change in resident memory and, if the report traces memory
+ (tracemalloc, which slows Python allocations down), the peak memory allocated during the
+ stage. Both are process-wide, so stages running at the same time on other threads (e.g.
+ writes in main) are included. The process' resident high-water mark at the end of each
+ stage is kept for reference, but it never goes down, so it says little about later stages.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+# stages running on each thread, innermost last, see stage
+_active_stages = threading.local()
+
+
+def new_run_report(callbacks=(), trace_memory=False):
+    """Returns an empty run report
+
+    Args:
+        callbacks (list): functions called with each stage record as the stage ends
+        trace_memory (bool): record the peak memory allocated during each stage, by
+                             starting tracemalloc (several times slower allocations)
+
+    Returns:
+        dict: run report
+    """
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    return {"stages": [], "callbacks": list(callbacks), "trace_memory": trace_memory}
+
+
+def rss_bytes():
+    """Returns resident memory of this process, in bytes (None if unknown)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):  # not Linux
+        return None
+
+
+def process_peak_rss_bytes():
+    """Returns peak resident memory of this process so far, in bytes (None if unknown)"""
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@contextmanager
+def stage(report, name, **info):
+    """Records wall time, CPU time and memory of a stage in report
+
+    Args:
+        report (dict): run report from new_run_report, nothing is recorded if None
+        name (str): name of stage
+        **info: added to the stage record, e.g. base_year
+
+    Yields:
+        dict: stage record, to which "rows" and "bytes" processed can be added.
+              "rss_delta_bytes" is the change in resident memory from start to end of the stage,
+              "peak_traced_bytes" (if the report traces memory) the most memory allocated during
+              the stage above what was allocated at its start, and "process_peak_rss_bytes"
+              the process' resident high-water mark at the end of the stage
+    """
+    record = {"stage": name} | info
+    if report is None:
+        yield record
+        return
+
+    trace = report.get("trace_memory", False) and tracemalloc.is_tracing()
+    if trace:
+        # the peak is reset for this stage, so the stages around it keep theirs in max_traced
+        if not hasattr(_active_stages, "stages"):
+            _active_stages.stages = []
+        active = _active_stages.stages
+        traced, peak = tracemalloc.get_traced_memory()
+        if active:
+            active[-1]["max_traced"] = max(active[-1]["max_traced"], peak)
+        tracemalloc.reset_peak()
+        frame = {"start_traced": traced, "max_traced": traced}
+        active.append(frame)
+
+    rss_start = rss_bytes()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield record
+    finally:
+        if trace:
+            frame["max_traced"] = max(frame["max_traced"], tracemalloc.get_traced_memory()[1])
+            active.pop()
+            if active:
+                active[-1]["max_traced"] = max(active[-1]["max_traced"], frame["max_traced"])
+
+    record["wall_seconds"] = time.perf_counter() - wall_start
+    record["cpu_seconds"] = time.process_time() - cpu_start
+    rss_end = rss_bytes()
+    record["rss_delta_bytes"] = (
+        None if rss_start is None or rss_end is None else rss_end - rss_start
+    )
+    if trace:
+        record["peak_traced_bytes"] = frame["max_traced"] - frame["start_traced"]
+    record["process_peak_rss_bytes"] = process_peak_rss_bytes()
+
+    add_stage_records(report, [record])
+
+
+def add_stage_records(report, records):
+    """Appends finished stage records to report (e.g. records returned from worker processes)
+    and calls the report's callbacks with each"""
+    for record in records:
+        report["stages"].append(record)
+        for callback in report["callbacks"]:
+            callback(record)
+
+
+def run_report_table(report):
+    """Returns stage records of report as a DataFrame"""
+    return pd.DataFrame(report["stages"])
+
+
+def summarize_run_report(report):
+    """Returns total time, rows and bytes, and largest memory use, of each stage
+    (in order of first appearance)
+
+    Args:
+        report (dict): run report
+
+    Returns:
+        pandas.DataFrame: index is stage name
+    """
+    table = run_report_table(report)
+    for column in (
+        "rows",
+        "bytes",
+        "rss_delta_bytes",
+        "peak_traced_bytes",
+        "process_peak_rss_bytes",
+    ):
+        if column not in table:
+            table[column] = None
+
+    summary = table.groupby("stage", sort=False).agg(
+        count=("stage", "size"),
+        wall_seconds=("wall_seconds", "sum"),
+        cpu_seconds=("cpu_seconds", "sum"),
+        rows=("rows", "sum"),
+        bytes=("bytes", "sum"),
+        max_rss_delta_bytes=("rss_delta_bytes", "max"),
+        peak_traced_bytes=("peak_traced_bytes", "max"),
+        process_peak_rss_bytes=("process_peak_rss_bytes", "max"),
+    )
+    summary["wall_percent"] = 100 * summary["wall_seconds"] / summary["wall_seconds"].sum()
+
+    return summary
+
+
+def write_run_report(report, path):
+    """Writes stage records of report as JSON or CSV (by suffix of path)
+
+    Args:
+        report (dict): run report
+        path (pathlib.Path): file to write, ending in .json or .csv
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if path.suffix == ".csv":
+        run_report_table(report).to_csv(path, index=False)
+    else:
+        path.write_text(json.dumps(report["stages"], indent=1, default=str))
@@ -3,44 +3,265 @@
  Options are described at bottom of script
 """
 
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 from warnings import simplefilter
 
+import numpy as np
 import pandas as pd
 
+from extra_functions import (
+    DEFAULT_SCHEMES,
+    aggregation_regions,
+    cached,
+    drop_leap_days,
+    new_lru_cache,
+)
+from instrumentation import (
+    new_run_report,
+    stage,
+    summarize_run_report,
+    write_run_report,
+)
+from manifest import (
+    read_manifest,
+    scenario_records,
+    stale_model_years,
+    update_manifest,
+    write_manifest,
+)
+from output_store import (
+    output_file,
+    scheme_output_dir,
+    write_store,
+    write_store_index,
+)
+from pyramid import write_scenario_pyramids
+from summary import write_scenario_summaries, write_summary_index
+from targets import apply_targets, read_targets
+
 simplefilter(action="ignore", category=pd.errors.PerformanceWarning)
 
 pd.options.mode.chained_assignment = None
 
 
-def load_by_16_region(load, county_population_data):
+def load_by_16_region(load, county_population_data=None, allocation=None):
     """Separates ERCOT cdr load profiles into 16 regions,
-    requires preprocessing with county_population_data to include cdr_zone_percent"""
-    # more of a code block/abstraction than a true function
-
-    # create a profile for each county based on percentage of population in cdr_zone
-    # by multiplying profile by that percentage
-    county_loads = county_population_data.apply(
-        lambda x: load[x["cdr_zone"]] * x["cdr_zone_percent"], axis=1
-    ).T
-
-    # aggregate county profiles into model region profiles
-    # model_region_loads = load[
-    #     ["Year", "Month", "Day", "Period"]
-    # ]  # initialize with time columns
-    model_region_loads = pd.DataFrame()
-    for model_region in set(county_population_data["model_region"]):
-        model_region_loads[model_region] = county_loads[
-            county_population_data.index[
-                county_population_data["model_region"] == model_region
-            ].tolist()
-        ].sum(
-            axis=1
-        )  # summing loads for each county in model region
+    requires preprocessing with county_population_data to include cdr_zone_percent
+    (or a precomputed allocation matrix, see allocation_matrix)"""
+    if allocation is None:
+        allocation = allocation_matrix(county_population_data)
+
+    # a single (hour x cdr zone) @ (cdr zone x model region) product replaces
+    # building one profile per county and summing them by model region
+    model_region_loads = pd.DataFrame(
+        zone_load_array(load, allocation.index) @ allocation.to_numpy(),
+        index=load.index,
+        columns=allocation.columns,
+    )
 
     return model_region_loads
 
 
+def allocation_matrix(
+    county_population_data, weight_column="cdr_zone_percent", region_column="model_region"
+):
+    """Collapses county weights into a cdr zone by model region allocation matrix.
+    Each value is the fraction of a cdr zone's load assigned to a model region,
+    so each row sums to 1 and splitting a profile with the matrix conserves energy.
+
+    Args:
+        county_population_data (pandas.DataFrame): Contains "cdr_zone", region_column and weight_column
+        weight_column (string): column containing each county's fraction of its cdr zone
+        region_column (string): column containing each county's region
+
+    Returns:
+        pandas.DataFrame: index is cdr zones, columns are model regions
+    """
+    return (
+        county_population_data.groupby(["cdr_zone", region_column])[weight_column]
+        .sum()
+        .unstack(fill_value=0.0)
+    )
+
+
+# allocation matrices by (population year, hash of county data), see allocation_matrix_for_year
+_allocation_cache = new_lru_cache(64)
+
+
+def allocation_matrix_for_year(
+    county_population_data, population_year, region_column="model_region"
+):
+    """Returns the allocation matrix weighted by the population in column population_year,
+    cached so that repeated calls for the same population data skip the county preprocessing
+
+    Args:
+        county_population_data (pandas.DataFrame): Contains "cdr_zone", region_column and population_year
+        population_year (str): population column used for weighting
+        region_column (string): column containing each county's region
+
+    Returns:
+        pandas.DataFrame: index is cdr zones, columns are model regions
+    """
+    county_data = county_population_data[["cdr_zone", region_column, population_year]]
+    key = (
+        population_year,
+        region_column,
+        pd.util.hash_pandas_object(county_data, index=False).to_numpy().tobytes(),
+    )
+
+    def build():
+        weights = county_data.rename(columns={population_year: "population"})
+        weights["cdr_zone_percent"] = percentage_of_whole_for_each(
+            weights, "population", "cdr_zone"
+        )
+        return allocation_matrix(weights, region_column=region_column)
+
+    return cached(_allocation_cache, key, build)
+
+
+def population_by_year(county_population_data, years, trend_years=10):
+    """Returns each county's population in each of years, from the yearly population columns
+    (e.g. "1997" to "2021", and any projection columns added to the data).
+    Years between columns are linearly interpolated, years after the last column are extrapolated
+    with each county's compound annual growth over the last trend_years, and years before
+    the first column use the first column
+
+    Args:
+        county_population_data (pandas.DataFrame): Contains a population column for each year
+        years (list): years to return populations for
+        trend_years (int): number of years used for each county's growth rate when extrapolating
+
+    Returns:
+        pandas.DataFrame: same index as county_population_data, one column per year (as str)
+    """
+    year_columns = sorted(
+        (column for column in county_population_data.columns if str(column).isdigit()),
+        key=int,
+    )
+    known_years = np.array([int(column) for column in year_columns])
+    known = county_population_data[year_columns].to_numpy(dtype=float)
+    years = np.asarray([int(year) for year in years])
+
+    # linear interpolation between the bracketing columns (clipped to the known range)
+    clipped_years = np.clip(years, known_years[0], known_years[-1])
+    upper = np.clip(np.searchsorted(known_years, clipped_years), 1, len(known_years) - 1)
+    lower = upper - 1
+    fraction = (clipped_years - known_years[lower]) / (
+        known_years[upper] - known_years[lower]
+    )
+    population = known[:, lower] * (1 - fraction) + known[:, upper] * fraction
+
+    # compound growth after the last column
+    trend_start = np.searchsorted(known_years, known_years[-1] - trend_years)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = (known[:, -1] / known[:, trend_start]) ** (
+            1 / (known_years[-1] - known_years[trend_start])
+        )
+    growth = np.where(np.isfinite(growth), growth, 1.0)
+    years_after = np.maximum(years - known_years[-1], 0)
+    population = population * growth[:, None] ** years_after[None, :]
+
+    return pd.DataFrame(
+        population,
+        index=county_population_data.index,
+        columns=[str(year) for year in years],
+    )
+
+
+# allocation tensors by (years, trend years, hash of county data and regions), see allocation_tensor
+_allocation_tensor_cache = new_lru_cache(16)
+
+
+def allocation_tensor(county_population_data, years, schemes=None, trend_years=10):
+    """Returns cdr zone -> region weights and EV load fractions of every region of every
+    aggregation scheme for each of years, with the population of each year (see population_by_year),
+    built as one (year, cdr zone, region) tensor
+
+    Args:
+        county_population_data (pandas.DataFrame): Contains "cdr_zone", yearly population columns
+                                                   and any region columns used by schemes
+        years (list): years to build weights for, e.g. model years
+        schemes (dict): county -> region aggregation schemes, see aggregation_regions
+        trend_years (int): see population_by_year
+
+    Returns:
+        tuple: allocation numpy.ndarray with shape (year, cdr zone, region), EV fractions
+               numpy.ndarray with shape (year, region), dict of scheme name to list of region
+               names (regions of each scheme follow each other along the last axes) and
+               list of cdr zones
+    """
+    regions, names_by_scheme = aggregation_regions(county_population_data, schemes)
+    key = (
+        tuple(int(year) for year in years),
+        trend_years,
+        tuple((scheme, tuple(names)) for scheme, names in names_by_scheme.items()),
+        pd.util.hash_pandas_object(
+            pd.concat([county_population_data, regions.add_prefix("scheme ")], axis=1),
+            index=False,
+        )
+        .to_numpy()
+        .tobytes(),
+    )
+
+    def build():
+        # (year, county)
+        population = population_by_year(
+            county_population_data, years, trend_years
+        ).to_numpy().T
+
+        zones = sorted(set(county_population_data["cdr_zone"]))
+        # (county, cdr zone) and (county, region) indicator matrices
+        county_zones = indicator_matrix(county_population_data["cdr_zone"], zones)
+        county_regions = scheme_indicator_matrix(regions, names_by_scheme)
+
+        # each county's fraction of its cdr zone's population, (year, county). Products are
+        # einsums (not BLAS matmuls, whose rounding depends on the number of years), so each
+        # year's weights are the same whichever other years are built with it (see chunked.py)
+        zone_population = np.einsum("yc,cz->yz", population, county_zones)
+        zone_fraction = population / np.einsum("yz,cz->yc", zone_population, county_zones)
+
+        # (year, cdr zone, region), rows sum to 1 for each scheme
+        allocation = np.einsum(
+            "yc,cz,cr->yzr", zone_fraction, county_zones, county_regions
+        )
+        # each region's fraction of total population, (year, region)
+        ev_fractions = np.einsum("yc,cr->yr", population, county_regions) / population.sum(
+            axis=1, keepdims=True
+        )
+
+        return allocation, ev_fractions, names_by_scheme, zones
+
+    return cached(_allocation_tensor_cache, key, build)
+
+
+def indicator_matrix(values, names):
+    """Returns (value, name) matrix that is 1 where values[i] == names[j] and 0 elsewhere"""
+    return (np.asarray(values)[:, None] == np.asarray(names)[None, :]).astype(float)
+
+
+def scheme_indicator_matrix(regions, names_by_scheme):
+    """Returns (county, region) indicator matrix of every scheme's regions, one after the other
+
+    Args:
+        regions (pandas.DataFrame): each county's region under each scheme, see aggregation_regions
+        names_by_scheme (dict): scheme name to list of region names, see aggregation_regions
+
+    Returns:
+        numpy.ndarray: shape (county, region)
+    """
+    return np.concatenate(
+        [
+            indicator_matrix(regions[scheme], names)
+            for scheme, names in names_by_scheme.items()
+        ],
+        axis=1,
+    )
+
+
 def percentage_of_whole_for_each(df, value_column, group_by_column):
     """returns a pandas series of the fractional value of each value in
     'value_column' where the whole is the the sum of all values (in value column)
@@ -120,6 +341,16 @@ def generate_16_region_load_profiles(
     intermediate_load=None,
     output_dir=None,
     outputs_to_file=True,
+    report=None,
+    dtype="float64",
+    memory_budget=None,
+    flush=None,
+    schemes=None,
+    population_weighting="base_year",
+    trend_years=10,
+    ev_weights=None,
+    ev_region_column="model_region",
+    targets=None,
 ):
     """Scales base profile to intermediate profile's energy, and then scales that 1.018 per year to each model year
 
@@ -129,150 +360,637 @@ def generate_16_region_load_profiles(
         output_dir (pathlib.Path): directory for output files
         model_years (list): list of years the model needs load data for
         county_population_data (pandas.DataFrame): Contains population data for each county for each model year
-        ev_loads (pandas.DataFrame): Contains EV load data for each county for each model year (24 hours)
+        ev_loads (pandas.DataFrame): Contains EV load data for each model year (24 or 8760 hours),
+                                     optionally per EV region (see ev_load_tensor)
         scaling_factor (float like): Factor to scale load by each year (from first model year)
         intermediate_year (numeric or str): Year of intermediate profile, only used for file naming purposes
                                             if none, does not scale to intermediate profile
                                             also does not scale if base year >= intermediate year
         intermediate_load (pandas.DataFrame): Load profile for scaling to intermediate year, scales on total energy
+        report (dict): optional run report, see instrumentation.py
+        dtype (str): "float64" or "float32" load profiles, float32 halves memory use (and
+                     CSV size, as values are written with float32 precision)
+        memory_budget (int): bytes of load profiles held at once, model years are generated in
+                             batches that fit (at least one model year per batch). If None, all at once
+        flush (callable): called with out after each batch (e.g. to write the batch to file),
+                          after which the batch is dropped from out
+        schemes (dict): county -> region aggregation schemes, see aggregation_regions.
+                        All schemes are computed in one pass, and out is keyed by scheme name first.
+                        Files of schemes other than "model_region" go in output_dir / scheme name
+        population_weighting (str): "base_year" splits load with the base year's population,
+                                    "model_year" with each model year's, interpolated between the
+                                    population columns and extrapolated past them (see population_by_year)
+        trend_years (int): see population_by_year
+        ev_weights (str): column of county_population_data EV load is split between counties by,
+                          if None, population (see population_weighting)
+        ev_region_column (str): column of county_population_data containing the EV region of each county,
+                                used when ev_loads has a "region" column (see ev_load_tensor)
+        targets (pandas.DataFrame): annual energy and peak targets by region and model year,
+                                    see generate_16_region_load_array. Only targeted regions are
+                                    transformed, regions of other schemes (e.g. the counties of a
+                                    targeted model region) keep scaling_factor growth
 
     Returns:
         dict: keys are years, values are load profiles for each model region
+              (only those not passed to flush). If schemes is given, keys are scheme names
+              and values are such dicts
     """
+    model_years = list(model_years)
+
+    batch_size = len(model_years)
+    if memory_budget is not None:
+        _, names_by_scheme = aggregation_regions(county_population_data, schemes)
+        # bytes of one model year's profiles
+        year_bytes = (
+            len(base_profile)
+            * sum(len(names) for names in names_by_scheme.values())
+            * np.dtype(dtype).itemsize
+        )
+        batch_size = max(1, min(batch_size, memory_budget // year_bytes))
 
-    # true if intermediate year is not none and base year is less than intermediate year
-    int_year_bool = intermediate_year and (int(base_year) < int(intermediate_year))
+    out = {}
+    for batch_start in range(0, len(model_years), batch_size):
+        batch_years = model_years[batch_start : batch_start + batch_size]
 
-    if int_year_bool:
-        # calculate sum
-        intermediate_load_no_tz = intermediate_load.drop(columns=["Hour Ending"])
-        intermediate_sum = intermediate_load_no_tz.sum().sum()
+        # model years (and schemes) of a batch are computed together
+        loads, names_by_scheme = generate_16_region_load_array(
+            base_profile,
+            base_year=base_year,
+            model_years=batch_years,
+            county_population_data=county_population_data,
+            ev_loads=ev_loads,
+            scaling_factor=scaling_factor,
+            intermediate_year=intermediate_year,
+            intermediate_load=intermediate_load,
+            report=report,
+            dtype=dtype,
+            schemes=schemes,
+            population_weighting=population_weighting,
+            trend_years=trend_years,
+            ev_weights=ev_weights,
+            ev_region_column=ev_region_column,
+            targets=targets,
+        )
 
-    if outputs_to_file:
-        # make output folder
-        output_dir_year = output_dir / f"load_base_{base_year}"
+        column_start = 0
+        for scheme, names_16_region in names_by_scheme.items():
+            scheme_loads = loads[:, :, column_start : column_start + len(names_16_region)]
+            column_start += len(names_16_region)
+
+            scheme_out = out
+            if schemes is not None:
+                scheme_out = out.setdefault(scheme, {})
+
+            for model_year, load in zip(batch_years, scheme_loads):
+                # a view of loads, not a copy
+                load_profile_16_region_scaled = pd.DataFrame(
+                    load, columns=names_16_region, copy=False
+                )
+
+                # save to dict
+                if outputs_to_file:
+                    file = output_file(
+                        scheme_output_dir(output_dir, scheme),
+                        base_year,
+                        model_year,
+                        intermediate_year,
+                    )
+                    file.parent.mkdir(parents=True, exist_ok=True)
+                    scheme_out[file] = load_profile_16_region_scaled
+                else:
+                    scheme_out[model_year] = load_profile_16_region_scaled
+
+        if flush is not None:
+            flush(out)
+            out = {}
 
-        if int_year_bool:
-            # change dir if intermediate year
-            output_dir_year = output_dir_year / f"load_intermediate_{intermediate_year}"
+    return out
 
-        output_dir_year.mkdir(parents=True, exist_ok=True)
 
-    base_profile.drop(["Hour Ending"], axis=1, inplace=True)
+def generate_16_region_load_array(
+    base_profile,
+    base_year,
+    model_years,
+    county_population_data,
+    ev_loads,
+    scaling_factor=1.018,
+    intermediate_year=None,
+    intermediate_load=None,
+    report=None,
+    dtype="float64",
+    schemes=None,
+    population_weighting="base_year",
+    trend_years=10,
+    ev_weights=None,
+    ev_region_column="model_region",
+    hours=None,
+    base_total=None,
+    out=None,
+    targets=None,
+):
+    """Batched core of generate_16_region_load_profiles. The base profile is split into
+    the regions of every aggregation scheme at once (with one batched product for every
+    model year's population weights), then the intermediate energy factor, yearly scaling
+    and EV load are applied to every model year in a single broadcast
 
-    ## process population data for given base year
-    county_population_data = county_population_data[
-        ["county", "cdr_zone", "model_region", base_year]
-    ]
-    county_population_data.rename(columns={base_year: "population"}, inplace=True)
+    Args:
+        base_profile (pandas.DataFrame): Load profile for base year
+        base_year (numeric): Year of initial profile
+        model_years (list): list of years the model needs load data for
+        county_population_data (pandas.DataFrame): Contains population data for each county for each model year
+        ev_loads (pandas.DataFrame): Contains EV load data for each model year (24 or 8760 hours)
+        scaling_factor (float like): Factor to scale load by each year (from first model year)
+        intermediate_year (numeric or str): Year of intermediate profile, see generate_16_region_load_profiles
+        intermediate_load (pandas.DataFrame): Load profile for scaling to intermediate year, scales on total energy
+        report (dict): optional run report, see instrumentation.py
+        dtype (str): "float64" or "float32" for the returned loads, the regional split and
+                     conservation check are always done in float64
+        schemes (dict): county -> region aggregation schemes, see aggregation_regions
+        population_weighting (str): "base_year" splits load with the base year's population,
+                                    "model_year" with each model year's (see population_by_year)
+        trend_years (int): years of population growth extrapolated past the last population column,
+                           see population_by_year
+        ev_weights (str): column of county_population_data EV load is split between counties by,
+                          if None, population (of the base year or each model year, see population_weighting)
+        ev_region_column (str): column of county_population_data containing the EV region of each county,
+                                used when EV loads are per region (see ev_load_tensor)
+        hours (slice): hours of the year returned, if None all. base_profile must then hold just
+                       those hours (with leap days already dropped), and base_total is needed, so each
+                       slice of hours is identical to the same hours of the whole year without splitting
+                       the whole year (see chunked.py). With 24 hour EV loads, it must start at a
+                       multiple of 24 hours
+        base_total (float): total load of the whole year's split, as returned by split_by_region
+                            (with the first model year's allocation), only used with hours
+        out (numpy.ndarray): buffer the loads are written to, shape (model year, hour, region)
+                             and dtype dtype, e.g. to reuse one buffer for many calls. If None, allocated
+        targets (pandas.DataFrame): annual energy and peak targets by region and model year, see
+                                    targets.read_targets. Targeted regions are transformed to match them
+                                    after scaling and EV loads are added (see targets.apply_targets),
+                                    so scaling_factor and intermediate scaling only matter for the others.
+                                    Regions of other schemes are not adjusted, so schemes no longer add up
+                                    to the same total. Raises ValueError if a transform makes loads negative
 
-    # get percent cdr, percent model_region
-    county_population_data["cdr_zone_percent"] = percentage_of_whole_for_each(
-        county_population_data, "population", "cdr_zone"
-    )
-    county_population_data.set_index("county", inplace=True)
+    Returns:
+        tuple: numpy.ndarray with shape (model year, hour, region) and dict of scheme name to
+               list of region names, the regions of each scheme follow each other along the last axis
+    """
 
-    # get percent of population in each model region (for splitting EV load)
-    population_fraction_16_region = percentage_of_whole(
-        county_population_data, "population", "model_region"
-    )
+    # stage records of report are labeled with the scenario
+    info = {"base_year": base_year, "intermediate_year": intermediate_year}
 
-    ## get region names
-    names_16_region = list(set(county_population_data["model_region"]))
-    names_cdr_region = list(set(county_population_data["cdr_zone"]))
+    with stage(report, "drop_leap_days", **info) as record:
+        if hours is None:
+            # drop leap day (by date), if relevant
+            base_profile = drop_leap_days(base_profile)
+        elif base_total is None or len(base_profile) != hours.stop - hours.start:
+            raise ValueError(
+                "with hours, base_profile must hold just those hours and base_total is needed"
+            )
 
-    # sort 16region names, not great but best we can do since not alphanumeric
-    names_16_region.sort()
-    names_16_region = names_16_region[7:16] + names_16_region[0:7]
+        record["rows"] = len(base_profile)
 
-    out = {}
-    for model_year in model_years:
-        # drop leap year, if relevant
-        if len(base_profile) > 8760:
-            base_profile = base_profile.drop(base_profile.index[1416:1440])
-            base_profile.reset_index(inplace=True)
-
-        # Switch cdr regions to model regions
-        load_profile_16_region = load_by_16_region(
-            load=base_profile,
-            county_population_data=county_population_data,
+    with stage(report, "population_weights", **info) as record:
+        record["rows"] = len(county_population_data)
+
+        # shapes are (model year or 1, cdr zone, region) and (model year or 1, region)
+        allocation, ev_fractions, names_by_scheme, names_cdr_region = population_allocation(
+            county_population_data,
+            base_year,
+            model_years,
+            schemes=schemes,
+            population_weighting=population_weighting,
+            trend_years=trend_years,
         )
 
-        # check error
-        total_16_region = load_profile_16_region[names_16_region].sum().sum()
-        total_base_profile = base_profile[names_cdr_region].sum().sum()
-
-        tol = 1e-4
-        assert tol > abs(
-            total_16_region - total_base_profile
-        ), "difference in total load greater than tolerance after splitting by 16 regions"
-
-        # Not sure if this the Year, Month, Day, Period columns are needed,
-        # but it doesn't hurt to keep as is
-        load_profile_16_region.drop(
-            ["index", "Year", "Month", "Day", "Period"],
-            axis=1,
-            inplace=True,
-            errors="ignore",
+    with stage(report, "split_by_region", **info) as record:
+        # Switch cdr regions to model regions, shape (model year or 1, hour, region)
+        load_profile_16_region, total_16_region = split_by_region(
+            zone_load_array(base_profile, names_cdr_region),
+            allocation,
+            names_by_scheme,
+        )
+        if hours is not None:
+            total_16_region = base_total
+
+        record["rows"] = load_profile_16_region.shape[0] * load_profile_16_region.shape[1]
+        record["bytes"] = load_profile_16_region.nbytes
+
+    with stage(report, "scale", **info) as record:
+        year_factors = year_scaling_factors(
+            base_year,
+            model_years,
+            total_16_region,
+            scaling_factor=scaling_factor,
+            intermediate_year=intermediate_year,
+            intermediate_load=intermediate_load,
         )
 
-        if int_year_bool:
-            # scale up to intermediate year by total energy
-            # scale factor = total energy in intermediate year / total energy in base year
-            load_profile_16_region *= intermediate_sum / total_16_region
-            # years for load scaling
-            n_years = model_year - int(intermediate_year)
+        record["rows"] = len(year_factors)
 
+    with stage(report, "ev_overlay", **info) as record:
+        # EV load for each model year, shape (model year, hour (24 or 8760), EV region)
+        ev_load, ev_regions = ev_load_tensor(ev_loads, model_years, dtype=dtype)
+
+        if hours is not None and ev_load.shape[1] == 24:
+            # 24 hour EV loads are broadcast over whole days of the slice
+            if (hours.start or 0) % 24:
+                raise ValueError("hours must start at a multiple of 24 with 24 hour EV loads")
+        elif hours is not None:
+            ev_load = ev_load[:, hours]
+
+        if ev_regions is None and ev_weights is None:
+            # total EV load split by population, computed with the allocation
+            ev_split = ev_fractions[:, None, :]
         else:
-            # years for load scaling
-            n_years = model_year - int(base_year)
+            if ev_weights is not None:
+                county_weights = county_population_data[ev_weights].to_numpy()
+            elif population_weighting == "model_year":
+                county_weights = population_by_year(
+                    county_population_data, model_years, trend_years
+                ).to_numpy().T
+            else:
+                county_weights = county_population_data[base_year].to_numpy()
+
+            regions, _ = aggregation_regions(county_population_data, schemes)
+            ev_split = ev_allocation(
+                county_weights,
+                regions,
+                names_by_scheme,
+                ev_regions=ev_regions,
+                county_ev_regions=(
+                    county_population_data[ev_region_column] if ev_regions else None
+                ),
+            )
+
+        record["rows"] = ev_load.shape[0] * ev_load.shape[1]
+        record["bytes"] = ev_load.nbytes
 
-        # scale up to current model year from intermediate or base year
-        load_profile_16_region_scaled = load_profile_16_region * (
-            scaling_factor**n_years
+    with stage(report, "scale_and_overlay", **info) as record:
+        # (model year, hour, region), written once into out
+        loads = scale_and_overlay(
+            load_profile_16_region, year_factors, ev_load, ev_split, out=out, dtype=dtype
         )
 
-        # add EV load
-        if len(ev_loads) == 24:
-            ev_load = pd.concat([ev_load] * 365, ignore_index=True)
-        else:
-            ev_load = ev_loads[str(model_year)]
+        record["rows"] = loads.shape[0] * loads.shape[1]
+        record["bytes"] = loads.nbytes
 
-        for model_region in load_profile_16_region_scaled.columns:
-            assert len(ev_load) == len(load_profile_16_region_scaled)
-            load_profile_16_region_scaled[model_region] += (
-                ev_load * population_fraction_16_region[model_region]
-            )
+    if targets is not None:
+        with stage(report, "targets", **info) as record:
+            if hours is not None:
+                raise ValueError("targets need whole years of load, not a slice of hours")
 
-        # sort profiles before saving
-        load_profile_16_region_scaled = load_profile_16_region_scaled[names_16_region]
+            # one affine transform per model year and region, in a single broadcast
+            transforms = apply_targets(loads, targets, names_by_scheme, model_years)
 
-        # save to dict
-        if outputs_to_file:
-            if int_year_bool:
-                out[
-                    output_dir_year
-                    / f"load_base{base_year}_intermediate{intermediate_year}_model{model_year}.csv"
-                ] = load_profile_16_region_scaled
-            else:
-                out[
-                    output_dir_year / f"load_base{base_year}_model{model_year}.csv"
-                ] = load_profile_16_region_scaled
-        else:
-            out[model_year] = load_profile_16_region_scaled
+            record["rows"] = len(transforms)
+
+    return loads, names_by_scheme
+
+
+def population_allocation(
+    county_population_data,
+    base_year,
+    model_years,
+    schemes=None,
+    population_weighting="base_year",
+    trend_years=10,
+):
+    """Returns the cdr zone -> region weights and EV fractions the base profile is split with,
+    see allocation_tensor and base_year_allocation
+
+    Args:
+        county_population_data (pandas.DataFrame): Contains population data for each county for each year
+        base_year (numeric or str): Year of initial profile
+        model_years (list): list of years the model needs load data for
+        schemes (dict): county -> region aggregation schemes, see aggregation_regions
+        population_weighting (str): "base_year" or "model_year", see generate_16_region_load_array
+        trend_years (int): see population_by_year
+
+    Returns:
+        tuple: allocation with shape (model year or 1, cdr zone, region), EV fractions with
+               shape (model year or 1, region), dict of scheme name to list of region names
+               and list of cdr zones
+    """
+    if population_weighting == "model_year":
+        return allocation_tensor(county_population_data, model_years, schemes, trend_years)
+
+    return base_year_allocation(county_population_data, base_year, schemes)
+
+
+def zone_load_array(base_profile, zones):
+    """Returns the cdr zone loads of a base profile as an (hour, cdr zone) array. Missing
+    loads (NaN, e.g. an empty row of the ERCOT file) count as zero, as in the original
+    per-county computation, whose region sums skipped them
+
+    Args:
+        base_profile (pandas.DataFrame): load profile with a column for each cdr zone
+        zones (list): cdr zone columns, in the order of the allocation
+
+    Returns:
+        numpy.ndarray: shape (hour, cdr zone)
+    """
+    zone_loads = base_profile[list(zones)].to_numpy(dtype=float)
+    missing = np.isnan(zone_loads)
+    if missing.any():
+        zone_loads = np.where(missing, 0.0, zone_loads)
+
+    return zone_loads
+
+
+def split_by_region(zone_loads, allocation, names_by_scheme):
+    """Splits cdr zone loads into the regions of every scheme, checking that the split of
+    each scheme (and population year) keeps the total load
+
+    Args:
+        zone_loads (numpy.ndarray): shape (hour, cdr zone), without missing values (see zone_load_array)
+        allocation (numpy.ndarray): shape (model year or 1, cdr zone, region), see population_allocation
+        names_by_scheme (dict): scheme name to list of region names, in the order of allocation
+
+    Returns:
+        tuple: numpy.ndarray with shape (model year or 1, hour, region) and total load of the
+               first scheme's regions with the first population year (for intermediate scaling)
+    """
+    load_profile_16_region = zone_loads @ allocation
+
+    # check error of each scheme (and population year)
+    total_base_profile = zone_loads.sum(axis=0).sum()
+    region_totals = load_profile_16_region.sum(axis=1)
+    column_start = 0
+    scheme_totals = {}
+    for scheme, names in names_by_scheme.items():
+        scheme_totals[scheme] = region_totals[
+            :, column_start : column_start + len(names)
+        ].sum(axis=1)
+        column_start += len(names)
+    # total of the first scheme, for intermediate scaling
+    total_16_region = next(iter(scheme_totals.values()))[0]
+
+    tol = 1e-4
+    for scheme, scheme_total in scheme_totals.items():
+        assert (
+            tol > np.abs(scheme_total - total_base_profile)
+        ).all(), f"difference in total load greater than tolerance after splitting by {scheme} regions"
+
+    return load_profile_16_region, total_16_region
+
+
+def base_year_allocation(county_population_data, base_year, schemes=None):
+    """Returns cdr zone -> region weights and EV load fractions of every region of every
+    aggregation scheme for the base year's population, shaped like allocation_tensor's for one year
+
+    Args:
+        county_population_data (pandas.DataFrame): Contains "cdr_zone", base_year and any region columns used by schemes
+        base_year (str): population column used for weighting
+        schemes (dict): county -> region aggregation schemes, see aggregation_regions
+
+    Returns:
+        tuple: see allocation_tensor
+    """
+    regions, names_by_scheme = aggregation_regions(county_population_data, schemes)
+
+    ## process population data for given base year
+    # region columns are renamed, so a scheme can be named after an existing column (e.g. cdr_zone)
+    region_columns = {scheme: f"{scheme}_region" for scheme in names_by_scheme}
+    county_population_data = pd.concat(
+        [
+            county_population_data[["cdr_zone", base_year]],
+            regions.rename(columns=region_columns),
+        ],
+        axis=1,
+    )
+
+    allocations = []
+    ev_fractions = []
+    for scheme, names_16_region in names_by_scheme.items():
+        # cdr zone -> region weights for the base year population
+        allocation = allocation_matrix_for_year(
+            county_population_data, base_year, region_column=region_columns[scheme]
+        )
+        allocations.append(allocation[names_16_region])
+
+        # get percent of population in each region (for splitting EV load)
+        population_fraction_16_region = percentage_of_whole(
+            county_population_data, base_year, region_columns[scheme]
+        )
+        ev_fractions += [
+            population_fraction_16_region[model_region]
+            for model_region in names_16_region
+        ]
+
+    # all schemes are split in one product, columns are (scheme, region)
+    allocation = pd.concat(allocations, axis=1, keys=list(names_by_scheme)).fillna(0.0)
+
+    return (
+        allocation.to_numpy()[None, :, :],
+        np.array(ev_fractions)[None, :],
+        names_by_scheme,
+        list(allocation.index),
+    )
+
+
+def year_scaling_factors(
+    base_year,
+    model_years,
+    base_total,
+    scaling_factor=1.018,
+    intermediate_year=None,
+    intermediate_load=None,
+):
+    """Returns factor scaling the base profile to each model year: the intermediate energy
+    factor (if any) times scaling_factor to the power of years since the base or intermediate year
+
+    Args:
+        base_year (numeric): Year of initial profile
+        model_years (list): list of years the model needs load data for
+        base_total (float): total energy of the base profile
+        scaling_factor (float like): Factor to scale load by each year
+        intermediate_year (numeric or str): Year of intermediate profile, see generate_16_region_load_profiles
+        intermediate_load (pandas.DataFrame): Load profile for scaling to intermediate year, scales on total energy
+
+    Returns:
+        numpy.ndarray: shape (model year,)
+    """
+    # true if intermediate year is not none and base year is less than intermediate year
+    int_year_bool = intermediate_year and (int(base_year) < int(intermediate_year))
+
+    if int_year_bool:
+        # scale up to intermediate year by total energy
+        # scale factor = total energy in intermediate year / total energy in base year
+        intermediate_sum = intermediate_load.drop(columns=["Hour Ending"]).sum().sum()
+        energy_factor = intermediate_sum / base_total
+        # years for load scaling
+        n_years = np.asarray(model_years) - int(intermediate_year)
+
+    else:
+        energy_factor = 1.0
+        # years for load scaling
+        n_years = np.asarray(model_years) - int(base_year)
+
+    # scale up to each model year from intermediate or base year
+    return energy_factor * np.power(float(scaling_factor), n_years)
+
+
+def ev_load_tensor(ev_loads, model_years, dtype="float64"):
+    """Returns EV load of each model year in each EV region, without repeating 24 hour loads
+
+    Args:
+        ev_loads (pandas.DataFrame): a column of EV load for each model year, with 24 or 8760 rows.
+                                     Per region EV loads have a "region" column, with the rows
+                                     of each region (in hour order) one after the other
+        model_years (list): list of years the model needs load data for
+        dtype (str): "float64" or "float32"
+
+    Returns:
+        tuple: numpy.ndarray with shape (model year, hour (24 or 8760), EV region) and
+               list of EV regions (None if EV loads are not per region)
+    """
+    year_columns = [str(model_year) for model_year in model_years]
+
+    if "region" not in ev_loads:
+        return ev_loads[year_columns].to_numpy(dtype=dtype).T[:, :, None], None
+
+    ev_regions = list(pd.unique(ev_loads["region"]))
+    # (region, hour, model year), regions must have the same number of hours
+    by_region = ev_loads.groupby("region", sort=False)[year_columns]
+    hours = by_region.size()
+    assert hours.nunique() == 1, "every EV region must have the same number of hours"
+    ev_load = np.stack(
+        [by_region.get_group(region).to_numpy(dtype=dtype) for region in ev_regions]
+    )
+
+    return ev_load.transpose(2, 1, 0), ev_regions
+
+
+def ev_load_array(ev_loads, model_years, dtype="float64"):
+    """Returns total EV load of each model year, shape (model year, hour).
+    24 hour EV loads are repeated for every day of the year"""
+    ev_load, _ = ev_load_tensor(ev_loads, model_years, dtype=dtype)
+    ev_load = ev_load.sum(axis=2)
+    if ev_load.shape[1] == 24:
+        ev_load = np.tile(ev_load, (1, 365))
+
+    return ev_load
+
+
+def ev_allocation(
+    county_weights,
+    regions,
+    names_by_scheme,
+    ev_regions=None,
+    county_ev_regions=None,
+):
+    """Returns the fraction of each EV region's load assigned to each region of every scheme,
+    with counties weighted by county_weights
+
+    Args:
+        county_weights (numpy.ndarray): shape (county,) or (model year, county), e.g. population
+        regions (pandas.DataFrame): each county's region under each scheme, see aggregation_regions
+        names_by_scheme (dict): scheme name to list of region names, see aggregation_regions
+        ev_regions (list): EV regions (see ev_load_tensor), None if EV loads are not per region
+        county_ev_regions (pandas.Series): each county's EV region, needed if ev_regions is given
+
+    Returns:
+        numpy.ndarray: shape (model year or 1, EV region, region)
+    """
+    county_weights = np.atleast_2d(np.asarray(county_weights, dtype=float))
+    if ev_regions is None:
+        county_ev = np.ones((county_weights.shape[1], 1))
+    else:
+        county_ev = indicator_matrix(county_ev_regions, ev_regions)
+        missing = [
+            region for region, count in zip(ev_regions, county_ev.sum(axis=0)) if not count
+        ]
+        if missing:
+            raise ValueError(f"EV regions without counties: {missing}")
+
+    county_regions = scheme_indicator_matrix(regions, names_by_scheme)
+
+    # (weight year, EV region, region) / (weight year, EV region, 1)
+    return np.einsum("yn,ne,nr->yer", county_weights, county_ev, county_regions) / (
+        county_weights @ county_ev
+    )[:, :, None]
+
+
+def add_ev_loads(loads, ev_load, allocation):
+    """Adds EV load to loads in place, repeating 24 hour EV loads for every day by broadcasting
+    (without copying them 365 times)
+
+    Args:
+        loads (numpy.ndarray): shape (model year, hour, region)
+        ev_load (numpy.ndarray): shape (model year, hour (24 or same as loads), EV region), see ev_load_tensor
+        allocation (numpy.ndarray): shape (model year or 1, EV region, region), see ev_allocation
+    """
+    allocation = allocation.astype(loads.dtype)
+
+    n_years, n_hours, n_regions = loads.shape
+    if ev_load.shape[1] == n_hours:
+        # one model year at a time, so only one year of EV load by region is held at once
+        for year in range(n_years):
+            loads[year] += ev_load[year] @ allocation[year if len(allocation) > 1 else 0]
+    elif ev_load.shape[1] == 24 and n_hours % 24 == 0:
+        # (model year, day, hour of day, region) view of loads
+        loads.reshape(n_years, n_hours // 24, 24, n_regions)[...] += (ev_load @ allocation)[
+            :, None, :, :
+        ]
+    else:
+        raise ValueError(f"EV loads have {ev_load.shape[1]} hours, expected 24 or {n_hours}")
+
+
+def scale_and_overlay(split, year_factors, ev_load, ev_allocation, out=None, dtype="float64"):
+    """Fused scale and EV overlay: writes each model year's scaled split profile plus its
+    EV load by region into one (model year, hour, region) buffer, without intermediate
+    copies of the profiles and without modifying any of the inputs
+
+    Args:
+        split (numpy.ndarray): base profile split by region, shape (model year or 1, hour, region)
+        year_factors (numpy.ndarray): factor of each model year, shape (model year,), see year_scaling_factors
+        ev_load (numpy.ndarray): shape (model year, hour (24 or same as split), EV region), see ev_load_tensor
+        ev_allocation (numpy.ndarray): shape (model year or 1, EV region, region), see ev_allocation
+        out (numpy.ndarray): C-contiguous buffer of shape (model year, hour, region), if None
+                             a new one of dtype is allocated
+        dtype (str): "float64" or "float32", dtype of a new out
+
+    Returns:
+        numpy.ndarray: out
+    """
+    shape = (len(year_factors),) + split.shape[1:]
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.shape != shape or not out.flags.c_contiguous:
+        raise ValueError(f"out must be a C-contiguous array of shape {shape}")
+
+    # the split is cast to out's dtype as it is multiplied, so float32 loads are float32 products
+    np.multiply(
+        year_factors.astype(out.dtype)[:, None, None],
+        split,
+        out=out,
+        dtype=out.dtype,
+        casting="same_kind",
+    )
+    add_ev_loads(out, ev_load, ev_allocation)
 
     return out
 
 
-def read_ercot_load_profile(path: Path) -> pd.DataFrame:
+# version of the normalization done by read_ercot_load_profile,
+# bump when it changes so that cached profiles are invalidated
+LOAD_PROFILE_CACHE_VERSION = 1
+
+
+def read_ercot_load_profile(path: Path, cache_dir: Path = None) -> pd.DataFrame:
     """Returns dataframe, making column names consistent across years (specific to ERCOT)
 
     Args:
         path (Path): path to excel file
+        cache_dir (Path): optional directory for cached (already normalized) profiles,
+                          keyed by the file's content hash and LOAD_PROFILE_CACHE_VERSION
+                          so that spreadsheets are only parsed when they change
 
     Returns:
         pd.DataFrame: contains load profiles by region, with proper column names
     """
+    if cache_dir is not None:
+        return _read_cached_ercot_load_profile(Path(path), Path(cache_dir))
 
     df = pd.read_excel(path, index_col=0, parse_dates=True)
     df.index.name = "Hour Ending"
@@ -312,17 +1030,40 @@ def read_ercot_load_profile(path: Path) -> pd.DataFrame:
     return df
 
 
-def main(
-    output_dir,
-    data_dir,
-    load_files,
-    model_years,
-    intermediate_load=None,
-    intermediate_year=None,
-    print_files=False,
-):
-    county_populations = pd.read_csv(data_dir / "county_population_data.csv")
-    ev_loads = pd.read_csv(data_dir / "ev_extra_loads.csv")
+def _read_cached_ercot_load_profile(path: Path, cache_dir: Path) -> pd.DataFrame:
+    """Returns profile from cache_dir, parsing path and caching it on a miss.
+    Cached profiles of older versions of the same file are removed"""
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+    cache_file = cache_dir / f"{path.stem}_{digest}_v{LOAD_PROFILE_CACHE_VERSION}.pkl"
+
+    if cache_file.exists():
+        return pd.read_pickle(cache_file)
+
+    df = read_ercot_load_profile(path)
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for stale_file in cache_dir.glob(f"{path.stem}_{'?' * len(digest)}_v*.pkl"):
+        stale_file.unlink(missing_ok=True)
+
+    # write then rename, so that parallel readers never see a partial file
+    temp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    df.to_pickle(temp_file)
+    os.replace(temp_file, cache_file)
+
+    return df
+
+
+def read_county_population_data(path):
+    """Returns county population data with cdr zone names matching ERCOT load profile columns,
+    dropping counties that don't have an ERCOT load profile
+
+    Args:
+        path (Path): path to county_population_data.csv
+
+    Returns:
+        pd.DataFrame: county population data
+    """
+    county_populations = pd.read_csv(path)
 
     # mapping of names in county population data to names used in load profiles
     # and drop counties that don't have an ERCOT load profile
@@ -341,22 +1082,231 @@ def main(
     county_populations["cdr_zone"] = county_populations["cdr_zone"].map(cdr_zone_dict)
     county_populations.dropna(inplace=True)
 
-    for base_year, file_name in load_files.items():
-        base_profile = read_ercot_load_profile(file_name)
+    return county_populations
 
-        files = generate_16_region_load_profiles(
-            base_profile,
-            base_year=base_year,
-            output_dir=output_dir,
-            model_years=model_years,
-            county_population_data=county_populations,
-            ev_loads=ev_loads,
-            intermediate_load=intermediate_load,
-            intermediate_year=intermediate_year,
-        )
 
+def write_outputs(
+    files,
+    output_dir,
+    output_format="csv",
+    store_dtype="float32",
+    update_index=True,
+    summarize=True,
+):
+    """Writes load profiles returned by generate_16_region_load_profiles.
+    Files are written under a temporary name and renamed when complete, so an
+    interrupted run (or a concurrent reader) never sees a partial file
+
+    Args:
+        files (dict): keys are output file paths, values are load profiles
+        output_dir (pathlib.Path): directory for output files
+        output_format (str): "csv" for one CSV file per profile,
+                             "store" for the binary store in output_dir / "store" (see output_store.py)
+        store_dtype (str): "float32" or "float64", only used for output_format "store"
+        update_index (bool): rebuild the store index, see output_store.write_store
+        summarize (bool): also write each profile's summary and downsampled pyramid (see
+                          summary.py and pyramid.py), the summary index is rebuilt by write_summary_index
+    """
+    if output_format == "csv":
         for file, df in files.items():
-            df.to_csv(file)
+            file = Path(file)
+            # unique per writer thread
+            temp_file = file.with_name(
+                f"{file.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+            )
+            df.to_csv(temp_file)
+            os.replace(temp_file, file)
+    elif output_format == "store":
+        write_store(
+            output_dir / "store", files, dtype=store_dtype, update_index=update_index
+        )
+    else:
+        raise ValueError(f"Unknown output format {output_format}")
+
+    if summarize:
+        write_scenario_summaries(output_dir, files)
+        write_scenario_pyramids(output_dir, files)
+
+
+def main(
+    output_dir,
+    data_dir,
+    load_files,
+    model_years,
+    intermediate_load=None,
+    intermediate_year=None,
+    print_files=False,
+    cache_dir=None,
+    output_format="csv",
+    scaling_factor=1.018,
+    incremental=False,
+    report=None,
+    dtype="float64",
+    memory_budget=None,
+    schemes=None,
+    population_weighting="base_year",
+    ev_weights=None,
+    ev_region_column="model_region",
+    prefetch=1,
+    write_workers=2,
+    max_pending_writes=4,
+    targets=None,
+):
+    """Generates and writes profiles of every base year and model year (see options at bottom of script).
+    Reading, computing and writing are pipelined: the next prefetch load files are read on
+    reader threads while the current one is computed, and finished batches are written on
+    write_workers threads, with at most max_pending_writes batches waiting (computing pauses
+    until one is written), so memory stays flat. prefetch=0 and write_workers=0 run in sequence
+    """
+    if schemes is None:
+        schemes = DEFAULT_SCHEMES
+
+    with stage(report, "read_population_data") as record:
+        county_populations = read_county_population_data(
+            data_dir / "county_population_data.csv"
+        )
+        record["rows"] = len(county_populations)
+
+    with stage(report, "read_ev_loads") as record:
+        ev_loads = pd.read_csv(data_dir / "ev_extra_loads.csv")
+        record["rows"] = len(ev_loads)
+
+    if incremental:
+        # outputs are only rebuilt if their inputs changed since the last run
+        manifest = read_manifest(output_dir)
+
+    # base years to build, with their out of date model years (and manifest records)
+    jobs = []
+    for base_year, file_name in load_files.items():
+        stale_years = model_years
+        records = None
+        if incremental:
+            records = scenario_records(
+                output_dir,
+                load_file=file_name,
+                base_year=base_year,
+                model_years=model_years,
+                county_population_data=county_populations,
+                ev_loads=ev_loads,
+                scaling_factor=scaling_factor,
+                intermediate_year=intermediate_year,
+                intermediate_load=intermediate_load,
+                dtype=dtype,
+                schemes=schemes,
+                population_weighting=population_weighting,
+                ev_weights=ev_weights,
+                ev_region_column=ev_region_column,
+                targets=targets,
+            )
+            stale_years = stale_model_years(
+                manifest, output_dir, records, output_format=output_format
+            )
+            if not stale_years:
+                continue
+        jobs.append((base_year, file_name, stale_years, records))
+
+    def read(base_year, file_name):
+        with stage(report, "read_load_profile", base_year=base_year) as record:
+            base_profile = read_ercot_load_profile(file_name, cache_dir=cache_dir)
+            record["rows"] = len(base_profile)
+        return base_profile
+
+    def write(base_year, scheme, files):
+        with stage(report, "write_outputs", base_year=base_year, scheme=scheme) as record:
+            write_outputs(
+                files,
+                scheme_output_dir(output_dir, scheme),
+                output_format=output_format,
+                # rebuilt once all writers are done
+                update_index=False,
+            )
+            record["rows"] = sum(len(df) for df in files.values())
+            record["bytes"] = sum(df.memory_usage().sum() for df in files.values())
+
+    # base year -> (manifest records, model years, write futures) until its files are written
+    unwritten = {}
+
+    def record_written(block=False):
+        for base_year, (records, stale_years, writes) in list(unwritten.items()):
+            if block:
+                wait(writes)
+            if not all(future.done() for future in writes):
+                continue
+            for future in writes:
+                # raises errors of writer threads
+                future.result()
+            del unwritten[base_year]
+
+            if incremental:
+                # written after each base year, so an interrupted run can resume
+                update_manifest(manifest, records, stale_years, output_format=output_format)
+                write_manifest(output_dir, manifest)
+
+    # inputs are read ahead on reader threads and outputs written on writer threads,
+    # while profiles are computed on this one
+    pending_writes = threading.BoundedSemaphore(max_pending_writes)
+    with ThreadPoolExecutor(max_workers=max(prefetch, 1)) as readers, ThreadPoolExecutor(
+        max_workers=max(write_workers, 1)
+    ) as writers:
+        reads = {}
+        for job_number, (base_year, file_name, stale_years, records) in enumerate(jobs):
+            for base_year_ahead, file_ahead, _, _ in jobs[
+                job_number : job_number + prefetch + 1
+            ]:
+                if base_year_ahead not in reads:
+                    reads[base_year_ahead] = readers.submit(
+                        read, base_year_ahead, file_ahead
+                    )
+            base_profile = reads.pop(base_year).result()
+
+            writes = []
+            unwritten[base_year] = (records, stale_years, writes)
+
+            def flush(files_by_scheme, base_year=base_year, writes=writes):
+                for scheme, files in files_by_scheme.items():
+                    if write_workers == 0:
+                        write(base_year, scheme, files)
+                        continue
+
+                    # blocks while max_pending_writes batches are queued, so memory stays flat
+                    pending_writes.acquire()
+                    future = writers.submit(write, base_year, scheme, files)
+                    future.add_done_callback(lambda _: pending_writes.release())
+                    writes.append(future)
+
+            # profiles are written as each batch of model years is generated
+            generate_16_region_load_profiles(
+                base_profile,
+                base_year=base_year,
+                output_dir=output_dir,
+                model_years=stale_years,
+                county_population_data=county_populations,
+                ev_loads=ev_loads,
+                scaling_factor=scaling_factor,
+                intermediate_load=intermediate_load,
+                intermediate_year=intermediate_year,
+                report=report,
+                dtype=dtype,
+                memory_budget=memory_budget,
+                flush=flush,
+                schemes=schemes,
+                population_weighting=population_weighting,
+                ev_weights=ev_weights,
+                ev_region_column=ev_region_column,
+                targets=targets,
+            )
+            del base_profile
+
+            record_written()
+
+        record_written(block=True)
+
+    if jobs:
+        for scheme in schemes:
+            scheme_dir = scheme_output_dir(output_dir, scheme)
+            write_summary_index(scheme_dir)
+            if output_format == "store":
+                write_store_index(scheme_dir / "store")
 
 
 if __name__ == "__main__":
@@ -367,6 +1317,26 @@ if __name__ == "__main__":
     data_dir = Path(
         "data"
     )  # location of data, looks for "county_population_data.csv" and "ev_extra_loads.csv"
+    cache_dir = input_dir / ".cache"  # location of parsed input files (None to disable)
+    output_format = "csv"  # "csv" files or binary "store" (see output_store.py)
+    incremental = True  # only rebuild outputs whose inputs changed (see manifest.py)
+    report_file = None  # run report with time and memory of each stage, .json or .csv (None to disable)
+    trace_memory = False  # also record peak memory allocated by each stage (slower, see README)
+    dtype = "float64"  # "float64" or "float32" (half the memory and shorter CSV values)
+    memory_budget = None  # bytes of load profiles held in memory at once (None for no limit)
+    population_weighting = "base_year"  # split load with "base_year" or "model_year" population (see README)
+    ev_weights = None  # county_population_data column EV load is split by (None for population, see README)
+    ev_region_column = "model_region"  # county_population_data column of EV regions, for per region EV loads
+    prefetch = 1  # load files read ahead while profiles are computed (0 to read in sequence)
+    write_workers = 2  # threads writing outputs while profiles are computed (0 to write in sequence)
+    max_pending_writes = 4  # batches of profiles waiting to be written before computing pauses
+    targets_file = None  # per region energy and peak targets by model year, instead of scaling (see README)
+
+    # county -> region aggregation schemes, each written to its own folder (see README)
+    schemes = {
+        "model_region": {"column": "model_region"},  # written to output_dir
+        # "four_region": {"mapping": data_dir / "four_region_mapping.csv", "order": ["north", "south", "east", "west"]},
+    }
 
     # select load files manually
     load_files = {
@@ -400,16 +1370,35 @@ if __name__ == "__main__":
     # select load  profile and year for intermediate load scaling
     # (if None, no intermediate load scaling is done)
     intermediate_load = read_ercot_load_profile(
-        input_dir / "Native_Load_2021_NOShed.xlsx"
+        input_dir / "Native_Load_2021_NOShed.xlsx", cache_dir=cache_dir
     )
     intermediate_year = 2021
 
     ###### END OPTIONS ######
+    report = new_run_report(trace_memory=trace_memory) if report_file else None
     main(
         output_dir=output_dir,
         data_dir=data_dir,
         load_files=load_files,
         model_years=model_years,
+        cache_dir=cache_dir,
+        output_format=output_format,
+        incremental=incremental,
+        dtype=dtype,
+        memory_budget=memory_budget,
+        schemes=schemes,
+        population_weighting=population_weighting,
+        ev_weights=ev_weights,
+        ev_region_column=ev_region_column,
+        prefetch=prefetch,
+        write_workers=write_workers,
+        max_pending_writes=max_pending_writes,
+        targets=read_targets(targets_file) if targets_file else None,
         # intermediate_load=intermediate_load,
         # intermediate_year=intermediate_year,
+        report=report,
     )
+
+    if report_file:
+        write_run_report(report, report_file)
+        print(summarize_run_report(report))
@@ -0,0 +1,234 @@
+"""
+ Provenance manifest for generated load profiles, used for incremental rebuilds.
+
+ manifest.json (in the output directory) records, for every output file, hashes of the
+ inputs it was generated from: the load file, the county population vintage column,
+ the EV load column, scaling_factor, the intermediate profile, dtype, the county -> region
+ aggregation scheme, the population weighting and the code version.
+ An output is stale when any of these changed or the file is missing.
+"""
+
+import functools
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from extra_functions import aggregation_regions
+from output_store import output_file, scheme_output_dir
+
+MANIFEST_VERSION = 1
+
+# files whose contents change generated outputs (including the summaries and pyramids
+# written next to them)
+CODE_FILES = [
+    "load_profile.py",
+    "extra_functions.py",
+    "output_store.py",
+    "targets.py",
+    "summary.py",
+    "pyramid.py",
+]
+
+
+@functools.lru_cache(maxsize=None)
+def _hash_file_contents(path, mtime_ns, size):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def hash_file(path):
+    """Returns SHA-256 of a file's contents, only rereading files that were modified"""
+    stat = os.stat(path)
+    return _hash_file_contents(str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def hash_frame(df):
+    """Returns hash of a DataFrame or Series' values (and index)"""
+    return hashlib.sha256(
+        pd.util.hash_pandas_object(df).to_numpy().tobytes()
+    ).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """Returns hash of the code used to generate outputs"""
+    code_dir = Path(__file__).parent
+    return hashlib.sha256(
+        "".join(hash_file(code_dir / file) for file in CODE_FILES).encode()
+    ).hexdigest()
+
+
+def scenario_records(
+    output_dir,
+    load_file,
+    base_year,
+    model_years,
+    county_population_data,
+    ev_loads,
+    scaling_factor=1.018,
+    intermediate_year=None,
+    intermediate_load=None,
+    dtype="float64",
+    schemes=None,
+    population_weighting="base_year",
+    ev_weights=None,
+    ev_region_column="model_region",
+    targets=None,
+):
+    """Returns the manifest records of each model year's outputs (one per aggregation scheme)
+
+    Args:
+        output_dir (pathlib.Path): directory for output files
+        load_file (pathlib.Path): base year load file
+        base_year (str): Year of initial profile
+        model_years (list): list of years the model needs load data for
+        county_population_data (pandas.DataFrame): Contains population data for each county for each year
+        ev_loads (pandas.DataFrame): Contains EV load data for each model year
+        scaling_factor (float like): Factor to scale load by each year
+        intermediate_year (numeric or str): Year of intermediate profile
+        intermediate_load (pandas.DataFrame): Load profile for scaling to intermediate year
+        dtype (str): "float64" or "float32", see load_profile.generate_16_region_load_profiles
+        schemes (dict): county -> region aggregation schemes, see extra_functions.aggregation_regions
+        population_weighting (str): "base_year" or "model_year", see load_profile.generate_16_region_load_profiles
+        ev_weights (str): column EV load is split by, see load_profile.generate_16_region_load_profiles
+        ev_region_column (str): column of EV regions, see load_profile.generate_16_region_load_profiles
+        targets (pandas.DataFrame): energy and peak targets, see load_profile.generate_16_region_load_profiles
+
+    Returns:
+        dict: keys are model years, values are lists of (manifest key, record) tuples
+    """
+    population_columns = ["county", "cdr_zone", "model_region", base_year]
+    if population_weighting == "model_year":
+        # every population column is used for weighting
+        population_columns = list(county_population_data.columns)
+    ev_columns = []
+    if ev_weights is not None:
+        ev_columns.append(ev_weights)
+    if "region" in ev_loads:
+        ev_columns.append(ev_region_column)
+    population_columns += [
+        column for column in ev_columns if column not in population_columns
+    ]
+
+    base_inputs = {
+        "load_file": hash_file(load_file),
+        "population": hash_frame(county_population_data[population_columns]),
+        "population_weighting": population_weighting,
+        "ev_weights": ev_weights,
+        "scaling_factor": scaling_factor,
+        "targets": None if targets is None else hash_frame(targets),
+        "intermediate": None,
+        "dtype": dtype,
+        "code": code_version(),
+    }
+    if intermediate_year and (int(base_year) < int(intermediate_year)):
+        base_inputs["intermediate"] = hash_frame(intermediate_load)
+
+    regions, orders = aggregation_regions(county_population_data, schemes)
+    scheme_inputs = {
+        scheme: {
+            "scheme": scheme,
+            "regions": hash_frame(regions[scheme]) + hash_frame(pd.Series(order)),
+        }
+        for scheme, order in orders.items()
+    }
+
+    records = {}
+    for model_year in model_years:
+        ev_load = ev_loads[str(model_year)]
+        if "region" in ev_loads:
+            ev_load = ev_loads[["region", str(model_year)]]
+        year_inputs = base_inputs | {"ev_load": hash_frame(ev_load)}
+        records[model_year] = []
+        for scheme, inputs in scheme_inputs.items():
+            file = output_file(
+                scheme_output_dir(output_dir, scheme),
+                base_year,
+                model_year,
+                intermediate_year,
+            )
+            key = file.relative_to(output_dir).as_posix()
+            records[model_year].append((key, year_inputs | inputs))
+
+    return records
+
+
+def read_manifest(output_dir):
+    """Returns manifest of output_dir, empty if there is none (or it is an older version)
+
+    Args:
+        output_dir (pathlib.Path): directory for output files
+
+    Returns:
+        dict: keys are output files relative to output_dir, values are records
+    """
+    manifest_file = Path(output_dir) / "manifest.json"
+    if not manifest_file.exists():
+        return {}
+
+    manifest = json.loads(manifest_file.read_text())
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+
+    return manifest["outputs"]
+
+
+def write_manifest(output_dir, manifest):
+    """Writes manifest of output_dir (atomically, so an interrupted run leaves a valid manifest)
+
+    Args:
+        output_dir (pathlib.Path): directory for output files
+        manifest (dict): keys are output files relative to output_dir, values are records
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    temp_file = output_dir / f"manifest.{os.getpid()}.tmp"
+    temp_file.write_text(
+        json.dumps({"version": MANIFEST_VERSION, "outputs": manifest}, indent=1)
+    )
+    os.replace(temp_file, output_dir / "manifest.json")
+
+
+def stale_model_years(manifest, output_dir, records, output_format="csv"):
+    """Returns model years whose output is missing or was generated from different inputs
+
+    Args:
+        manifest (dict): as returned by read_manifest
+        output_dir (pathlib.Path): directory for output files
+        records (dict): as returned by scenario_records
+        output_format (str): "csv" or "store", see load_profile.write_outputs
+
+    Returns:
+        list: model years to rebuild
+    """
+    stale = []
+    for model_year, year_records in records.items():
+        for key, record in year_records:
+            if output_format == "store":
+                store_dir = scheme_output_dir(output_dir, record["scheme"]) / "store"
+                exists = (store_dir / "chunks" / f"{Path(key).stem}.npy").exists()
+            else:
+                exists = (Path(output_dir) / key).exists()
+
+            if not exists or manifest.get(key) != record | {"format": output_format}:
+                stale.append(model_year)
+                break
+
+    return stale
+
+
+def update_manifest(manifest, records, model_years, output_format="csv"):
+    """Records outputs of model_years as built from the inputs in records
+
+    Args:
+        manifest (dict): as returned by read_manifest, updated in place
+        records (dict): as returned by scenario_records
+        model_years (list): model years that were written
+        output_format (str): "csv" or "store", see load_profile.write_outputs
+    """
+    for model_year in model_years:
+        for key, record in records[model_year]:
+            manifest[key] = record | {"format": output_format}
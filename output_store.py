@@ -0,0 +1,217 @@
+"""
+ Binary store for generated load profiles, as an alternative to one CSV per scenario.
+
+ A store is a directory containing one column-major .npy chunk per scenario and an
+ index.json listing each scenario's base, intermediate and model year, regions and rows.
+ Chunks are memory-mapped when read, so one region or one scenario can be sliced
+ without parsing (or even reading) the rest of the store.
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+STORE_INDEX_VERSION = 1
+
+# output file names, e.g. load_base2002_intermediate2021_model2030.csv
+SCENARIO_PATTERN = re.compile(
+    r"load_base(?P<base_year>\d+)(?:_intermediate(?P<intermediate_year>\d+))?_model(?P<model_year>\d+)"
+)
+
+
+def scenario_key(base_year, model_year, intermediate_year=None):
+    """Returns name used for a scenario, matching the stem of its CSV file"""
+    if intermediate_year:
+        return f"load_base{base_year}_intermediate{intermediate_year}_model{model_year}"
+
+    return f"load_base{base_year}_model{model_year}"
+
+
+def output_file(output_dir, base_year, model_year, intermediate_year=None):
+    """Returns path of the output file for a scenario
+
+    Args:
+        output_dir (pathlib.Path): directory for output files
+        base_year (numeric): Year of initial profile
+        model_year (numeric): Year the load is scaled to
+        intermediate_year (numeric or str): Year of intermediate profile, ignored if base year >= intermediate year
+
+    Returns:
+        pathlib.Path: output_dir / "load_base_{base_year}" / ["load_intermediate_{intermediate_year}" /] file name
+    """
+    output_dir_year = Path(output_dir) / f"load_base_{base_year}"
+
+    if intermediate_year and (int(base_year) < int(intermediate_year)):
+        # change dir if intermediate year
+        output_dir_year = output_dir_year / f"load_intermediate_{intermediate_year}"
+        return (
+            output_dir_year
+            / f"load_base{base_year}_intermediate{intermediate_year}_model{model_year}.csv"
+        )
+
+    return output_dir_year / f"load_base{base_year}_model{model_year}.csv"
+
+
+def scheme_output_dir(output_dir, scheme):
+    """Returns directory for outputs of an aggregation scheme (see load_profile.aggregation_regions),
+    output_dir for the default "model_region" scheme and output_dir / scheme otherwise"""
+    if scheme == "model_region":
+        return Path(output_dir)
+
+    return Path(output_dir) / scheme
+
+
+def parse_scenario_key(key):
+    """Returns dict of base_year, intermediate_year (None if not used) and model_year from a scenario name"""
+    match = SCENARIO_PATTERN.fullmatch(key)
+    if match is None:
+        raise ValueError(f"{key} is not a scenario name")
+
+    intermediate_year = match["intermediate_year"]
+    return {
+        "base_year": match["base_year"],
+        "intermediate_year": intermediate_year and int(intermediate_year),
+        "model_year": int(match["model_year"]),
+    }
+
+
+def write_store(store_dir, files, dtype="float32", update_index=True):
+    """Writes load profiles to a store
+
+    Args:
+        store_dir (pathlib.Path): store directory, created if needed
+        files (dict): keys are output file paths (as returned by generate_16_region_load_profiles),
+                      values are load profiles
+        dtype (str): "float32" or "float64"
+        update_index (bool): rebuild index.json after writing, can be turned off when several
+                             processes write to the same store and write_store_index is called last
+    """
+    chunk_dir = Path(store_dir) / "chunks"
+    chunk_dir.mkdir(parents=True, exist_ok=True)
+
+    for file, df in files.items():
+        key = Path(file).stem
+        parse_scenario_key(key)
+
+        columns_file = chunk_dir / f"{key}.json"
+        columns_file.write_text(json.dumps(list(df.columns)))
+
+        chunk_file = chunk_dir / f"{key}.npy"
+        temp_file = chunk_dir / f"{key}.{os.getpid()}.tmp"
+        with open(temp_file, "wb") as f:
+            # column-major, so each region is contiguous on disk
+            np.save(f, np.asfortranarray(df.to_numpy(dtype=dtype)))
+        os.replace(temp_file, chunk_file)
+
+    if update_index:
+        write_store_index(store_dir)
+
+
+def write_store_index(store_dir):
+    """Rebuilds index.json from the chunks in a store
+
+    Args:
+        store_dir (pathlib.Path): store directory
+
+    Returns:
+        dict: index of store
+    """
+    store_dir = Path(store_dir)
+
+    scenarios = {}
+    for chunk_file in sorted((store_dir / "chunks").glob("*.npy")):
+        key = chunk_file.stem
+        chunk = np.load(chunk_file, mmap_mode="r")
+        scenarios[key] = parse_scenario_key(key) | {
+            "file": chunk_file.relative_to(store_dir).as_posix(),
+            "columns": json.loads(chunk_file.with_suffix(".json").read_text()),
+            "rows": chunk.shape[0],
+            "dtype": str(chunk.dtype),
+        }
+
+    index = {"version": STORE_INDEX_VERSION, "scenarios": scenarios}
+
+    temp_file = store_dir / f"index.{os.getpid()}.tmp"
+    temp_file.write_text(json.dumps(index, indent=1))
+    os.replace(temp_file, store_dir / "index.json")
+
+    return index
+
+
+def read_store_index(store_dir):
+    """Returns table of scenarios in a store
+
+    Args:
+        store_dir (pathlib.Path): store directory
+
+    Returns:
+        pandas.DataFrame: index is scenario name, columns are base_year, intermediate_year, model_year, ...
+    """
+    index = json.loads((Path(store_dir) / "index.json").read_text())
+    return pd.DataFrame.from_dict(index["scenarios"], orient="index")
+
+
+def store_scenarios(store_dir):
+    """Returns dict of scenario name to scenario entry in index.json"""
+    return json.loads((Path(store_dir) / "index.json").read_text())["scenarios"]
+
+
+def read_scenario(
+    store_dir, base_year, model_year, intermediate_year=None, regions=None
+):
+    """Reads one scenario from a store, only touching the requested regions
+
+    Args:
+        store_dir (pathlib.Path): store directory
+        base_year (numeric or str): base year of scenario
+        model_year (numeric): model year of scenario
+        intermediate_year (numeric or str): intermediate year of scenario, if any
+        regions (list): regions to read, all if None
+
+    Returns:
+        pandas.DataFrame: load profile for each region
+    """
+    key = scenario_key(base_year, model_year, intermediate_year)
+    return read_scenario_key(store_dir, key, regions=regions)
+
+
+def read_scenario_key(store_dir, key, regions=None):
+    """Same as read_scenario, but with the scenario given by name (see scenario_key)"""
+    store_dir = Path(store_dir)
+    chunk_file = store_dir / "chunks" / f"{key}.npy"
+    columns = json.loads(chunk_file.with_suffix(".json").read_text())
+    chunk = np.load(chunk_file, mmap_mode="r")
+
+    if regions is None:
+        regions = columns
+    column_numbers = [columns.index(region) for region in regions]
+
+    return pd.DataFrame(np.array(chunk[:, column_numbers]), columns=regions)
+
+
+def export_csv(store_dir, output_dir):
+    """Writes every scenario in a store as CSV, using the same layout as load_profile.main
+
+    Args:
+        store_dir (pathlib.Path): store directory
+        output_dir (pathlib.Path): directory for CSV files
+
+    Returns:
+        list: paths of written files
+    """
+    files = []
+    for key, scenario in store_scenarios(store_dir).items():
+        file_dir = Path(output_dir) / f"load_base_{scenario['base_year']}"
+        if scenario["intermediate_year"]:
+            file_dir = file_dir / f"load_intermediate_{scenario['intermediate_year']}"
+        file_dir.mkdir(parents=True, exist_ok=True)
+
+        file = file_dir / f"{key}.csv"
+        read_scenario_key(store_dir, key).to_csv(file)
+        files.append(file)
+
+    return files
@@ -0,0 +1,240 @@
+"""
+ Downsampled pyramid of each generated scenario, for fast plotting and comparison of
+ many scenarios (e.g. 20+ weather years) without reading 8760 hour files.
+
+ Each scenario's daily, weekly and monthly minimum, mean and maximum of every region (and of
+ the system, the sum of regions), and its month x hour of day mean heatmap, are written next
+ to its outputs as it is generated, in pyramid/<scenario>.npz. read_window returns the finest
+ resolution that fits a number of points for a time window, reading hours from the output
+ itself only when the window is short enough.
+"""
+
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from output_store import output_file, parse_scenario_key, read_scenario_key
+from summary import iter_scheme_outputs
+
+# days in each month of the 8760 hour (no leap day) year
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+# hours of the year pyramids are built for, month boundaries assume hourly values of a year
+# without leap day, as written by load_profile.py
+HOURS_PER_YEAR = 24 * DAYS_IN_MONTH.sum()
+
+# downsampled resolutions, finest first
+LEVELS = ("day", "week", "month")
+
+STATISTICS = ("min", "mean", "max")
+
+
+def _period_start_days(level, n_days):
+    """Returns first day (from 0) of each period of a level"""
+    if level == "day":
+        return np.arange(n_days)
+    if level == "week":
+        return np.arange(0, n_days, 7)
+    if level == "month":
+        return np.concatenate([[0], np.cumsum(DAYS_IN_MONTH)[:-1]])
+    raise ValueError(f"Unknown level {level}")
+
+
+def scenario_pyramid(df):
+    """Returns downsampled statistics of one scenario's load profile
+
+    Args:
+        df (pandas.DataFrame): load profile for each region (hour, region), 8760 hours
+
+    Returns:
+        dict: "regions" (region names, then "system"), "day", "week" and "month" arrays
+              with shape (period, statistic (min, mean, max), region) and "heatmap"
+              (month, hour of day, region) of mean load
+
+    Raises:
+        ValueError: if the profile isn't 8760 hours, as periods wouldn't line up with months
+    """
+    if len(df) != HOURS_PER_YEAR:
+        raise ValueError(
+            f"pyramids need {HOURS_PER_YEAR} hours (a year without leap day), got {len(df)}"
+        )
+
+    # column-major, see summary.scenario_summary
+    values = np.asfortranarray(df.to_numpy(dtype=np.float64))
+    values = np.concatenate([values, values.sum(axis=1, keepdims=True)], axis=1)
+    n_days = len(values) // 24
+    # (day, hour of day, region)
+    days = values.reshape(n_days, 24, -1)
+
+    pyramid = {
+        "regions": np.array(list(df.columns) + ["system"]),
+        "day": np.stack([days.min(axis=1), days.mean(axis=1), days.max(axis=1)], axis=1),
+    }
+    # longer periods from the daily statistics, days of a period are added with reduceat
+    for level in ("week", "month"):
+        starts = _period_start_days(level, n_days)
+        n_period_days = np.diff(np.append(starts, n_days))
+        pyramid[level] = np.stack(
+            [
+                np.minimum.reduceat(pyramid["day"][:, 0], starts, axis=0),
+                np.add.reduceat(pyramid["day"][:, 1], starts, axis=0)
+                / n_period_days[:, None],
+                np.maximum.reduceat(pyramid["day"][:, 2], starts, axis=0),
+            ],
+            axis=1,
+        )
+
+    month_starts = _period_start_days("month", n_days)
+    pyramid["heatmap"] = (
+        np.add.reduceat(days, month_starts, axis=0) / DAYS_IN_MONTH[:, None, None]
+    )
+
+    return pyramid
+
+
+def write_scenario_pyramids(output_dir, files):
+    """Writes the pyramid of each profile to output_dir / "pyramid" / f"{scenario}.npz"
+
+    Args:
+        output_dir (pathlib.Path): directory of an aggregation scheme's outputs
+        files (dict): keys are output file paths (as returned by generate_16_region_load_profiles),
+                      values are load profiles
+    """
+    pyramid_dir = Path(output_dir) / "pyramid"
+    pyramid_dir.mkdir(parents=True, exist_ok=True)
+
+    for file, df in files.items():
+        key = Path(file).stem
+        pyramid = scenario_pyramid(df)
+
+        temp_file = pyramid_dir / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file, "wb") as f:
+            np.savez(
+                f,
+                regions=pyramid["regions"],
+                **{
+                    name: pyramid[name].astype(np.float32)
+                    for name in LEVELS + ("heatmap",)
+                },
+            )
+        os.replace(temp_file, pyramid_dir / f"{key}.npz")
+
+
+def build_pyramids(output_dir):
+    """Writes pyramids of the outputs already in output_dir (CSV files and the store, if any),
+    e.g. of runs from before pyramids were written
+
+    Args:
+        output_dir (pathlib.Path): directory of an aggregation scheme's outputs
+
+    Returns:
+        list: names of scenarios
+    """
+    keys = []
+    for key, df in iter_scheme_outputs(output_dir):
+        write_scenario_pyramids(output_dir, {key: df})
+        keys.append(key)
+
+    return keys
+
+
+def read_pyramid(output_dir, scenario):
+    """Returns pyramid of one scenario (see scenario_pyramid), as written by write_scenario_pyramids"""
+    with np.load(Path(output_dir) / "pyramid" / f"{scenario}.npz") as pyramid:
+        return {name: pyramid[name] for name in pyramid.files}
+
+
+def _read_hours(output_dir, scenario, region, start_hour, end_hour):
+    """Returns hours start_hour to end_hour of one region (or "system") of an output,
+    from the store if it has the scenario, otherwise from its CSV file"""
+    output_dir = Path(output_dir)
+    store_dir = output_dir / "store"
+    if (store_dir / "chunks" / f"{scenario}.npy").exists():
+        # chunks are memory mapped, so only the window is read
+        df = read_scenario_key(
+            store_dir, scenario, regions=None if region == "system" else [region]
+        ).iloc[start_hour:end_hour]
+    else:
+        file = output_file(output_dir, **parse_scenario_key(scenario))
+        usecols = None
+        if region != "system":
+            usecols = [0, pd.read_csv(file, nrows=0).columns.get_loc(region)]
+        # only the window's rows are parsed
+        df = pd.read_csv(
+            file,
+            index_col=0,
+            usecols=usecols,
+            skiprows=range(1, start_hour + 1),
+            nrows=end_hour - start_hour,
+        )
+
+    values = df.to_numpy(dtype=np.float64)
+    return values.sum(axis=1) if region == "system" else values[:, 0]
+
+
+def read_window(
+    output_dir,
+    scenarios,
+    region="system",
+    start_hour=0,
+    end_hour=HOURS_PER_YEAR,
+    max_points=1000,
+):
+    """Returns one region of several scenarios over a time window, at the finest resolution
+    (hour, day, week or month) with at most max_points periods in the window
+
+    Args:
+        output_dir (pathlib.Path): directory of an aggregation scheme's outputs
+        scenarios (list): scenario names (see output_store.scenario_key)
+        region (str): region name, or "system" for the sum of regions
+        start_hour (int): first hour of the window (from 0)
+        end_hour (int): hour after the last hour of the window
+        max_points (int): maximum number of periods returned per scenario
+
+    Returns:
+        tuple: resolution ("hour", "day", "week" or "month") and pandas.DataFrame, index is the
+               first hour of each period, columns are (scenario, statistic (min, mean, max))
+    """
+    if end_hour - start_hour <= max_points:
+        frames = {}
+        for scenario in scenarios:
+            values = _read_hours(output_dir, scenario, region, start_hour, end_hour)
+            frames[scenario] = pd.DataFrame(
+                {statistic: values for statistic in STATISTICS},
+                index=np.arange(start_hour, end_hour),
+            )
+        return "hour", pd.concat(frames, axis=1)
+
+    for level in LEVELS:
+        start_hours = _period_start_days(level, HOURS_PER_YEAR // 24) * 24
+        end_hours = np.append(start_hours[1:], HOURS_PER_YEAR)
+        # periods overlapping the window
+        in_window = (end_hours > start_hour) & (start_hours < end_hour)
+        if in_window.sum() <= max_points or level == LEVELS[-1]:
+            break
+
+    frames = {}
+    for scenario in scenarios:
+        pyramid = read_pyramid(output_dir, scenario)
+        region_number = list(pyramid["regions"]).index(region)
+        frames[scenario] = pd.DataFrame(
+            pyramid[level][in_window, :, region_number],
+            index=start_hours[in_window],
+            columns=list(STATISTICS),
+        )
+
+    return level, pd.concat(frames, axis=1)
+
+
+def read_heatmap(output_dir, scenario, region="system"):
+    """Returns month x hour of day mean load of one region (or "system") of a scenario"""
+    pyramid = read_pyramid(output_dir, scenario)
+    region_number = list(pyramid["regions"]).index(region)
+    return pd.DataFrame(
+        pyramid["heatmap"][:, :, region_number],
+        index=pd.Index(np.arange(1, 13), name="month"),
+        columns=pd.Index(np.arange(24), name="hour"),
+    )
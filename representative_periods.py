@@ -0,0 +1,406 @@
+"""
+ Time domain reduction: representative periods (days or weeks) of region profiles for GenX.
+
+ The periods of one or more profiles (e.g. several weather years) are clustered across all
+ regions at once with k-means or k-medoids, after scaling each region by its peak. Periods
+ containing the highest load (of the system, or of each region) are always kept as their own
+ representatives. Each representative is an actual period (the medoid, or for k-means the
+ period closest to its cluster's mean), weighted by the hours it stands for.
+ Options are described at bottom of script
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from output_store import parse_scenario_key
+from verify import output_sources, read_output, run_batches
+
+
+def split_periods(profiles, period_hours=168):
+    """Returns the periods of every profile
+
+    Args:
+        profiles (dict): keys are profile names (e.g. weather years), values are load profiles
+                         (hour, region) with the same regions
+        period_hours (int): hours per period, e.g. 24 for days or 168 for weeks
+
+    Returns:
+        tuple: numpy.ndarray of full periods with shape (period, hour, region), and
+               pandas.DataFrame with one row per period (profile, period, start_hour, hours, full).
+               Hours after the last full period of a profile form a period that is not full
+               and is represented by the same representative as the period before it
+    """
+    periods = []
+    rows = []
+    for name, df in profiles.items():
+        values = df.to_numpy(dtype=np.float64)
+        n_full = len(values) // period_hours
+        periods.append(
+            values[: n_full * period_hours].reshape(n_full, period_hours, -1)
+        )
+        rows += [
+            {
+                "profile": name,
+                "period": period + 1,
+                "start_hour": period * period_hours,
+                "hours": period_hours,
+                "full": True,
+            }
+            for period in range(n_full)
+        ]
+        if len(values) > n_full * period_hours:
+            rows.append(
+                {
+                    "profile": name,
+                    "period": n_full + 1,
+                    "start_hour": n_full * period_hours,
+                    "hours": len(values) - n_full * period_hours,
+                    "full": False,
+                }
+            )
+
+    return np.concatenate(periods), pd.DataFrame(rows)
+
+
+def _squared_norms(x):
+    return np.einsum("ij,ij->i", x, x)
+
+
+def _squared_distances(x, y, x_norms=None, y_norms=None):
+    """Returns (len(x), len(y)) squared euclidean distances between rows of x and y,
+    from their squared norms (computed if not given) and one matrix product"""
+    if x_norms is None:
+        x_norms = _squared_norms(x)
+    if y_norms is None:
+        y_norms = _squared_norms(y)
+
+    return np.maximum(x_norms[:, None] - 2 * x @ y.T + y_norms[None, :], 0.0)
+
+
+def _kmeans_plus_plus(x, x_norms, n_clusters, rng):
+    """Returns indices of initial centers, each drawn with probability proportional to
+    its squared distance from the nearest center already drawn"""
+    centers = [rng.integers(len(x))]
+    distances = _squared_distances(x, x[centers], x_norms, x_norms[centers])[:, 0]
+    for _ in range(1, n_clusters):
+        total = distances.sum()
+        center = (
+            rng.choice(len(x), p=distances / total) if total > 0 else rng.integers(len(x))
+        )
+        centers.append(center)
+        distances = np.minimum(
+            distances,
+            _squared_distances(x, x[[center]], x_norms, x_norms[[center]])[:, 0],
+        )
+
+    return np.array(centers)
+
+
+def _kmeans(x, x_norms, n_clusters, rng, max_iter):
+    """Returns labels and representatives (periods closest to each cluster's mean) of one k-means run"""
+    centers = x[_kmeans_plus_plus(x, x_norms, n_clusters, rng)]
+    for _ in range(max_iter):
+        labels = _squared_distances(x, centers, x_norms).argmin(axis=1)
+        # means of every cluster in one product with the (period, cluster) indicator matrix
+        members = np.eye(n_clusters)[labels]
+        counts = members.sum(axis=0)
+        new_centers = np.where(
+            counts[:, None] > 0,
+            members.T @ x / np.maximum(counts, 1)[:, None],
+            centers,
+        )
+        if np.allclose(new_centers, centers):
+            break
+        centers = new_centers
+
+    distances = _squared_distances(x, centers, x_norms)
+    labels = distances.argmin(axis=1)
+    # representative of each cluster is its member closest to the mean
+    member_distances = np.where(
+        labels[:, None] == np.arange(n_clusters)[None, :], distances, np.inf
+    )
+    representatives = member_distances.argmin(axis=0)
+
+    return labels, representatives, distances[np.arange(len(x)), labels].sum()
+
+
+def _kmedoids(x, x_norms, n_clusters, rng, max_iter):
+    """Returns labels and medoids of one k-medoids run (alternating assignment and medoid update)"""
+    medoids = _kmeans_plus_plus(x, x_norms, n_clusters, rng)
+    for _ in range(max_iter):
+        labels = _squared_distances(x, x[medoids], x_norms, x_norms[medoids]).argmin(
+            axis=1
+        )
+        labels[medoids] = np.arange(n_clusters)
+        new_medoids = medoids.copy()
+        for cluster in range(n_clusters):
+            members = np.flatnonzero(labels == cluster)
+            # member with the smallest total distance to the others
+            new_medoids[cluster] = members[
+                _squared_distances(
+                    x[members], x[members], x_norms[members], x_norms[members]
+                )
+                .sum(axis=1)
+                .argmin()
+            ]
+        if (new_medoids == medoids).all():
+            break
+        medoids = new_medoids
+
+    distances = _squared_distances(x, x[medoids], x_norms, x_norms[medoids])
+    labels = distances.argmin(axis=1)
+    labels[medoids] = np.arange(n_clusters)
+
+    return labels, medoids, distances[np.arange(len(x)), labels].sum()
+
+
+def cluster_periods(
+    features, n_clusters, method="kmeans", seed=0, n_init=10, max_iter=100
+):
+    """Clusters periods, keeping the best (lowest total squared distance) of n_init runs
+
+    Args:
+        features (numpy.ndarray): shape (period, feature)
+        n_clusters (int): number of clusters
+        method (str): "kmeans" or "kmedoids"
+        seed (int): seed of the random initializations
+        n_init (int): number of runs from different initial centers
+        max_iter (int): iterations per run
+
+    Returns:
+        tuple: cluster of each period and period representing each cluster (numpy.ndarray)
+    """
+    if method == "kmeans":
+        run = _kmeans
+    elif method == "kmedoids":
+        run = _kmedoids
+    else:
+        raise ValueError(f"Unknown clustering method {method}")
+
+    n_clusters = min(n_clusters, len(features))
+    if features.shape[1] > 2 * features.shape[0]:
+        # distances (and so clusters) are the same in the principal coordinates of the
+        # centered periods (from their gram matrix), which have as many dimensions as periods
+        centered = features - features.mean(axis=0)
+        eigenvalues, eigenvectors = np.linalg.eigh(centered @ centered.T)
+        features = eigenvectors * np.sqrt(np.maximum(eigenvalues, 0.0))
+
+    rng = np.random.default_rng(seed)
+    norms = _squared_norms(features)
+    best = None
+    for _ in range(n_init):
+        labels, representatives, cost = run(features, norms, n_clusters, rng, max_iter)
+        if best is None or cost < best[2]:
+            best = (labels, representatives, cost)
+
+    return best[0], best[1]
+
+
+def _extreme_periods(periods, extreme_periods):
+    """Returns sorted indices of periods containing the highest system load ("system"),
+    or the highest load of each region ("regions")"""
+    if extreme_periods is None:
+        return np.array([], dtype=int)
+    if extreme_periods == "system":
+        peaks = periods.sum(axis=2).max(axis=1)[:, None]
+    elif extreme_periods == "regions":
+        peaks = periods.max(axis=1)
+    else:
+        raise ValueError(f"Unknown extreme periods {extreme_periods}")
+
+    return np.unique(peaks.argmax(axis=0))
+
+
+def reduce_profiles(
+    profiles,
+    n_representatives,
+    period_hours=168,
+    method="kmeans",
+    extreme_periods="system",
+    seed=0,
+    n_init=10,
+    max_iter=100,
+):
+    """Returns representative periods of one or more profiles
+
+    Args:
+        profiles (dict or pandas.DataFrame): load profile (hour, region), or dict of profile name
+                                             (e.g. weather year, or model year as returned by
+                                             generate_16_region_load_profiles) to load profiles,
+                                             which are clustered together
+        n_representatives (int): number of representative periods, including extreme periods
+        period_hours (int): hours per period, e.g. 24 for days or 168 for weeks
+        method (str): "kmeans" or "kmedoids", see cluster_periods
+        extreme_periods (str): periods kept as their own representatives: "system" (highest
+                               sum of regions), "regions" (highest load of each region) or None
+        seed (int): seed of the clustering, the same seed gives the same periods
+        n_init (int): number of clustering runs, see cluster_periods
+        max_iter (int): iterations per clustering run
+
+    Returns:
+        dict: "profiles" (representative periods one after the other, index is Time_Index from 1),
+              "weights" (one row per representative: the profile and period it is, the hours it
+              represents and if it is an extreme period) and "mapping" (representative of every period)
+    """
+    if isinstance(profiles, pd.DataFrame):
+        profiles = {None: profiles}
+    columns = list(next(iter(profiles.values())).columns)
+
+    periods, mapping = split_periods(profiles, period_hours)
+    full = mapping[mapping["full"]].index.to_numpy()
+
+    # every region weighs the same, whatever its size
+    features = periods / np.maximum(periods.max(axis=(0, 1)), 1e-12)
+    features = features.reshape(len(periods), -1)
+
+    extremes = _extreme_periods(periods, extreme_periods)
+    n_clusters = n_representatives - len(extremes)
+    if n_clusters < 1:
+        raise ValueError(
+            f"{n_representatives} representatives can't hold {len(extremes)} extreme periods"
+        )
+
+    rest = np.setdiff1d(np.arange(len(periods)), extremes)
+    labels, representatives = cluster_periods(
+        features[rest], n_clusters, method=method, seed=seed, n_init=n_init, max_iter=max_iter
+    )
+
+    # representative (from 0) of each full period, extreme periods first
+    period_representative = np.empty(len(periods), dtype=int)
+    period_representative[extremes] = np.arange(len(extremes))
+    period_representative[rest] = len(extremes) + labels
+    representative_periods = np.concatenate([extremes, rest[representatives]])
+
+    # periods that are not full are represented like the period before them
+    representative = pd.Series(np.nan, index=mapping.index)
+    representative[full] = period_representative
+    mapping["representative"] = representative.ffill().astype(int) + 1
+
+    weights = mapping.groupby("representative")["hours"].sum()
+    representative_rows = mapping.loc[full[representative_periods]]
+    weights = pd.DataFrame(
+        {
+            "representative": np.arange(1, len(representative_periods) + 1),
+            "profile": representative_rows["profile"].to_numpy(),
+            "period": representative_rows["period"].to_numpy(),
+            "weight": weights.reindex(
+                np.arange(1, len(representative_periods) + 1), fill_value=0
+            ).to_numpy(),
+            "extreme": np.arange(len(representative_periods)) < len(extremes),
+        }
+    )
+
+    reduced = pd.DataFrame(
+        periods[representative_periods].reshape(-1, len(columns)), columns=columns
+    )
+    reduced.index = pd.Index(np.arange(1, len(reduced) + 1), name="Time_Index")
+
+    return {"profiles": reduced, "weights": weights, "mapping": mapping}
+
+
+def write_reduction(output_dir, name, reduction):
+    """Writes representative profiles, weights and mapping to output_dir / f"{name}_*.csv" """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    reduction["profiles"].to_csv(output_dir / f"{name}_representative_periods.csv")
+    reduction["weights"].to_csv(output_dir / f"{name}_weights.csv", index=False)
+    reduction["mapping"].to_csv(output_dir / f"{name}_mapping.csv", index=False)
+
+
+def _reduce_batch(batch):
+    """Reduces a batch of (reduction directory, name, sources, arguments) tuples, returns their names"""
+    names = []
+    for reduction_dir, name, sources, kwargs in batch:
+        profiles = {}
+        for profile_name, source in sources.items():
+            columns, values = read_output(source)
+            profiles[profile_name] = pd.DataFrame(values, columns=columns)
+        write_reduction(reduction_dir, name, reduce_profiles(profiles, **kwargs))
+        names.append(name)
+
+    return names
+
+
+def reduce_outputs(
+    output_dir,
+    reduced_dir=None,
+    across_weather_years=False,
+    max_workers=None,
+    **kwargs,
+):
+    """Reduces every output (CSV files and stores) under output_dir
+
+    Args:
+        output_dir (pathlib.Path): output tree, e.g. of a scenario sweep
+        reduced_dir (pathlib.Path): directory for reduced outputs, defaults to
+                                    output_dir / "representative_periods"
+        across_weather_years (bool): cluster the profiles of every base (weather) year of
+                                     the same model (and intermediate) year together,
+                                     instead of each output on its own
+        max_workers (int): number of worker processes, defaults to number of CPUs
+        **kwargs: arguments of reduce_profiles (n_representatives, period_hours, method, ...)
+
+    Returns:
+        list: names of reductions written
+    """
+    output_dir = Path(output_dir)
+    if reduced_dir is None:
+        reduced_dir = output_dir / "representative_periods"
+
+    # outputs reduced together, by name of the reduction
+    groups = {}
+    for key, source in output_sources(output_dir).items():
+        key = Path(key)
+        if reduced_dir in (output_dir / key).parents:
+            continue
+        name = key.stem
+        profile_name = None
+        if across_weather_years:
+            scenario = parse_scenario_key(key.stem)
+            profile_name = scenario["base_year"]
+            name = f"model{scenario['model_year']}"
+            if scenario["intermediate_year"]:
+                name = f"intermediate{scenario['intermediate_year']}_{name}"
+        # outputs of sweeps and schemes are kept apart by the folders above load_base_*
+        prefix = [part for part in key.parts[:-1] if not part.startswith("load_")]
+        groups.setdefault((*prefix, name), {})[profile_name] = source
+
+    run_batches(
+        _reduce_batch,
+        [
+            (reduced_dir.joinpath(*prefix), name, sources, kwargs)
+            for (*prefix, name), sources in groups.items()
+        ],
+        max_workers,
+    )
+
+    return ["/".join((*prefix, name)) for (*prefix, name) in groups]
+
+
+if __name__ == "__main__":
+    ###### OPTIONS ######
+
+    output_dir = Path("outputs")  # output tree to reduce
+    reduced_dir = output_dir / "representative_periods"  # location of reduced outputs
+
+    n_representatives = 8  # representative periods, including extreme periods
+    period_hours = 168  # hours per period (24 for days, 168 for weeks)
+    method = "kmeans"  # "kmeans" or "kmedoids"
+    extreme_periods = "system"  # "system", "regions" (peak of each region) or None
+    across_weather_years = False  # cluster all weather years of a model year together
+    seed = 0  # seed of the clustering
+
+    ###### END OPTIONS ######
+    names = reduce_outputs(
+        output_dir,
+        reduced_dir=reduced_dir,
+        across_weather_years=across_weather_years,
+        n_representatives=n_representatives,
+        period_hours=period_hours,
+        method=method,
+        extreme_periods=extreme_periods,
+        seed=seed,
+    )
+    print(f"wrote {len(names)} reductions to {reduced_dir}")
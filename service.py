@@ -0,0 +1,346 @@
+"""
+ Long-lived local profile service, so scripts that request many similar profiles
+ (a different model year or growth rate) don't pay for startup and input parsing each time.
+
+ Population data and EV loads are read once, and parsed load profiles and generated
+ profiles are kept in LRU caches. Profiles are served over HTTP (TCP or a Unix socket):
+
+    GET /profile?base_year=2002&model_year=2030[&intermediate_year=2021][&scaling_factor=1.018][&format=csv|npy]
+    GET /stats
+
+ "csv" responses match the files written by load_profile.py; "npy" responses are a float32
+ .npy array with the region names in the X-Columns header. /stats returns cache hit and
+ miss counters as JSON.
+ Options are described at bottom of script
+"""
+
+import asyncio
+import io
+import json
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlencode, urlsplit
+from urllib.request import urlopen
+
+import numpy as np
+import pandas as pd
+
+from extra_functions import cached, new_lru_cache
+from load_profile import (
+    generate_16_region_load_profiles,
+    read_county_population_data,
+    read_ercot_load_profile,
+)
+
+# rows per chunk when streaming CSV responses
+CSV_CHUNK_ROWS = 1000
+
+
+def new_profile_service(
+    data_dir,
+    load_files,
+    ev_file="ev_extra_loads.csv",
+    cache_dir=None,
+    max_load_profiles=8,
+    max_profiles=64,
+):
+    """Returns a profile service with population data and EV loads read and empty caches
+
+    Args:
+        data_dir (pathlib.Path): directory containing county_population_data.csv and ev_file
+        load_files (dict): keys are base (and intermediate) years, values are paths to load files
+        ev_file (str): name of EV load file in data_dir
+        cache_dir (pathlib.Path): directory for parsed input files, see read_ercot_load_profile
+        max_load_profiles (int): number of parsed load profiles kept in memory
+        max_profiles (int): number of generated profiles kept in memory
+
+    Returns:
+        dict: profile service
+    """
+    data_dir = Path(data_dir)
+    return {
+        "county_populations": read_county_population_data(
+            data_dir / "county_population_data.csv"
+        ),
+        "ev_loads": pd.read_csv(data_dir / ev_file),
+        "load_files": {str(year): Path(path) for year, path in load_files.items()},
+        "cache_dir": cache_dir,
+        "caches": {
+            "load_profiles": new_lru_cache(max_load_profiles),
+            "profiles": new_lru_cache(max_profiles),
+        },
+        "counters": {
+            "load_profiles": {"hits": 0, "misses": 0},
+            "profiles": {"hits": 0, "misses": 0},
+        },
+    }
+
+
+def _cached(service, cache_name, key, load):
+    """Returns cached DataFrame of key (see extra_functions.cached), counting cache hits and
+    misses. The cached DataFrame (a view of the generated loads)
+    is returned as a shallow copy, which pandas copies on write, so callers changing it
+    don't change the cache"""
+    cache = service["caches"][cache_name]
+    counters = service["counters"][cache_name]
+    counters["hits" if key in cache["entries"] else "misses"] += 1
+
+    return cached(cache, key, load).copy(deep=False)
+
+
+def service_load_profile(service, year):
+    """Returns parsed load profile of a base or intermediate year"""
+    year = str(year)
+    if year not in service["load_files"]:
+        raise KeyError(f"no load file for {year}")
+
+    return _cached(
+        service,
+        "load_profiles",
+        year,
+        lambda: read_ercot_load_profile(
+            service["load_files"][year], cache_dir=service["cache_dir"]
+        ),
+    )
+
+
+def service_profile(
+    service, base_year, model_year, intermediate_year=None, scaling_factor=1.018
+):
+    """Returns load profile of each model region for one scenario
+
+    Args:
+        service (dict): from new_profile_service
+        base_year (numeric or str): Year of initial profile
+        model_year (numeric): Year the load is scaled to
+        intermediate_year (numeric or str): Year of intermediate profile, optional
+        scaling_factor (float like): Factor to scale load by each year
+
+    Returns:
+        pandas.DataFrame: load profile for each model region
+    """
+    base_year = str(base_year)
+    model_year = int(model_year)
+    if intermediate_year and int(base_year) >= int(intermediate_year):
+        # same profile as without intermediate scaling
+        intermediate_year = None
+    intermediate_year = intermediate_year and int(intermediate_year)
+    scaling_factor = float(scaling_factor)
+
+    def generate():
+        intermediate_load = None
+        if intermediate_year:
+            intermediate_load = service_load_profile(service, intermediate_year)
+
+        return generate_16_region_load_profiles(
+            service_load_profile(service, base_year),
+            base_year=base_year,
+            model_years=[model_year],
+            county_population_data=service["county_populations"],
+            ev_loads=service["ev_loads"],
+            scaling_factor=scaling_factor,
+            intermediate_year=intermediate_year,
+            intermediate_load=intermediate_load,
+            outputs_to_file=False,
+        )[model_year]
+
+    key = (base_year, model_year, intermediate_year, scaling_factor)
+    return _cached(service, "profiles", key, generate)
+
+
+def service_stats(service):
+    """Returns cache hit and miss counters and number of cached entries"""
+    return {
+        cache_name: counters
+        | {"entries": len(service["caches"][cache_name]["entries"])}
+        for cache_name, counters in service["counters"].items()
+    }
+
+
+async def _write_response(writer, status, content_type, body=b"", headers=None):
+    header_lines = [
+        f"HTTP/1.1 {status}",
+        f"Content-Type: {content_type}",
+        "Connection: close",
+    ]
+    if isinstance(body, bytes):
+        header_lines.append(f"Content-Length: {len(body)}")
+    for name, value in (headers or {}).items():
+        header_lines.append(f"{name}: {value}")
+    writer.write(("\r\n".join(header_lines) + "\r\n\r\n").encode())
+
+    if isinstance(body, bytes):
+        writer.write(body)
+        await writer.drain()
+        return
+
+    # stream chunks as they are produced
+    for chunk in body:
+        writer.write(chunk)
+        await writer.drain()
+
+
+def _csv_chunks(df):
+    """Yields df as CSV (same as DataFrame.to_csv) in chunks of CSV_CHUNK_ROWS rows"""
+    for start in range(0, len(df), CSV_CHUNK_ROWS):
+        yield df.iloc[start : start + CSV_CHUNK_ROWS].to_csv(header=start == 0).encode()
+
+
+async def _handle_request(service, lock, reader, writer):
+    """Answers one HTTP request"""
+    try:
+        request_line = (await reader.readline()).decode().split()
+        # skip headers
+        while (await reader.readline()).strip():
+            pass
+
+        if len(request_line) < 2 or request_line[0] != "GET":
+            await _write_response(writer, "405 Method Not Allowed", "text/plain")
+            return
+
+        url = urlsplit(request_line[1])
+        if url.path == "/stats":
+            body = json.dumps(service_stats(service)).encode()
+            await _write_response(writer, "200 OK", "application/json", body)
+            return
+
+        if url.path != "/profile":
+            await _write_response(writer, "404 Not Found", "text/plain")
+            return
+
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        output_format = query.pop("format", "csv")
+        start = time.perf_counter()
+        try:
+            # one profile is generated at a time, off the event loop so other
+            # requests (e.g. /stats) are answered while spreadsheets are parsed
+            async with lock:
+                df = await asyncio.to_thread(service_profile, service, **query)
+        except (KeyError, TypeError, ValueError) as error:
+            await _write_response(
+                writer, "400 Bad Request", "text/plain", str(error).encode()
+            )
+            return
+        except Exception as error:
+            # e.g. an unreadable load file, the service keeps serving other requests
+            body = json.dumps({"error": f"{type(error).__name__}: {error}"}).encode()
+            await _write_response(
+                writer, "500 Internal Server Error", "application/json", body
+            )
+            return
+        headers = {"X-Seconds": f"{time.perf_counter() - start:.6f}"}
+
+        if output_format == "npy":
+            buffer = io.BytesIO()
+            np.save(buffer, df.to_numpy(dtype="float32"))
+            headers["X-Columns"] = json.dumps(list(df.columns))
+            await _write_response(
+                writer,
+                "200 OK",
+                "application/octet-stream",
+                buffer.getvalue(),
+                headers,
+            )
+        else:
+            await _write_response(
+                writer, "200 OK", "text/csv", _csv_chunks(df), headers
+            )
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def serve(service, host="127.0.0.1", port=8765, unix_socket=None):
+    """Serves profiles until cancelled
+
+    Args:
+        service (dict): from new_profile_service
+        host (str): address to listen on
+        port (int): port to listen on
+        unix_socket (pathlib.Path): listen on this Unix socket instead of host and port
+    """
+    lock = asyncio.Lock()
+
+    async def handle(reader, writer):
+        await _handle_request(service, lock, reader, writer)
+
+    if unix_socket is not None:
+        server = await asyncio.start_unix_server(handle, path=str(unix_socket))
+    else:
+        server = await asyncio.start_server(handle, host, port)
+
+    async with server:
+        await server.serve_forever()
+
+
+def fetch_profile(url, base_year, model_year, intermediate_year=None, scaling_factor=1.018):
+    """Requests a profile from a running service (over TCP)
+
+    Args:
+        url (str): address of service, e.g. "http://127.0.0.1:8765"
+        base_year (numeric or str): Year of initial profile
+        model_year (numeric): Year the load is scaled to
+        intermediate_year (numeric or str): Year of intermediate profile, optional
+        scaling_factor (float like): Factor to scale load by each year
+
+    Returns:
+        pandas.DataFrame: load profile for each model region (float32)
+    """
+    query = {
+        "base_year": base_year,
+        "model_year": model_year,
+        "scaling_factor": scaling_factor,
+        "format": "npy",
+    }
+    if intermediate_year:
+        query["intermediate_year"] = intermediate_year
+
+    with urlopen(f"{url}/profile?{urlencode(query)}") as response:
+        columns = json.loads(response.headers["X-Columns"])
+        return pd.DataFrame(np.load(io.BytesIO(response.read())), columns=columns)
+
+
+if __name__ == "__main__":
+    ###### OPTIONS ######
+
+    input_dir = Path("inputs")  # location of input files
+    data_dir = Path(
+        "data"
+    )  # location of data, looks for "county_population_data.csv" and "ev_extra_loads.csv"
+    cache_dir = input_dir / ".cache"  # location of parsed input files (None to disable)
+    host = "127.0.0.1"  # address to listen on
+    port = 8765  # port to listen on
+    unix_socket = None  # path of a Unix socket to listen on instead of host and port
+    max_load_profiles = 8  # parsed load profiles kept in memory
+    max_profiles = 64  # generated profiles kept in memory
+
+    # base (and intermediate) year load files that can be requested
+    load_files = {
+        str(year): input_dir / f"{year}_ercot_hourly_load_data.xls"
+        for year in range(2002, 2015)
+    }
+    load_files.update({"2015": input_dir / "native_load_2015.xls"})
+    load_files.update(
+        {
+            str(year): input_dir / f"native_Load_{year}.xlsx"
+            for year in range(2016, 2018)
+        }
+    )
+    load_files.update(
+        {
+            str(year): input_dir / f"Native_Load_{year}.xlsx"
+            for year in range(2018, 2021)
+        }
+    )
+    load_files.update({"2021": input_dir / "Native_Load_2021_NOShed.xlsx"})
+
+    ###### END OPTIONS ######
+    service = new_profile_service(
+        data_dir,
+        load_files,
+        cache_dir=cache_dir,
+        max_load_profiles=max_load_profiles,
+        max_profiles=max_profiles,
+    )
+    print(f"serving on {unix_socket or f'http://{host}:{port}'}")
+    asyncio.run(serve(service, host=host, port=port, unix_socket=unix_socket))
@@ -0,0 +1,200 @@
+"""
+ Summary index of generated scenarios, so questions like "which weather year gives the
+ highest 2035 Houston peak?" are answered without reading any time series.
+
+ Each scenario's summary (annual energy, peak and peak hour and load factor of each region
+ and of the coincident system load, and load-duration curves sampled at LDC_POINTS) is
+ written next to its outputs as it is generated, in summary/<scenario>.json, and
+ write_summary_index merges them into summary.json (like the chunks and index of a store,
+ so writer threads and processes never write the same file).
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from output_store import (
+    SCENARIO_PATTERN,
+    parse_scenario_key,
+    read_scenario_key,
+    store_scenarios,
+)
+
+SUMMARY_INDEX_VERSION = 1
+
+# fractions of hours at or above each load-duration curve point (0 is the peak, 1 the minimum)
+LDC_POINTS = np.linspace(0, 1, 101)
+
+
+def scenario_summary(df):
+    """Returns summary of one scenario's load profile
+
+    Args:
+        df (pandas.DataFrame): load profile for each region (hour, region)
+
+    Returns:
+        dict: "regions" and, for each region and "system" (sum of regions), "energy" (MWh),
+              "peak" (MW), "peak_hour" (position in the year, from 0), "load_factor" and
+              "ldc" (load at each of LDC_POINTS)
+    """
+    # column-major (as DataFrames store columns), so sums don't depend on how df was built
+    values = np.asfortranarray(df.to_numpy(dtype=np.float64))
+    # (hour, region + system)
+    values = np.concatenate([values, values.sum(axis=1, keepdims=True)], axis=1)
+    n_hours = len(values)
+
+    energy = values.sum(axis=0)
+    peak = values.max(axis=0)
+    ldc_hours = np.round(LDC_POINTS * (n_hours - 1)).astype(int)
+    ldc = -np.sort(-values, axis=0)[ldc_hours]
+
+    return {
+        "regions": list(df.columns),
+        "hours": n_hours,
+        "energy": energy.tolist(),
+        "peak": peak.tolist(),
+        "peak_hour": values.argmax(axis=0).tolist(),
+        "load_factor": (energy / (peak * n_hours)).tolist(),
+        "ldc": ldc.T.tolist(),
+    }
+
+
+def write_scenario_summaries(output_dir, files):
+    """Writes the summary of each profile to output_dir / "summary" / f"{scenario}.json"
+
+    Args:
+        output_dir (pathlib.Path): directory of an aggregation scheme's outputs
+        files (dict): keys are output file paths (as returned by generate_16_region_load_profiles),
+                      values are load profiles
+    """
+    summary_dir = Path(output_dir) / "summary"
+    summary_dir.mkdir(parents=True, exist_ok=True)
+
+    for file, df in files.items():
+        key = Path(file).stem
+        summary = parse_scenario_key(key) | scenario_summary(df)
+
+        temp_file = summary_dir / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        temp_file.write_text(json.dumps(summary))
+        os.replace(temp_file, summary_dir / f"{key}.json")
+
+
+def write_summary_index(output_dir):
+    """Merges the scenario summaries of output_dir into output_dir / "summary.json"
+
+    Args:
+        output_dir (pathlib.Path): directory of an aggregation scheme's outputs
+
+    Returns:
+        dict: summary index
+    """
+    output_dir = Path(output_dir)
+
+    scenarios = {}
+    for summary_file in sorted((output_dir / "summary").glob("*.json")):
+        scenarios[summary_file.stem] = json.loads(summary_file.read_text())
+
+    index = {
+        "version": SUMMARY_INDEX_VERSION,
+        "ldc_points": LDC_POINTS.tolist(),
+        "scenarios": scenarios,
+    }
+
+    temp_file = output_dir / f"summary.{os.getpid()}.tmp"
+    temp_file.write_text(json.dumps(index))
+    os.replace(temp_file, output_dir / "summary.json")
+
+    return index
+
+
+def iter_scheme_outputs(output_dir):
+    """Yields (scenario name, load profile) of each output already in output_dir
+    (CSV files and the store, if any)
+
+    Args:
+        output_dir (pathlib.Path): directory of an aggregation scheme's outputs
+    """
+    output_dir = Path(output_dir)
+
+    for file in sorted(output_dir.glob("load_base_*/**/load_base*.csv")):
+        if SCENARIO_PATTERN.fullmatch(file.stem):
+            yield file.stem, pd.read_csv(file, index_col=0, dtype=np.float64)
+
+    store_dir = output_dir / "store"
+    if (store_dir / "index.json").exists():
+        for key in store_scenarios(store_dir):
+            yield key, read_scenario_key(store_dir, key)
+
+
+def build_summary_index(output_dir):
+    """Summarizes the outputs already in output_dir, e.g. of runs from before summaries
+    were written, and writes the summary index
+
+    Args:
+        output_dir (pathlib.Path): directory of an aggregation scheme's outputs
+
+    Returns:
+        dict: summary index
+    """
+    for key, df in iter_scheme_outputs(output_dir):
+        write_scenario_summaries(output_dir, {key: df})
+
+    return write_summary_index(output_dir)
+
+
+def _read_summary_index(output_dir):
+    return json.loads((Path(output_dir) / "summary.json").read_text())
+
+
+def read_summary(output_dir):
+    """Returns summary of every scenario and region
+
+    Args:
+        output_dir (pathlib.Path): directory of an aggregation scheme's outputs
+
+    Returns:
+        pandas.DataFrame: one row per scenario and region (and "system", the coincident
+                          sum of regions), columns are scenario, base_year, intermediate_year,
+                          model_year, region, energy, peak, peak_hour and load_factor
+    """
+    rows = []
+    for key, summary in _read_summary_index(output_dir)["scenarios"].items():
+        for number, region in enumerate(summary["regions"] + ["system"]):
+            rows.append(
+                {
+                    "scenario": key,
+                    "base_year": summary["base_year"],
+                    "intermediate_year": summary["intermediate_year"],
+                    "model_year": summary["model_year"],
+                    "region": region,
+                    "energy": summary["energy"][number],
+                    "peak": summary["peak"][number],
+                    "peak_hour": summary["peak_hour"][number],
+                    "load_factor": summary["load_factor"][number],
+                }
+            )
+
+    return pd.DataFrame(rows)
+
+
+def read_load_duration_curves(output_dir, region="system"):
+    """Returns load-duration curve of one region (or "system") of every scenario
+
+    Args:
+        output_dir (pathlib.Path): directory of an aggregation scheme's outputs
+        region (str): region name, or "system" for the sum of regions
+
+    Returns:
+        pandas.DataFrame: index is scenario, columns are LDC points (fraction of hours at or above)
+    """
+    index = _read_summary_index(output_dir)
+    curves = {}
+    for key, summary in index["scenarios"].items():
+        regions = summary["regions"] + ["system"]
+        curves[key] = summary["ldc"][regions.index(region)]
+
+    return pd.DataFrame.from_dict(curves, orient="index", columns=index["ldc_points"])
@@ -0,0 +1,506 @@
+"""
+ Runs load_profile.py over the Cartesian product of base years, intermediate profiles,
+ model years and scaling factors, spreading the work across a process pool
+ Options are described at bottom of script
+"""
+
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from extra_functions import DEFAULT_SCHEMES
+from instrumentation import (
+    add_stage_records,
+    new_run_report,
+    stage,
+    summarize_run_report,
+    write_run_report,
+)
+from load_profile import (
+    generate_16_region_load_profiles,
+    read_county_population_data,
+    read_ercot_load_profile,
+    write_outputs,
+)
+from manifest import (
+    read_manifest,
+    scenario_records,
+    stale_model_years,
+    update_manifest,
+    write_manifest,
+)
+from output_store import scheme_output_dir, write_store_index
+from summary import write_summary_index
+from targets import read_targets
+
+# data shared by every task in a worker process (county_populations, ev_loads, ...), filled by
+# init_worker. Other process pool runners (see chunked.py) keep their own per-process data here
+worker_data = {}
+
+
+def init_worker(data_dir, ev_file, cache_dir):
+    """Loads population and EV data once per worker process, as the initializer of a
+    process pool whose tasks use worker_data and read_worker_profile"""
+    worker_data["county_populations"] = read_county_population_data(
+        data_dir / "county_population_data.csv"
+    )
+    worker_data["ev_loads"] = pd.read_csv(data_dir / ev_file)
+    worker_data["cache_dir"] = cache_dir
+    worker_data["profiles"] = {}
+
+
+def read_worker_profile(path):
+    """Returns parsed load profile, reading each file at most once per worker process"""
+    profiles = worker_data["profiles"]
+    if path not in profiles:
+        profiles[path] = read_ercot_load_profile(
+            path, cache_dir=worker_data["cache_dir"]
+        )
+
+    return profiles[path]
+
+
+def sweep_tasks(
+    load_files, model_years, intermediate_profiles=None, scaling_factors=(1.018,)
+):
+    """Returns one task per (base year, intermediate profile, scaling factor) combination.
+    Model years are kept together in each task since they are computed in one batch.
+    Intermediate profiles are dropped from tasks where base year >= intermediate year,
+    as those outputs are the same as the unscaled ones (and duplicates are removed)
+
+    Args:
+        load_files (dict): keys are base years, values are paths to load files
+        model_years (list): list of years the model needs load data for
+        intermediate_profiles (dict): keys are intermediate years, values are paths to load files,
+                                      a key of None includes runs without intermediate scaling
+                                      if None, no intermediate scaling is done
+        scaling_factors (list): factors to scale load by each year
+
+    Returns:
+        list: of dicts describing each task
+    """
+    if intermediate_profiles is None:
+        intermediate_profiles = {None: None}
+
+    combinations = itertools.product(
+        load_files.items(), intermediate_profiles.items(), scaling_factors
+    )
+
+    tasks = []
+    for (base_year, load_file), (intermediate_year, intermediate_file), scaling_factor in (
+        combinations
+    ):
+        if intermediate_year and int(base_year) >= int(intermediate_year):
+            intermediate_year, intermediate_file = None, None
+
+        task = {
+            "base_year": base_year,
+            "load_file": load_file,
+            "intermediate_year": intermediate_year,
+            "intermediate_file": intermediate_file,
+            "scaling_factor": scaling_factor,
+            "model_years": list(model_years),
+        }
+        if task not in tasks:
+            tasks.append(task)
+
+    return tasks
+
+
+def _run_task(
+    task,
+    output_dir,
+    output_format,
+    instrument=False,
+    trace_memory=False,
+    dtype="float64",
+    memory_budget=None,
+    schemes=None,
+    population_weighting="base_year",
+    ev_weights=None,
+    ev_region_column="model_region",
+    targets=None,
+):
+    """Generates and writes all model years of a single task, returns timing
+    (and the task's stage records, see instrumentation.py, if instrument, with the peak
+    memory allocated during each stage if trace_memory)"""
+    report = new_run_report(trace_memory=trace_memory) if instrument else None
+    info = {
+        "base_year": task["base_year"],
+        "intermediate_year": task["intermediate_year"],
+        "scaling_factor": task["scaling_factor"],
+    }
+    start = time.perf_counter()
+
+    with stage(report, "read_load_profile", **info) as record:
+        base_profile = read_worker_profile(task["load_file"])
+        intermediate_load = None
+        if task["intermediate_file"] is not None:
+            intermediate_load = read_worker_profile(task["intermediate_file"])
+        record["rows"] = len(base_profile)
+    read_time = time.perf_counter()
+
+    write_seconds = 0.0
+
+    def flush(files_by_scheme):
+        nonlocal write_seconds
+        write_start = time.perf_counter()
+        for scheme, files in files_by_scheme.items():
+            scheme_dir = scheme_output_dir(output_dir, scheme)
+            with stage(report, "write_outputs", scheme=scheme, **info) as record:
+                # indexes are rebuilt once all tasks are done
+                write_outputs(
+                    files, scheme_dir, output_format=output_format, update_index=False
+                )
+                record["rows"] = sum(len(df) for df in files.values())
+                record["bytes"] = sum(df.memory_usage().sum() for df in files.values())
+        write_seconds += time.perf_counter() - write_start
+
+    # profiles are written as each batch of model years is generated
+    generate_16_region_load_profiles(
+        base_profile,
+        base_year=task["base_year"],
+        output_dir=output_dir,
+        model_years=task["model_years"],
+        county_population_data=worker_data["county_populations"],
+        ev_loads=worker_data["ev_loads"],
+        scaling_factor=task["scaling_factor"],
+        intermediate_load=intermediate_load,
+        intermediate_year=task["intermediate_year"],
+        report=report,
+        dtype=dtype,
+        memory_budget=memory_budget,
+        flush=flush,
+        schemes=schemes,
+        population_weighting=population_weighting,
+        ev_weights=ev_weights,
+        ev_region_column=ev_region_column,
+        targets=targets,
+    )
+    end_time = time.perf_counter()
+
+    timing = info | {
+        "model_years": len(task["model_years"]),
+        "read_seconds": read_time - start,
+        "compute_seconds": end_time - read_time - write_seconds,
+        "write_seconds": write_seconds,
+        "seconds": end_time - start,
+        "pid": os.getpid(),
+    }
+    if instrument:
+        # generation stages are labeled with the scaling factor too
+        timing["stages"] = [
+            {"scaling_factor": task["scaling_factor"]} | record
+            for record in report["stages"]
+        ]
+
+    return timing
+
+
+def _drop_up_to_date(
+    tasks,
+    data_dir,
+    ev_file,
+    cache_dir,
+    output_format,
+    dtype,
+    schemes,
+    population_weighting,
+    ev_weights,
+    ev_region_column,
+    targets,
+):
+    """Removes model years whose outputs are up to date (see manifest.py) from tasks,
+    and tasks with no model years left
+
+    Returns:
+        tuple: list of remaining tasks (with manifest records) and dict of output directory to manifest
+    """
+    county_populations = read_county_population_data(
+        data_dir / "county_population_data.csv"
+    )
+    ev_loads = pd.read_csv(data_dir / ev_file)
+
+    manifests = {}
+    intermediate_loads = {}
+    stale_tasks = []
+    for task in tasks:
+        task_output_dir = task["output_dir"]
+        if task_output_dir not in manifests:
+            manifests[task_output_dir] = read_manifest(task_output_dir)
+
+        intermediate_file = task["intermediate_file"]
+        if intermediate_file is not None and intermediate_file not in intermediate_loads:
+            intermediate_loads[intermediate_file] = read_ercot_load_profile(
+                intermediate_file, cache_dir=cache_dir
+            )
+
+        task["records"] = scenario_records(
+            task_output_dir,
+            load_file=task["load_file"],
+            base_year=task["base_year"],
+            model_years=task["model_years"],
+            county_population_data=county_populations,
+            ev_loads=ev_loads,
+            scaling_factor=task["scaling_factor"],
+            intermediate_year=task["intermediate_year"],
+            intermediate_load=intermediate_loads.get(intermediate_file),
+            dtype=dtype,
+            schemes=schemes,
+            population_weighting=population_weighting,
+            ev_weights=ev_weights,
+            ev_region_column=ev_region_column,
+            targets=targets,
+        )
+        task["model_years"] = stale_model_years(
+            manifests[task_output_dir],
+            task_output_dir,
+            task["records"],
+            output_format=output_format,
+        )
+        if task["model_years"]:
+            stale_tasks.append(task)
+
+    return stale_tasks, manifests
+
+
+def run_sweep(
+    output_dir,
+    data_dir,
+    load_files,
+    model_years,
+    intermediate_profiles=None,
+    scaling_factors=(1.018,),
+    ev_file="ev_extra_loads.csv",
+    cache_dir=None,
+    output_format="csv",
+    incremental=False,
+    max_workers=None,
+    print_timing=True,
+    report=None,
+    dtype="float64",
+    memory_budget=None,
+    schemes=None,
+    population_weighting="base_year",
+    ev_weights=None,
+    ev_region_column="model_region",
+    targets=None,
+):
+    """Runs every task from sweep_tasks on a process pool. When more than one scaling factor
+    is given, outputs of each are written to output_dir / f"scaling_{scaling_factor}"
+
+    Args:
+        output_dir (pathlib.Path): directory for output files
+        data_dir (pathlib.Path): directory containing county_population_data.csv and ev_file
+        load_files (dict): keys are base years, values are paths to load files
+        model_years (list): list of years the model needs load data for
+        intermediate_profiles (dict): see sweep_tasks
+        scaling_factors (list): factors to scale load by each year
+        ev_file (str): name of EV load file in data_dir
+        cache_dir (pathlib.Path): directory for parsed input files, see read_ercot_load_profile
+        output_format (str): "csv" or "store", see write_outputs
+        incremental (bool): only rebuild outputs whose inputs changed, see manifest.py.
+                            The manifest is updated as each task finishes, so interrupted sweeps resume
+        max_workers (int): number of worker processes, defaults to number of CPUs
+        print_timing (bool): print timing of each task as it finishes
+        report (dict): optional run report (see instrumentation.py), gets the stage records
+                       of every task as it finishes, followed by a "sweep_task" record of the task
+        dtype (str): "float64" or "float32", see generate_16_region_load_profiles
+        memory_budget (int): bytes of load profiles held at once by each worker,
+                             see generate_16_region_load_profiles
+        schemes (dict): county -> region aggregation schemes, see extra_functions.aggregation_regions,
+                        each written to its own folder (see output_store.scheme_output_dir)
+        population_weighting (str): "base_year" or "model_year", see generate_16_region_load_profiles
+        ev_weights (str): column EV load is split by, see generate_16_region_load_profiles
+        ev_region_column (str): column of EV regions, see generate_16_region_load_profiles
+        targets (pandas.DataFrame): energy and peak targets, see generate_16_region_load_profiles
+
+    Returns:
+        pandas.DataFrame: timing of each task
+    """
+    if schemes is None:
+        schemes = DEFAULT_SCHEMES
+
+    tasks = sweep_tasks(load_files, model_years, intermediate_profiles, scaling_factors)
+
+    task_output_dirs = set()
+    for task in tasks:
+        task["output_dir"] = output_dir
+        if len(scaling_factors) > 1:
+            task["output_dir"] = output_dir / f"scaling_{task['scaling_factor']}"
+        task_output_dirs.add(task["output_dir"])
+
+    if incremental:
+        n_tasks = len(tasks)
+        tasks, manifests = _drop_up_to_date(
+            tasks,
+            data_dir,
+            ev_file,
+            cache_dir,
+            output_format,
+            dtype,
+            schemes,
+            population_weighting,
+            ev_weights,
+            ev_region_column,
+            targets,
+        )
+        if print_timing:
+            print(f"{n_tasks - len(tasks)} of {n_tasks} tasks are up to date")
+
+    timings = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=init_worker,
+        initargs=(data_dir, ev_file, cache_dir),
+    ) as pool:
+        futures = {
+            pool.submit(
+                _run_task,
+                task,
+                task["output_dir"],
+                output_format,
+                instrument=report is not None,
+                trace_memory=report is not None and report["trace_memory"],
+                dtype=dtype,
+                memory_budget=memory_budget,
+                schemes=schemes,
+                population_weighting=population_weighting,
+                ev_weights=ev_weights,
+                ev_region_column=ev_region_column,
+                targets=targets,
+            ): task
+            for task in tasks
+        }
+
+        for future in as_completed(futures):
+            timing = future.result()
+            if report is not None:
+                add_stage_records(report, timing.pop("stages"))
+                add_stage_records(
+                    report,
+                    [
+                        {"stage": "sweep_task"}
+                        | timing
+                        | {"wall_seconds": timing["seconds"]}
+                    ],
+                )
+            timings.append(timing)
+            if print_timing:
+                print(
+                    f"base {timing['base_year']}, intermediate {timing['intermediate_year']}, "
+                    f"scaling {timing['scaling_factor']}: {timing['seconds']:.2f} s "
+                    f"(read {timing['read_seconds']:.2f}, compute {timing['compute_seconds']:.2f}, "
+                    f"write {timing['write_seconds']:.2f})"
+                )
+
+            if incremental:
+                task = futures[future]
+                manifest = manifests[task["output_dir"]]
+                update_manifest(
+                    manifest,
+                    task["records"],
+                    task["model_years"],
+                    output_format=output_format,
+                )
+                write_manifest(task["output_dir"], manifest)
+
+    for task_output_dir in task_output_dirs:
+        for scheme in schemes:
+            scheme_dir = scheme_output_dir(task_output_dir, scheme)
+            if tasks:
+                write_summary_index(scheme_dir)
+            if output_format == "store":
+                write_store_index(scheme_dir / "store")
+
+    if print_timing:
+        print(f"{len(tasks)} tasks in {time.perf_counter() - start:.2f} s")
+
+    return pd.DataFrame(timings)
+
+
+if __name__ == "__main__":
+    ###### OPTIONS ######
+
+    input_dir = Path("inputs")  # location of input files
+    output_dir = Path("outputs")  # location of output files
+    data_dir = Path(
+        "data"
+    )  # location of data, looks for "county_population_data.csv" and ev_file
+    cache_dir = input_dir / ".cache"  # location of parsed input files (None to disable)
+    output_format = "csv"  # "csv" files or binary "store" (see output_store.py)
+    incremental = True  # only rebuild outputs whose inputs changed (see manifest.py)
+    report_file = None  # per-stage timing and memory report, .csv or .json (None to disable)
+    trace_memory = False  # also record peak memory allocated by each stage (slower, see README)
+    dtype = "float64"  # "float64" or "float32" (half the memory and shorter CSV values)
+    memory_budget = None  # bytes of load profiles held in memory at once per worker (None for no limit)
+
+    # county -> region aggregation schemes, all computed in one pass (see README)
+    schemes = {"model_region": {"column": "model_region"}}
+    population_weighting = "base_year"  # split load with "base_year" or "model_year" population (see README)
+    ev_weights = None  # county_population_data column EV load is split by (None for population, see README)
+    ev_region_column = "model_region"  # county_population_data column of EV regions, for per region EV loads
+    targets_file = None  # per region energy and peak targets by model year, instead of scaling (see README)
+
+    # base years (weather years) to sweep over
+    load_files = {
+        str(year): input_dir / f"{year}_ercot_hourly_load_data.xls"
+        for year in range(2002, 2015)
+    }
+    load_files.update({"2015": input_dir / "native_load_2015.xls"})
+    load_files.update(
+        {
+            str(year): input_dir / f"native_Load_{year}.xlsx"
+            for year in range(2016, 2018)
+        }
+    )
+    load_files.update(
+        {
+            str(year): input_dir / f"Native_Load_{year}.xlsx"
+            for year in range(2018, 2021)
+        }
+    )
+    load_files.update({"2021": input_dir / "Native_Load_2021_NOShed.xlsx"})
+
+    # intermediate profiles to sweep over (None for no intermediate scaling)
+    intermediate_profiles = {
+        None: None,
+        2021: input_dir / "Native_Load_2021_NOShed.xlsx",
+    }
+
+    # select model years (final load year)
+    model_years = [2030, 2035]  # list
+
+    # annual load growth factors
+    scaling_factors = [1.018]
+
+    ###### END OPTIONS ######
+    report = new_run_report(trace_memory=trace_memory) if report_file else None
+    timings = run_sweep(
+        output_dir=output_dir,
+        data_dir=data_dir,
+        load_files=load_files,
+        model_years=model_years,
+        intermediate_profiles=intermediate_profiles,
+        scaling_factors=scaling_factors,
+        cache_dir=cache_dir,
+        output_format=output_format,
+        incremental=incremental,
+        report=report,
+        dtype=dtype,
+        memory_budget=memory_budget,
+        schemes=schemes,
+        population_weighting=population_weighting,
+        ev_weights=ev_weights,
+        ev_region_column=ev_region_column,
+        targets=read_targets(targets_file) if targets_file else None,
+    )
+
+    if report_file:
+        write_run_report(report, report_file)
+        print(summarize_run_report(report))
@@ -0,0 +1,232 @@
+"""
+ Per-region annual energy and peak targets (e.g. from ERCOT LTLF-style forecast tables),
+ as an alternative to growing every region by the same scaling_factor.
+
+ Each region's profile in each model year is mapped to alpha * load + beta, with alpha and
+ beta solved in closed form so that its annual energy and peak match the targets. The
+ transform keeps the shape of the profile (the order of its hours, and the hour of its peak),
+ and is applied to every region and model year at once with a single broadcast.
+ Only the targeted regions are transformed: other regions, including the regions of other
+ schemes covering the same counties, keep their scaling_factor growth, so once a region is
+ targeted the schemes of a run no longer add up to the same total.
+ target_report compares the energy and peak of written outputs (from their summary index)
+ with the targets.
+"""
+
+import numpy as np
+import pandas as pd
+
+from summary import read_summary
+
+TARGET_COLUMNS = ["region", "year", "energy", "peak"]
+
+
+def read_targets(path):
+    """Returns targets table from a CSV file
+
+    Args:
+        path (pathlib.Path): CSV file with columns region, year, energy (MWh) and/or peak (MW),
+                             and optionally scheme (for regions of other schemes than "model_region",
+                             empty for "model_region"). A missing energy or peak leaves that target free
+
+    Returns:
+        pandas.DataFrame: columns scheme, region, year, energy and peak
+    """
+    targets = pd.read_csv(path)
+
+    missing = {"region", "year"} - set(targets.columns)
+    if missing or not {"energy", "peak"} & set(targets.columns):
+        raise ValueError(
+            f"targets need region, year and energy and/or peak columns, got {list(targets.columns)}"
+        )
+
+    for column in ("energy", "peak"):
+        if column not in targets:
+            targets[column] = np.nan
+    if "scheme" not in targets:
+        targets.insert(0, "scheme", "model_region")
+    targets["scheme"] = targets["scheme"].fillna("model_region")
+
+    return targets[["scheme"] + TARGET_COLUMNS]
+
+
+def target_arrays(targets, names_by_scheme, model_years):
+    """Returns energy and peak targets of every region of every scheme for each model year
+
+    Args:
+        targets (pandas.DataFrame): see read_targets
+        names_by_scheme (dict): scheme name to list of region names, as returned by
+                                load_profile.generate_16_region_load_array
+        model_years (list): list of years the model needs load data for
+
+    Returns:
+        tuple: energy and peak targets, numpy.ndarray with shape (model year, region),
+               NaN where a region has no target
+    """
+    columns = pd.MultiIndex.from_tuples(
+        [(scheme, name) for scheme, names in names_by_scheme.items() for name in names]
+    )
+    # targets of schemes not being generated are ignored
+    targets = targets[targets["scheme"].isin(list(names_by_scheme))]
+    targets = targets.set_index(["year", "scheme", "region"])
+    if targets.index.duplicated().any():
+        raise ValueError(
+            f"duplicate targets: {list(targets.index[targets.index.duplicated()])}"
+        )
+
+    unknown = targets.droplevel("year").index.difference(columns)
+    if len(unknown):
+        raise ValueError(f"targets of unknown regions: {list(unknown)}")
+
+    arrays = []
+    for column in ("energy", "peak"):
+        # (model year, region)
+        table = targets[column].unstack(["scheme", "region"])
+        table.index = table.index.astype(int)
+        arrays.append(
+            table.reindex(index=list(model_years), columns=columns).to_numpy(dtype=float)
+        )
+
+    return tuple(arrays)
+
+
+def target_coefficients(energy, peak, n_hours, target_energy, target_peak):
+    """Returns alpha and beta such that alpha * load + beta has the target energy and peak.
+    With only an energy or only a peak target, load is scaled (beta is 0), without either it is unchanged
+
+    Args:
+        energy (numpy.ndarray): annual energy of each profile, any shape
+        peak (numpy.ndarray): peak of each profile, same shape
+        n_hours (int): hours of each profile
+        target_energy (numpy.ndarray): energy targets, NaN where free, same shape
+        target_peak (numpy.ndarray): peak targets, NaN where free, same shape
+
+    Returns:
+        tuple: alpha and beta, numpy.ndarray of the same shape
+    """
+    has_energy = ~np.isnan(target_energy)
+    has_peak = ~np.isnan(target_peak)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # energy: alpha * energy + n_hours * beta, peak: alpha * peak + beta
+        both = (n_hours * target_peak - target_energy) / (n_hours * peak - energy)
+        alpha = np.where(
+            has_energy & has_peak,
+            both,
+            np.where(
+                has_energy,
+                target_energy / energy,
+                np.where(has_peak, target_peak / peak, 1.0),
+            ),
+        )
+    beta = np.where(has_energy & has_peak, target_peak - alpha * peak, 0.0)
+
+    # a load factor of 1 or more can't be reached without flattening (or inverting) the profile
+    infeasible = ~(np.isfinite(alpha) & (alpha > 0))
+    if infeasible.any():
+        raise ValueError(
+            f"{infeasible.sum()} targets can't be met by a shape preserving transform "
+            "(target load factor must be below 1 and profiles must not be flat)"
+        )
+
+    return alpha, beta
+
+
+def apply_targets(loads, targets, names_by_scheme, model_years):
+    """Transforms loads in place to match targets (see target_coefficients). Only targeted
+    regions are transformed, the others (e.g. of other schemes) are left as they are.
+    Raises ValueError, before changing loads, if a transform would make any load negative
+
+    Args:
+        loads (numpy.ndarray): shape (model year, hour, region), as returned by
+                               load_profile.generate_16_region_load_array
+        targets (pandas.DataFrame): see read_targets
+        names_by_scheme (dict): scheme name to list of region names
+        model_years (list): model years of loads
+
+    Returns:
+        pandas.DataFrame: one row per model year and region with a target, columns are year, scheme,
+                          region, energy and peak targets, alpha, beta and minimum load after the transform
+    """
+    target_energy, target_peak = target_arrays(targets, names_by_scheme, model_years)
+
+    # (model year, region), totals in float64 whatever the dtype of loads
+    energy = loads.sum(axis=1, dtype=np.float64)
+    peak = loads.max(axis=1).astype(np.float64)
+    minimum = loads.min(axis=1).astype(np.float64)
+    alpha, beta = target_coefficients(
+        energy, peak, loads.shape[1], target_energy, target_peak
+    )
+
+    regions = [(scheme, name) for scheme, names in names_by_scheme.items() for name in names]
+    # a large negative beta (a target load factor well above the profile's) makes the lowest loads negative
+    min_load = alpha * minimum + beta
+    negative_years, negative_columns = np.nonzero(min_load < 0)
+    if len(negative_years):
+        raise ValueError(
+            "targets would make loads negative: "
+            + ", ".join(
+                f"{regions[column][0]} {regions[column][1]} {model_years[year]} "
+                f"(min load {min_load[year, column]:.1f})"
+                for year, column in zip(negative_years, negative_columns)
+            )
+        )
+
+    loads *= alpha.astype(loads.dtype)[:, None, :]
+    loads += beta.astype(loads.dtype)[:, None, :]
+
+    years, columns = np.nonzero(~np.isnan(target_energy) | ~np.isnan(target_peak))
+    return pd.DataFrame(
+        {
+            "year": np.asarray(model_years)[years],
+            "scheme": [regions[column][0] for column in columns],
+            "region": [regions[column][1] for column in columns],
+            "energy_target": target_energy[years, columns],
+            "peak_target": target_peak[years, columns],
+            "alpha": alpha[years, columns],
+            "beta": beta[years, columns],
+            "min_load": min_load[years, columns],
+        }
+    )
+
+
+def target_report(output_dir, targets, scheme="model_region"):
+    """Returns how well the outputs of a scheme met their targets, from the summary index
+    (see summary.py), so no time series are read
+
+    Args:
+        output_dir (pathlib.Path): directory of an aggregation scheme's outputs
+        targets (pandas.DataFrame): see read_targets
+        scheme (str): scheme of the outputs in output_dir
+
+    Returns:
+        pandas.DataFrame: one row per scenario and region with a target, columns are scenario,
+                          base_year, intermediate_year, model_year, region, energy and peak targets,
+                          energy and peak of the output and their relative errors
+    """
+    summary = read_summary(output_dir)
+    targets = targets[targets["scheme"] == scheme].rename(
+        columns={"year": "model_year", "energy": "energy_target", "peak": "peak_target"}
+    )
+
+    report = summary.merge(
+        targets.drop(columns="scheme"), on=["model_year", "region"], how="inner"
+    )
+    report["energy_error"] = report["energy"] / report["energy_target"] - 1
+    report["peak_error"] = report["peak"] / report["peak_target"] - 1
+
+    return report[
+        [
+            "scenario",
+            "base_year",
+            "intermediate_year",
+            "model_year",
+            "region",
+            "energy_target",
+            "energy",
+            "energy_error",
+            "peak_target",
+            "peak",
+            "peak_error",
+        ]
+    ]
@@ -0,0 +1,109 @@
+"""
+ Shared fixtures. The modules of this repository are scripts at its top level, so the
+ repository is put on sys.path; inputs are the checked-in data and ERCOT load files.
+"""
+
+import filecmp
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_DIR))
+
+from load_profile import (  # noqa: E402
+    read_county_population_data,
+    read_ercot_load_profile,
+)
+
+INPUT_DIR = REPO_DIR / "inputs"
+DATA_DIR = REPO_DIR / "data"
+
+
+@pytest.fixture(scope="session")
+def data_dir():
+    return DATA_DIR
+
+
+@pytest.fixture(scope="session")
+def model_years():
+    return [2030, 2035]
+
+
+@pytest.fixture(scope="session")
+def cache_dir(tmp_path_factory):
+    """Parsed load files, shared by every test"""
+    return tmp_path_factory.mktemp("cache")
+
+
+@pytest.fixture(scope="session")
+def load_files():
+    """A year in the old (millisecond) format, a leap year, and a year in the new format"""
+    return {
+        "2002": INPUT_DIR / "2002_ercot_hourly_load_data.xls",
+        "2004": INPUT_DIR / "2004_ercot_hourly_load_data.xls",
+        "2018": INPUT_DIR / "Native_Load_2018.xlsx",
+    }
+
+
+@pytest.fixture(scope="session")
+def base_profiles(load_files, cache_dir):
+    return {
+        year: read_ercot_load_profile(path, cache_dir=cache_dir)
+        for year, path in load_files.items()
+    }
+
+
+@pytest.fixture(scope="session")
+def county_populations():
+    return read_county_population_data(DATA_DIR / "county_population_data.csv")
+
+
+@pytest.fixture(scope="session")
+def ev_loads():
+    return pd.read_csv(DATA_DIR / "ev_extra_loads.csv")
+
+
+@pytest.fixture(scope="session")
+def region_ev_loads(county_populations, ev_loads):
+    """24 hour EV loads per model region, with a different share of the total for each region"""
+    regions = sorted(set(county_populations["model_region"]))
+    shares = np.arange(1, len(regions) + 1) / sum(range(1, len(regions) + 1))
+    year_columns = [column for column in ev_loads.columns if column.isdigit()]
+
+    frames = []
+    for region, share in zip(regions, shares):
+        frame = ev_loads[year_columns] * share
+        frame.insert(0, "region", region)
+        frames.append(frame)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.fixture
+def assert_same_outputs():
+    """Returns a check that two output trees hold the same files, byte for byte
+    (manifests aside, as they record when and how outputs were built)"""
+
+    def check(expected_dir, actual_dir):
+        def files(directory):
+            return sorted(
+                path.relative_to(directory)
+                for path in Path(directory).rglob("*")
+                if path.is_file() and path.name != "manifest.json"
+            )
+
+        expected, actual = files(expected_dir), files(actual_dir)
+        assert expected == actual
+        assert expected
+        different = [
+            file
+            for file in expected
+            if not filecmp.cmp(expected_dir / file, actual_dir / file, shallow=False)
+        ]
+        assert not different
+
+    return check
@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark import (
+    CDR_ZONES,
+    benchmark_size,
+    compare_benchmarks,
+    synthetic_county_population_data,
+    synthetic_ev_loads,
+    synthetic_load_profile,
+)
+from extra_functions import ercot_timestamps
+
+
+@pytest.mark.parametrize("n_hours", [8760, 35040])
+def test_synthetic_profile_labels_parse_like_ercot(n_hours):
+    profile = synthetic_load_profile(n_hours)
+    timestamps = ercot_timestamps(profile["Hour Ending"])
+
+    assert list(profile.columns) == ["Hour Ending"] + CDR_ZONES
+    assert len(profile) == n_hours
+    assert timestamps[0] == pd.Timestamp("2019-01-01 00:00", tz="America/Chicago")
+    assert (profile[CDR_ZONES] > 0).all().all()
+
+
+def test_synthetic_populations_cover_every_zone_and_region():
+    df = synthetic_county_population_data(n_counties=40, n_regions=16)
+
+    assert len(df) == 40
+    assert set(df["cdr_zone"]) == set(CDR_ZONES)
+    assert df["model_region"].nunique() == 16
+    # each year's population grows from the last
+    assert (df["2021"] > df["1997"]).mean() > 0.5
+
+
+def test_synthetic_ev_loads_repeat_daily_shape():
+    ev_loads = synthetic_ev_loads(96)
+
+    assert len(ev_loads) == 96
+    np.testing.assert_allclose(ev_loads["2016"] * 2, ev_loads["2017"])
+
+
+def test_compare_benchmarks(tmp_path):
+    def save(name, seconds, peak_bytes):
+        results = [
+            {"n_hours": 8760, "stage": stage, "seconds": s, "peak_bytes": b}
+            for stage, s, b in zip(["split", "write"], seconds, peak_bytes)
+        ]
+        path = tmp_path / name
+        path.write_text(json.dumps({"commit": name, "results": results}))
+        return path
+
+    comparison = compare_benchmarks(
+        save("old.json", [2.0, 1.0], [100, 100]), save("new.json", [1.0, 1.0], [50, 200])
+    )
+
+    assert comparison["stage"].tolist() == ["split", "write"]
+    assert comparison["time_ratio"].tolist() == [0.5, 1.0]
+    assert comparison["memory_ratio"].tolist() == [0.5, 2.0]
+
+
+def test_benchmark_size_times_every_stage():
+    results = benchmark_size(
+        n_hours=8760, n_counties=40, n_model_years=2, n_weather_years=2, repeats=1
+    )
+
+    assert [result["stage"] for result in results] == [
+        "load_by_16_region",
+        "generate_16_region_load_profiles",
+        "write_csv",
+        "write_store",
+        "write_summaries",
+    ]
+    assert all(result["seconds"] > 0 for result in results)
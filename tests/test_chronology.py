@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+from chronology import iter_chronology, write_chronology
+from load_profile import generate_16_region_load_profiles
+
+
+def test_chronology_chains_weather_years(
+    tmp_path, load_files, base_profiles, county_populations, ev_loads, cache_dir
+):
+    chunks = list(
+        iter_chronology(
+            load_files, 2030, county_populations, ev_loads, cache_dir=cache_dir
+        )
+    )
+
+    assert len(chunks) == len(load_files)
+    chronology = pd.concat(chunks)
+    assert list(chronology.index) == list(range(1, 8760 * len(load_files) + 1))
+    for chunk, year in zip(chunks, sorted(load_files)):
+        assert chunk["timestamp"].iloc[0] == pd.Timestamp(f"{year}-01-01 00:00", tz="America/Chicago")
+        expected = generate_16_region_load_profiles(
+            base_profiles[year],
+            year,
+            [2030],
+            county_populations,
+            ev_loads,
+            outputs_to_file=False,
+        )[2030]
+        assert chunk.drop(columns="timestamp").reset_index(drop=True).equals(expected)
+
+    assert write_chronology(tmp_path / "chronology.csv", iter(chunks)) == len(chronology)
+    written = pd.read_csv(tmp_path / "chronology.csv", index_col=0)
+    assert list(written.index) == list(chronology.index)
+    pd.testing.assert_frame_equal(
+        written.drop(columns="timestamp"), chronology.drop(columns="timestamp")
+    )
+
+
+def test_chronology_follows_daylight_saving_time(
+    load_files, county_populations, ev_loads, cache_dir
+):
+    chunks = list(
+        iter_chronology(
+            load_files, 2030, county_populations, ev_loads, cache_dir=cache_dir
+        )
+    )
+    chronology = pd.concat(chunks)
+
+    assert list(chronology.index) == list(range(1, 8760 * len(load_files) + 1))
+    for chunk in chunks:
+        timestamps = pd.DatetimeIndex(chunk["timestamp"])
+        assert str(timestamps.tz) == "America/Chicago"
+        # hourly in absolute time, but for the dropped leap day
+        steps = timestamps.tz_convert("UTC").to_series().diff().dropna().value_counts()
+        assert set(steps.index) <= {pd.Timedelta("1h"), pd.Timedelta("25h")}
+        leap_year = chunk["timestamp"].iloc[0].year == 2004
+        assert steps.get(pd.Timedelta("25h"), 0) == leap_year
+
+
+def test_failed_chronology_leaves_no_files(tmp_path):
+    def chunks():
+        yield pd.DataFrame({"a": [1.0]})
+        raise RuntimeError("failed")
+
+    with pytest.raises(RuntimeError):
+        write_chronology(tmp_path / "chronology.csv", chunks())
+
+    assert list(tmp_path.iterdir()) == []
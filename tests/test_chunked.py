@@ -0,0 +1,108 @@
+import pytest
+
+from chunked import hour_chunks, run_chunked, run_task_graph
+from load_profile import main
+
+
+# a county scheme has hundreds of regions, so it is only written to stores (fast to write)
+SCHEMES = {"model_region": {"column": "model_region"}, "county": {"column": "county"}}
+
+
+@pytest.mark.parametrize(
+    "options, chunk_years, max_workers",
+    [
+        ({"output_format": "csv"}, 1, 1),
+        ({"output_format": "store", "dtype": "float32", "schemes": SCHEMES}, None, 2),
+        ({"output_format": "store", "population_weighting": "model_year"}, 1, 1),
+        ({"output_format": "csv", "population_weighting": "model_year"}, None, 1),
+    ],
+)
+def test_chunked_outputs_equal_main(
+    tmp_path,
+    data_dir,
+    load_files,
+    model_years,
+    cache_dir,
+    assert_same_outputs,
+    options,
+    chunk_years,
+    max_workers,
+):
+    main(
+        tmp_path / "main",
+        data_dir,
+        load_files,
+        model_years,
+        cache_dir=cache_dir,
+        **options,
+    )
+    run_chunked(
+        tmp_path / "chunked",
+        data_dir,
+        load_files,
+        model_years,
+        cache_dir=cache_dir,
+        chunk_hours=2184,
+        chunk_years=chunk_years,
+        max_workers=max_workers,
+        print_timing=False,
+        **options,
+    )
+
+    assert_same_outputs(tmp_path / "main", tmp_path / "chunked")
+    assert not (tmp_path / "chunked" / ".chunks").exists()
+
+
+def test_incremental_chunked_run_skips_built_outputs(
+    tmp_path, data_dir, load_files, model_years, cache_dir
+):
+    def run(**options):
+        return run_chunked(
+            tmp_path,
+            data_dir,
+            load_files,
+            model_years,
+            cache_dir=cache_dir,
+            incremental=True,
+            max_workers=1,
+            print_timing=False,
+            **options,
+        )
+
+    # a prepare task per base year, and compute tasks and a finish task per model year
+    n_tasks = len(load_files) * (1 + (len(hour_chunks(8760)) + 1) * len(model_years))
+    assert run() == n_tasks
+    assert run() == 0
+    assert run(scaling_factor=1.02) == n_tasks
+
+
+def test_hour_chunks_cover_the_year():
+    chunks = hour_chunks(8760, 2184)
+    assert [(chunk.start, chunk.stop) for chunk in chunks] == [
+        (0, 2184),
+        (2184, 4368),
+        (4368, 6552),
+        (6552, 8736),
+        (8736, 8760),
+    ]
+    with pytest.raises(ValueError):
+        hour_chunks(8760, 100)
+
+
+def test_expanded_tasks_run_after_their_parent():
+    order = []
+
+    def expand(result):
+        return {
+            ("child", n): {"function": order.append, "args": (("child", n),), "depends": []}
+            for n in range(result)
+        }
+
+    tasks = {
+        "parent": {"function": lambda: 2, "args": (), "depends": [], "expand": expand},
+        "last": {"function": order.append, "args": ("last",), "depends": ["parent"]},
+    }
+    results = run_task_graph(tasks, max_workers=1)
+
+    assert order == [("child", 0), ("child", 1), "last"]
+    assert set(results) == {"parent", "last", ("child", 0), ("child", 1)}
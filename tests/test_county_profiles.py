@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from county_profiles import county_load_profiles, iter_county_load_profiles
+from load_profile import generate_16_region_load_profiles
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{}, {"population_weighting": "model_year"}, {"ev_weights": "2010"}],
+)
+@pytest.mark.parametrize("per_region_ev", [False, True])
+def test_counties_add_up_to_their_region(
+    base_profiles,
+    county_populations,
+    ev_loads,
+    region_ev_loads,
+    model_years,
+    options,
+    per_region_ev,
+):
+    ev = region_ev_loads if per_region_ev else ev_loads
+    regions = generate_16_region_load_profiles(
+        base_profiles["2004"],
+        "2004",
+        model_years,
+        county_populations,
+        ev,
+        outputs_to_file=False,
+        **options,
+    )
+    counties = county_load_profiles(
+        base_profiles["2004"],
+        "2004",
+        model_years,
+        county_populations,
+        ev,
+        groups=dict(zip(county_populations["county"], county_populations["model_region"])),
+        **options,
+    )
+
+    for model_year in model_years:
+        np.testing.assert_allclose(
+            counties[model_year][regions[model_year].columns].to_numpy(),
+            regions[model_year].to_numpy(),
+            rtol=1e-12,
+            atol=1e-9,
+        )
+
+
+def test_selected_counties_and_hours(
+    base_profiles, county_populations, ev_loads, model_years
+):
+    selected = list(county_populations["county"].iloc[[0, 10, 20]])
+    full = county_load_profiles(
+        base_profiles["2002"], "2002", model_years, county_populations, ev_loads
+    )
+    part = county_load_profiles(
+        base_profiles["2002"],
+        "2002",
+        model_years,
+        county_populations,
+        ev_loads,
+        counties=selected,
+        hours=slice(48, 96),
+    )
+
+    for model_year in model_years:
+        assert list(part[model_year].index) == list(range(48, 96))
+        np.testing.assert_allclose(
+            part[model_year].to_numpy(),
+            full[model_year].loc[48:95, selected].to_numpy(),
+            rtol=1e-12,
+        )
+
+    chunks = list(
+        iter_county_load_profiles(
+            base_profiles["2002"],
+            "2002",
+            model_years,
+            county_populations,
+            ev_loads,
+            chunk_size=100,
+        )
+    )
+    assert len(chunks) == -(-len(county_populations) // 100)
+    for model_year in model_years:
+        pd.testing.assert_frame_equal(
+            pd.concat([chunk[model_year] for chunk in chunks], axis=1), full[model_year]
+        )
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ensemble import ensemble_draws, ensemble_summary, run_ensemble
+from load_profile import generate_16_region_load_profiles
+
+
+@pytest.fixture(scope="module")
+def ensemble(tmp_path_factory, load_files, county_populations, ev_loads, cache_dir):
+    draws = ensemble_draws(
+        12, ["2002", "2004"], scaling_factor=[1.01, 1.02], ev_adoption=[0.5, 2.0], seed=1
+    )
+    output_dir = tmp_path_factory.mktemp("ensemble")
+    stats = run_ensemble(
+        load_files,
+        2035,
+        county_populations,
+        ev_loads,
+        draws,
+        cache_dir=cache_dir,
+        batch_size=4,
+        write_members=list(draws.index),
+        output_dir=output_dir,
+    )
+    members = np.stack(
+        [
+            pd.read_csv(output_dir / "members" / f"member_{member}.csv", index_col=0)
+            for member in draws.index
+        ]
+    )
+    return draws, stats, members
+
+
+def test_members_are_scaled_profiles(ensemble, base_profiles, county_populations, ev_loads):
+    draws, stats, members = ensemble
+    draw = draws.loc[0]
+    scaled_ev = ev_loads.copy()
+    scaled_ev["2035"] *= draw["ev_adoption"]
+
+    expected = generate_16_region_load_profiles(
+        base_profiles[draw["weather_year"]],
+        draw["weather_year"],
+        [2035],
+        county_populations,
+        scaled_ev,
+        scaling_factor=draw["scaling_factor"],
+        outputs_to_file=False,
+    )[2035]
+    np.testing.assert_allclose(members[0], expected.to_numpy(), rtol=1e-12)
+    assert list(stats["mean"].columns) == list(expected.columns)
+
+
+def test_statistics_of_members(ensemble):
+    draws, stats, members = ensemble
+
+    np.testing.assert_allclose(stats["mean"], members.mean(axis=0), rtol=1e-10)
+    np.testing.assert_allclose(stats["std"], members.std(axis=0, ddof=1), atol=1e-6)
+    np.testing.assert_allclose(stats["peak"], members.max(axis=1), rtol=1e-12)
+    np.testing.assert_allclose(stats["energy"], members.sum(axis=1), rtol=1e-12)
+
+    # histogram percentiles fall near the member at their rank (the histogram spans every
+    # combination of the draws, so its bins are wider than the members' range / n_bins)
+    width = (members.max(axis=0) - members.min(axis=0)) / 128
+    ordered = np.sort(members, axis=0)
+    for percentile in (5, 50, 95):
+        rank = int(np.ceil(percentile / 100 * len(members)))
+        difference = np.abs(stats["percentiles"][percentile] - ordered[rank - 1])
+        assert (difference <= 4 * width + 1e-6).all().all()
+
+
+def test_system_peak_is_coincident(ensemble):
+    draws, stats, members = ensemble
+
+    np.testing.assert_allclose(stats["system_peak"], members.sum(axis=2).max(axis=1))
+    assert (stats["system_peak"] <= stats["peak"].sum(axis=1)).all()
+
+    summary_members, peak, energy = ensemble_summary(stats, draws, percentiles=(0, 100))
+    assert peak.loc[100, "system"] == pytest.approx(stats["system_peak"].max())
+    assert energy.loc[0, "system"] == pytest.approx(summary_members["energy"].min())
+
+
+def test_same_seed_same_draws():
+    assert ensemble_draws(10, ["2002", "2004"], seed=3).equals(
+        ensemble_draws(10, ["2002", "2004"], seed=3)
+    )
+    assert not ensemble_draws(10, ["2002", "2004"], seed=3).equals(
+        ensemble_draws(10, ["2002", "2004"], seed=4)
+    )
+
+
+def test_members_need_output_dir(load_files, county_populations, ev_loads):
+    draws = ensemble_draws(4, ["2002"])
+    with pytest.raises(ValueError):
+        run_ensemble(
+            load_files, 2035, county_populations, ev_loads, draws, write_members=[0]
+        )
@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+
+from extra_functions import (
+    aggregation_regions,
+    cached,
+    drop_leap_days,
+    drop_repeated_dst_hours,
+    ercot_timestamps,
+    new_lru_cache,
+    profile_timestamps,
+)
+
+
+@pytest.mark.parametrize("year", ["2002", "2004", "2018"])
+def test_timestamps_are_consecutive_hours(base_profiles, year):
+    timestamps = ercot_timestamps(base_profiles[year]["Hour Ending"])
+
+    assert str(timestamps.tz) == "America/Chicago"
+    assert timestamps[0] == pd.Timestamp(f"{year}-01-01 00:00", tz="America/Chicago")
+    # one hour apart in absolute time, through both daylight saving time changes
+    steps = timestamps.tz_convert("UTC").to_series().diff().dropna()
+    assert (steps == pd.Timedelta("1h")).all()
+
+
+def test_new_format_repeated_fall_back_hour():
+    labels = pd.Series(
+        [
+            "11/04/2018 01:00",
+            "11/04/2018 02:00",
+            "11/04/2018 02:00 DST",
+            "11/04/2018 03:00",
+        ]
+    )
+    timestamps = ercot_timestamps(labels).tz_convert("UTC")
+
+    assert timestamps.is_unique and timestamps.is_monotonic_increasing
+
+    profile = pd.DataFrame({"Hour Ending": labels, "COAST": [1.0, 2.0, 3.0, 4.0]})
+    assert drop_repeated_dst_hours(profile)["COAST"].tolist() == [1.0, 2.0, 4.0]
+
+
+def test_drop_leap_days_by_date(base_profiles):
+    profile = drop_leap_days(base_profiles["2004"])
+    timestamps = ercot_timestamps(profile["Hour Ending"])
+
+    assert len(base_profiles["2004"]) == 8784
+    assert len(profile) == 8760
+    assert not ((timestamps.month == 2) & (timestamps.day == 29)).any()
+    assert drop_leap_days(base_profiles["2002"]).equals(base_profiles["2002"])
+
+
+def test_aggregation_regions_of_mappings(county_populations):
+    mapping = dict.fromkeys(county_populations["county"], "b")
+    mapping[county_populations["county"].iloc[0]] = "a"
+    regions, orders = aggregation_regions(
+        county_populations, {"two": {"mapping": mapping, "order": ["b", "a"]}}
+    )
+
+    assert orders == {"two": ["b", "a"]}
+    assert (regions["two"] == "a").sum() == 1
+
+    del mapping[county_populations["county"].iloc[0]]
+    with pytest.raises(ValueError):
+        aggregation_regions(county_populations, {"two": {"mapping": mapping}})
+
+
+def test_timestamps_are_parsed_once_per_profile(base_profiles):
+    first = profile_timestamps(base_profiles["2018"])
+    assert profile_timestamps(base_profiles["2018"].copy()) is first
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = new_lru_cache(2)
+    loads = []
+
+    def load(key):
+        loads.append(key)
+        return key * 10
+
+    for key in (1, 2, 1, 3, 2, 1):
+        assert cached(cache, key, lambda: load(key)) == key * 10
+
+    # 2 was evicted by 3 (1 had been used since), then 1 by 2 and 3 by 1
+    assert loads == [1, 2, 3, 2, 1]
+    assert list(cache["entries"]) == [2, 1]
@@ -0,0 +1,95 @@
+import json
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import (
+    new_run_report,
+    stage,
+    summarize_run_report,
+    write_run_report,
+)
+from load_profile import main
+
+
+def test_stages_are_recorded_and_passed_to_callbacks():
+    seen = []
+    report = new_run_report(callbacks=[seen.append])
+
+    for _ in range(2):
+        with stage(report, "split", base_year="2002") as record:
+            record["rows"] = 10
+    with stage(report, "write") as record:
+        record["bytes"] = 100
+
+    assert [record["stage"] for record in report["stages"]] == ["split", "split", "write"]
+    assert seen == report["stages"]
+    assert all(record["wall_seconds"] >= 0 for record in seen)
+    assert seen[0]["base_year"] == "2002"
+
+    summary = summarize_run_report(report)
+    assert list(summary.index) == ["split", "write"]
+    assert summary.loc["split", "count"] == 2
+    assert summary.loc["split", "rows"] == 20
+    assert summary.loc["write", "bytes"] == 100
+    assert summary["wall_percent"].sum() == 100
+
+
+def test_memory_is_measured_per_stage():
+    report = new_run_report(trace_memory=True)
+    try:
+        with stage(report, "outer"):
+            with stage(report, "large"):
+                large = np.ones(2_000_000)
+                del large
+            with stage(report, "small"):
+                small = np.ones(1000)
+    finally:
+        tracemalloc.stop()
+
+    records = {record["stage"]: record for record in report["stages"]}
+    # 16 MB allocated by "large" (and so by "outer"), but not by "small", which starts later
+    assert records["large"]["peak_traced_bytes"] >= 16_000_000
+    assert records["small"]["peak_traced_bytes"] < 1_000_000
+    assert records["outer"]["peak_traced_bytes"] >= records["large"]["peak_traced_bytes"]
+    assert all(
+        record["process_peak_rss_bytes"] >= records["large"]["process_peak_rss_bytes"]
+        for record in (records["small"], records["outer"])
+    )
+    assert len(small) == 1000
+
+    summary = summarize_run_report(report)
+    assert summary.loc["large", "peak_traced_bytes"] == records["large"]["peak_traced_bytes"]
+
+
+def test_no_report_records_nothing():
+    with stage(None, "split") as record:
+        record["rows"] = 10
+
+    assert record == {"stage": "split", "rows": 10}
+
+
+def test_run_report_of_main(tmp_path, data_dir, load_files, model_years, cache_dir):
+    report = new_run_report()
+    main(
+        tmp_path / "outputs",
+        data_dir,
+        {"2002": load_files["2002"]},
+        model_years,
+        cache_dir=cache_dir,
+        report=report,
+    )
+
+    stages = [record["stage"] for record in report["stages"]]
+    assert stages[:3] == ["read_population_data", "read_ev_loads", "read_load_profile"]
+    assert stages[-1] == "write_outputs"
+    assert report["stages"][-1]["rows"] == 8760 * len(model_years)
+    assert "rss_delta_bytes" in report["stages"][-1]
+    assert "peak_traced_bytes" not in report["stages"][-1]
+
+    write_run_report(report, tmp_path / "report.json")
+    write_run_report(report, tmp_path / "report.csv")
+    records = json.loads((tmp_path / "report.json").read_text())
+    assert [record["stage"] for record in records] == stages
+    assert pd.read_csv(tmp_path / "report.csv")["stage"].tolist() == stages
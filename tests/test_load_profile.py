@@ -0,0 +1,480 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from extra_functions import drop_leap_days
+from load_profile import (
+    allocation_matrix_for_year,
+    allocation_tensor,
+    base_year_allocation,
+    generate_16_region_load_array,
+    generate_16_region_load_profiles,
+    load_by_16_region,
+    main,
+    population_allocation,
+    population_by_year,
+    read_ercot_load_profile,
+    scale_and_overlay,
+    split_by_region,
+)
+
+
+def baseline_region_loads(base_profile, base_year, county_populations):
+    """Per county computation of the original script: a profile per county (its population
+    share of its cdr zone's load), summed by model region"""
+    counties = county_populations[
+        ["county", "cdr_zone", "model_region", base_year]
+    ].rename(columns={base_year: "population"})
+    zone_population = counties.groupby("cdr_zone")["population"].transform("sum")
+    counties["cdr_zone_percent"] = counties["population"] / zone_population
+
+    county_loads = counties.apply(
+        lambda x: base_profile[x["cdr_zone"]] * x["cdr_zone_percent"], axis=1
+    ).T
+    return pd.DataFrame(
+        {
+            region: county_loads[
+                counties.index[counties["model_region"] == region].tolist()
+            ].sum(axis=1)
+            for region in set(counties["model_region"])
+        }
+    )
+
+
+def baseline_profiles(
+    base_profile, base_year, model_years, county_populations, ev_loads, scaling_factor
+):
+    """Region loads of the original script, scaled by scaling_factor each year, plus the EV
+    load split by each region's share of the population"""
+    region_loads = baseline_region_loads(base_profile, base_year, county_populations)
+    population = county_populations.groupby("model_region")[base_year].sum()
+    population_fraction = population / population.sum()
+
+    out = {}
+    for model_year in model_years:
+        ev_load = np.tile(ev_loads[str(model_year)].to_numpy(), 365)
+        out[model_year] = region_loads * scaling_factor ** (
+            model_year - int(base_year)
+        ) + np.outer(ev_load, population_fraction[region_loads.columns])
+
+    return out
+
+
+def test_split_matches_per_county_baseline(base_profiles, county_populations):
+    expected = baseline_region_loads(base_profiles["2002"], "2002", county_populations)
+    out = load_by_16_region(
+        base_profiles["2002"],
+        allocation=allocation_matrix_for_year(county_populations, "2002"),
+    )
+
+    assert sorted(out.columns) == sorted(expected.columns)
+    np.testing.assert_allclose(
+        out.to_numpy(), expected[out.columns].to_numpy(), rtol=1e-10
+    )
+
+
+def test_allocation_conserves_each_cdr_zone(county_populations):
+    allocation = allocation_matrix_for_year(county_populations, "2010")
+
+    assert sorted(allocation.index) == sorted(set(county_populations["cdr_zone"]))
+    np.testing.assert_allclose(allocation.sum(axis=1), 1)
+
+
+def test_allocation_is_cached_by_population_data(county_populations):
+    first = allocation_matrix_for_year(county_populations, "2010")
+
+    assert allocation_matrix_for_year(county_populations.copy(), "2010") is first
+    changed = county_populations.copy()
+    changed.loc[0, "2010"] += 1000
+    assert allocation_matrix_for_year(changed, "2010") is not first
+
+
+def test_profiles_match_per_county_baseline(
+    base_profiles, county_populations, ev_loads, model_years
+):
+    expected = baseline_profiles(
+        base_profiles["2002"], "2002", model_years, county_populations, ev_loads, 1.018
+    )
+    out = generate_16_region_load_profiles(
+        base_profiles["2002"],
+        "2002",
+        model_years,
+        county_populations,
+        ev_loads,
+        outputs_to_file=False,
+    )
+
+    for model_year in model_years:
+        assert sorted(out[model_year].columns) == sorted(expected[model_year].columns)
+        np.testing.assert_allclose(
+            out[model_year].to_numpy(),
+            expected[model_year][out[model_year].columns].to_numpy(),
+            rtol=1e-10,
+        )
+
+
+def test_missing_loads_count_as_zero(
+    load_files, cache_dir, county_populations, ev_loads, model_years
+):
+    # the 2016 file has an hour without any zone loads
+    base_profile = read_ercot_load_profile(
+        load_files["2002"].parent / "native_Load_2016.xlsx", cache_dir=cache_dir
+    )
+    assert base_profile.drop(columns="Hour Ending").isna().all(axis=1).sum() == 1
+
+    expected = baseline_profiles(
+        drop_leap_days(base_profile), "2016", model_years, county_populations, ev_loads, 1.018
+    )
+    out = generate_16_region_load_profiles(
+        base_profile,
+        "2016",
+        model_years,
+        county_populations,
+        ev_loads,
+        outputs_to_file=False,
+    )
+
+    for model_year in model_years:
+        assert not out[model_year].isna().any().any()
+        np.testing.assert_allclose(
+            out[model_year].to_numpy(),
+            expected[model_year][out[model_year].columns].to_numpy(),
+            rtol=1e-10,
+        )
+
+
+def test_intermediate_scaling_and_leap_day(
+    base_profiles, county_populations, ev_loads, model_years
+):
+    base_profile = base_profiles["2004"].copy()
+    no_ev = ev_loads.copy()
+    no_ev[[str(year) for year in model_years]] = 0.0
+    out = generate_16_region_load_profiles(
+        base_profile,
+        "2004",
+        model_years,
+        county_populations,
+        no_ev,
+        intermediate_year=2018,
+        intermediate_load=base_profiles["2018"],
+        outputs_to_file=False,
+    )
+
+    # the caller's profile is left as it was
+    assert base_profile.equals(base_profiles["2004"])
+    intermediate_total = base_profiles["2018"].drop(columns=["Hour Ending"]).sum().sum()
+    for model_year in model_years:
+        assert len(out[model_year]) == 8760
+        np.testing.assert_allclose(
+            out[model_year].to_numpy().sum(),
+            intermediate_total * 1.018 ** (model_year - 2018),
+            rtol=1e-10,
+        )
+
+
+def test_cached_profiles_follow_file_content(tmp_path, load_files, base_profiles):
+    path = tmp_path / "load.xls"
+    shutil.copy(load_files["2002"], path)
+    cache_dir = tmp_path / "cache"
+
+    assert read_ercot_load_profile(path, cache_dir=cache_dir).equals(base_profiles["2002"])
+    assert len(list(cache_dir.glob("load_*.pkl"))) == 1
+    assert read_ercot_load_profile(path, cache_dir=cache_dir).equals(base_profiles["2002"])
+
+    # a changed file is parsed again, replacing its cached profile
+    shutil.copy(load_files["2004"], path)
+    assert read_ercot_load_profile(path, cache_dir=cache_dir).equals(base_profiles["2004"])
+    assert len(list(cache_dir.glob("load_*.pkl"))) == 1
+
+
+def test_float32_and_memory_budget(base_profiles, county_populations, ev_loads):
+    model_years = [2030, 2035, 2040]
+
+    def generate(**kwargs):
+        return generate_16_region_load_profiles(
+            base_profiles["2018"],
+            "2018",
+            model_years,
+            county_populations,
+            ev_loads,
+            outputs_to_file=False,
+            **kwargs,
+        )
+
+    expected = generate()
+    for model_year, df in generate(dtype="float32").items():
+        assert (df.dtypes == "float32").all()
+        np.testing.assert_allclose(df, expected[model_year], rtol=1e-6)
+
+    # a budget of one model year's profiles
+    batches = []
+    year_bytes = 8760 * len(expected[2030].columns) * 8
+    out = generate(memory_budget=year_bytes, flush=lambda out: batches.append(dict(out)))
+    assert out == {}
+    assert [list(batch) for batch in batches] == [[year] for year in model_years]
+    for batch in batches:
+        for model_year, df in batch.items():
+            assert df.equals(expected[model_year])
+
+
+def test_schemes_split_the_same_energy(base_profiles, county_populations, ev_loads):
+    schemes = {
+        "model_region": {"column": "model_region"},
+        # named after an existing column
+        "cdr_zone": {"column": "cdr_zone"},
+        "county": {"column": "county"},
+    }
+    no_ev = ev_loads.copy()
+    no_ev["2030"] = 0.0
+    out = generate_16_region_load_profiles(
+        base_profiles["2002"],
+        "2002",
+        [2030],
+        county_populations,
+        no_ev,
+        outputs_to_file=False,
+        schemes=schemes,
+    )
+
+    assert list(out) == list(schemes)
+    assert len(out["county"][2030].columns) == len(county_populations)
+    # a cdr zone's region is the whole zone
+    zones = out["cdr_zone"][2030]
+    np.testing.assert_allclose(
+        zones.to_numpy(),
+        base_profiles["2002"][zones.columns].to_numpy() * 1.018**28,
+        rtol=1e-10,
+    )
+    for scheme in schemes:
+        np.testing.assert_allclose(
+            out[scheme][2030].to_numpy().sum(axis=1), zones.to_numpy().sum(axis=1)
+        )
+
+
+@pytest.mark.parametrize("population_weighting", ["base_year", "model_year"])
+def test_allocation_of_every_scheme_conserves_each_cdr_zone(
+    county_populations, model_years, population_weighting
+):
+    schemes = {"model_region": {"column": "model_region"}, "county": {"column": "county"}}
+    if population_weighting == "model_year":
+        allocation, ev_fractions, names_by_scheme, _ = allocation_tensor(
+            county_populations, model_years, schemes=schemes
+        )
+    else:
+        allocation, ev_fractions, names_by_scheme, _ = base_year_allocation(
+            county_populations, "2004", schemes=schemes
+        )
+
+    n_regions = len(names_by_scheme["model_region"])
+    for columns in (slice(0, n_regions), slice(n_regions, None)):
+        np.testing.assert_allclose(allocation[:, :, columns].sum(axis=2), 1)
+        np.testing.assert_allclose(ev_fractions[:, columns].sum(axis=1), 1)
+
+
+def test_base_year_allocation_is_first_population_year(county_populations):
+    allocation, ev_fractions, _, zones = base_year_allocation(county_populations, "2010")
+    tensor, tensor_fractions, _, tensor_zones = allocation_tensor(
+        county_populations, [2010]
+    )
+
+    assert zones == tensor_zones
+    np.testing.assert_allclose(allocation, tensor, rtol=1e-12)
+    np.testing.assert_allclose(ev_fractions, tensor_fractions, rtol=1e-12)
+
+
+def test_population_between_and_after_columns():
+    counties = pd.DataFrame(
+        {"county": ["a", "b"], "2000": [100.0, 50.0], "2010": [200.0, 50.0]}
+    )
+    population = population_by_year(counties, [1990, 2005, 2020], trend_years=10)
+
+    assert population["1990"].tolist() == [100, 50]
+    assert population["2005"].tolist() == [150, 50]
+    # compound growth of the last ten years
+    np.testing.assert_allclose(population["2020"], [400, 50])
+
+
+def test_model_year_weighting_uses_model_year_population(
+    base_profiles, county_populations, ev_loads
+):
+    no_ev = ev_loads.copy()
+    no_ev["2020"] = 0.0
+    out = generate_16_region_load_profiles(
+        base_profiles["2002"],
+        "2002",
+        [2020],
+        county_populations,
+        no_ev,
+        population_weighting="model_year",
+        outputs_to_file=False,
+    )[2020]
+
+    expected = load_by_16_region(
+        base_profiles["2002"],
+        allocation=allocation_matrix_for_year(county_populations, "2020"),
+    )
+    np.testing.assert_allclose(
+        out.to_numpy(), expected[out.columns].to_numpy() * 1.018**18, rtol=1e-10
+    )
+
+
+def test_allocation_of_a_year_does_not_depend_on_other_years(county_populations):
+    years = [2025, 2030, 2040, 2050]
+    allocation, ev_fractions, _, _ = allocation_tensor(county_populations, years)
+
+    for number, year in enumerate(years):
+        year_allocation, year_fractions, _, _ = allocation_tensor(
+            county_populations, [year]
+        )
+        np.testing.assert_array_equal(year_allocation[0], allocation[number])
+        np.testing.assert_array_equal(year_fractions[0], ev_fractions[number])
+
+
+@pytest.mark.parametrize("population_weighting", ["base_year", "model_year"])
+def test_hour_slices_match_whole_year(
+    base_profiles, county_populations, ev_loads, model_years, population_weighting
+):
+    options = {"population_weighting": population_weighting}
+    whole, _ = generate_16_region_load_array(
+        base_profiles["2004"],
+        "2004",
+        model_years,
+        county_populations,
+        ev_loads,
+        **options,
+    )
+
+    profile = drop_leap_days(base_profiles["2004"])
+    allocation, _, names_by_scheme, zones = population_allocation(
+        county_populations, "2004", model_years, **options
+    )
+    _, base_total = split_by_region(
+        profile[zones].to_numpy(dtype=float), allocation[:1], names_by_scheme
+    )
+
+    for hours in (slice(0, 720), slice(720, 8760)):
+        part, _ = generate_16_region_load_array(
+            profile.iloc[hours],
+            "2004",
+            model_years,
+            county_populations,
+            ev_loads,
+            hours=hours,
+            base_total=base_total,
+            **options,
+        )
+        np.testing.assert_array_equal(part, whole[:, hours])
+
+
+def test_hours_need_base_total(base_profiles, county_populations, ev_loads, model_years):
+    with pytest.raises(ValueError):
+        generate_16_region_load_array(
+            base_profiles["2002"].iloc[:24],
+            "2002",
+            model_years,
+            county_populations,
+            ev_loads,
+            hours=slice(0, 24),
+        )
+
+
+def test_per_region_ev_loads_are_added_to_their_regions(
+    base_profiles, county_populations, ev_loads, region_ev_loads, model_years
+):
+    kwargs = {"outputs_to_file": False}
+    no_ev = ev_loads.copy()
+    no_ev[[str(year) for year in model_years]] = 0.0
+    base, out = (
+        generate_16_region_load_profiles(
+            base_profiles["2002"], "2002", model_years, county_populations, loads, **kwargs
+        )
+        for loads in (no_ev, region_ev_loads)
+    )
+
+    for model_year in model_years:
+        # EV regions are the model regions, so each region gets its own EV load
+        expected = (
+            region_ev_loads.groupby("region")[str(model_year)]
+            .apply(lambda load: np.tile(load.to_numpy(), 365))
+            .apply(pd.Series)
+            .T
+        )
+        np.testing.assert_allclose(
+            (out[model_year] - base[model_year]).to_numpy(),
+            expected[out[model_year].columns].to_numpy(),
+            atol=1e-8,
+        )
+
+
+def test_8760_hour_ev_loads_match_repeated_24_hour_loads(
+    base_profiles, county_populations, ev_loads, model_years
+):
+    hourly_ev = pd.concat([ev_loads] * 365, ignore_index=True)
+    expected, out = (
+        generate_16_region_load_profiles(
+            base_profiles["2002"],
+            "2002",
+            model_years,
+            county_populations,
+            loads,
+            outputs_to_file=False,
+        )
+        for loads in (ev_loads, hourly_ev)
+    )
+
+    for model_year in model_years:
+        np.testing.assert_allclose(out[model_year], expected[model_year], rtol=1e-12)
+
+
+@pytest.mark.parametrize("output_format", ["csv", "store"])
+def test_pipelined_main_matches_sequential(
+    tmp_path, data_dir, load_files, model_years, cache_dir, output_format, assert_same_outputs
+):
+    for name, kwargs in {
+        "sequential": {"prefetch": 0, "write_workers": 0},
+        "pipelined": {"prefetch": 2, "write_workers": 2, "max_pending_writes": 1},
+    }.items():
+        main(
+            tmp_path / name,
+            data_dir,
+            load_files,
+            model_years,
+            cache_dir=cache_dir,
+            output_format=output_format,
+            **kwargs,
+        )
+
+    assert_same_outputs(tmp_path / "sequential", tmp_path / "pipelined")
+    assert not list((tmp_path / "pipelined").rglob("*.tmp"))
+
+
+@pytest.mark.parametrize("ev_hours", [24, 48])
+@pytest.mark.parametrize("dtype", ["float64", "float32"])
+def test_scale_and_overlay(ev_hours, dtype):
+    rng = np.random.default_rng(0)
+    split = rng.uniform(0, 100, (1, 48, 5))
+    year_factors = np.array([1.0, 1.5, 2.0])
+    ev_load = rng.uniform(0, 10, (3, ev_hours, 2))
+    allocation = rng.uniform(0, 1, (1, 2, 5))
+    inputs = [array.copy() for array in (split, year_factors, ev_load, allocation)]
+
+    ev_by_region = ev_load @ allocation
+    if ev_hours == 24:
+        ev_by_region = np.tile(ev_by_region, (1, 2, 1))
+    expected = year_factors[:, None, None] * split + ev_by_region
+
+    out = scale_and_overlay(split, year_factors, ev_load, allocation, dtype=dtype)
+    assert out.dtype == dtype
+    np.testing.assert_allclose(out, expected, rtol=1e-6 if dtype == "float32" else 1e-12)
+    for array, copy in zip((split, year_factors, ev_load, allocation), inputs):
+        np.testing.assert_array_equal(array, copy)
+
+    # buffers are overwritten, not added to
+    buffer = np.full((3, 48, 5), np.nan, dtype=dtype)
+    assert scale_and_overlay(split, year_factors, ev_load, allocation, out=buffer) is buffer
+    np.testing.assert_array_equal(buffer, out)
+
+    with pytest.raises(ValueError):
+        scale_and_overlay(split, year_factors, ev_load, allocation, out=buffer[:, :24])
@@ -0,0 +1,79 @@
+import os
+from pathlib import Path
+
+import manifest as manifest_module
+from load_profile import main
+from manifest import CODE_FILES, read_manifest, scenario_records, stale_model_years
+
+
+def records(output_dir, load_files, county_populations, ev_loads, model_years, **kwargs):
+    return scenario_records(
+        output_dir,
+        load_file=load_files["2002"],
+        base_year="2002",
+        model_years=model_years,
+        county_population_data=county_populations,
+        ev_loads=ev_loads,
+        **kwargs,
+    )
+
+
+def test_outputs_are_stale_when_inputs_change(
+    tmp_path, data_dir, load_files, county_populations, ev_loads, model_years, cache_dir
+):
+    main(
+        tmp_path,
+        data_dir,
+        {"2002": load_files["2002"]},
+        model_years,
+        cache_dir=cache_dir,
+        incremental=True,
+    )
+    manifest = read_manifest(tmp_path)
+
+    def stale(ev_loads=ev_loads, **kwargs):
+        return stale_model_years(
+            manifest,
+            tmp_path,
+            records(
+                tmp_path, load_files, county_populations, ev_loads, model_years, **kwargs
+            ),
+        )
+
+    assert stale() == []
+    assert stale(scaling_factor=1.02) == model_years
+    assert stale(dtype="float32") == model_years
+    changed_ev = ev_loads.copy()
+    changed_ev[str(model_years[-1])] += 1
+    assert stale(changed_ev) == model_years[-1:]
+
+    # a missing output is rebuilt, whatever the manifest says
+    os.remove(next(tmp_path.rglob(f"*model{model_years[0]}.csv")))
+    assert stale() == model_years[:1]
+
+
+def test_incremental_run_skips_built_outputs(
+    tmp_path, data_dir, load_files, model_years, cache_dir
+):
+    def run(**kwargs):
+        main(
+            tmp_path,
+            data_dir,
+            {"2002": load_files["2002"]},
+            model_years,
+            cache_dir=cache_dir,
+            incremental=True,
+            **kwargs,
+        )
+        return {file: file.stat().st_mtime_ns for file in tmp_path.rglob("*.csv")}
+
+    built = run()
+    assert run() == built
+    rebuilt = run(scaling_factor=1.02)
+    assert rebuilt.keys() == built.keys()
+    assert all(rebuilt[file] != built[file] for file in built)
+
+
+def test_code_files_exist():
+    code_dir = Path(manifest_module.__file__).parent
+    assert all((code_dir / file).exists() for file in CODE_FILES)
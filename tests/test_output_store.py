@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from load_profile import main
+from output_store import (
+    export_csv,
+    parse_scenario_key,
+    read_scenario,
+    read_store_index,
+    scenario_key,
+    write_store,
+)
+
+
+def profiles(output_dir):
+    rng = np.random.default_rng(0)
+    return {
+        output_dir / "load_base_2002" / "load_base2002_model2030.csv": pd.DataFrame(
+            rng.uniform(0, 1000, (48, 3)), columns=["1_a", "2_b", "10_c"]
+        ),
+        output_dir
+        / "load_base_2002"
+        / "load_intermediate_2021"
+        / "load_base2002_intermediate2021_model2035.csv": pd.DataFrame(
+            rng.uniform(0, 1000, (48, 3)), columns=["1_a", "2_b", "10_c"]
+        ),
+    }
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float64"])
+def test_store_round_trip(tmp_path, dtype):
+    files = profiles(tmp_path)
+    write_store(tmp_path / "store", files, dtype=dtype)
+
+    index = read_store_index(tmp_path / "store")
+    assert sorted(index.index) == sorted(file.stem for file in files)
+    df = read_scenario(tmp_path / "store", "2002", 2035, 2021, regions=["10_c", "1_a"])
+    expected = files[
+        tmp_path
+        / "load_base_2002"
+        / "load_intermediate_2021"
+        / "load_base2002_intermediate2021_model2035.csv"
+    ][["10_c", "1_a"]]
+    np.testing.assert_array_equal(df.to_numpy(), expected.to_numpy().astype(dtype))
+
+
+def test_exported_store_matches_csv_outputs(
+    tmp_path, data_dir, load_files, model_years, cache_dir
+):
+    load_files = {"2002": load_files["2002"]}
+    main(tmp_path / "csv", data_dir, load_files, model_years, cache_dir=cache_dir)
+    main(
+        tmp_path / "store",
+        data_dir,
+        load_files,
+        model_years,
+        cache_dir=cache_dir,
+        output_format="store",
+    )
+    exported = export_csv(tmp_path / "store" / "store", tmp_path / "exported")
+
+    assert len(exported) == len(model_years)
+    for file in exported:
+        expected = pd.read_csv(
+            tmp_path / "csv" / file.relative_to(tmp_path / "exported"), index_col=0
+        )
+        df = pd.read_csv(file, index_col=0)
+        assert list(df.columns) == list(expected.columns)
+        # float32 store
+        np.testing.assert_allclose(df.to_numpy(), expected.to_numpy(), rtol=1e-6)
+
+
+def test_scenario_keys():
+    assert parse_scenario_key(scenario_key("2002", 2030)) == {
+        "base_year": "2002",
+        "intermediate_year": None,
+        "model_year": 2030,
+    }
+    scenario = parse_scenario_key(scenario_key("2002", 2030, 2021))
+    assert scenario["intermediate_year"] == 2021
+    with pytest.raises(ValueError):
+        parse_scenario_key("load_2002")
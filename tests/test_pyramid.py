@@ -0,0 +1,124 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from load_profile import main
+from output_store import output_file, parse_scenario_key, read_scenario_key
+from pyramid import build_pyramids, read_heatmap, read_pyramid, read_window, scenario_pyramid
+
+
+@pytest.fixture(scope="module")
+def profile():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(rng.uniform(0, 100, (8760, 2)), columns=["a", "b"])
+
+
+def test_pyramid_statistics(profile):
+    pyramid = scenario_pyramid(profile)
+    assert list(pyramid["regions"]) == ["a", "b", "system"]
+
+    loads = profile.assign(system=profile.sum(axis=1))
+    hours = pd.date_range("2002-01-01", periods=8760, freq="h")
+    for level, periods in {
+        "day": hours.dayofyear,
+        "week": (hours.dayofyear - 1) // 7,
+        "month": hours.month,
+    }.items():
+        expected = loads.groupby(periods.to_numpy()).agg(["min", "mean", "max"])
+        assert pyramid[level].shape == (len(expected), 3, 3)
+        for number, statistic in enumerate(("min", "mean", "max")):
+            np.testing.assert_allclose(
+                pyramid[level][:, number],
+                expected.xs(statistic, axis=1, level=1),
+                rtol=1e-12,
+            )
+
+    heatmap = loads.groupby([hours.month, hours.hour]).mean()
+    np.testing.assert_allclose(
+        pyramid["heatmap"].reshape(12 * 24, 3), heatmap.to_numpy(), rtol=1e-12
+    )
+
+
+@pytest.mark.parametrize("output_format", ["csv", "store"])
+def test_read_window(tmp_path, data_dir, load_files, model_years, cache_dir, output_format):
+    load_files = {year: load_files[year] for year in ("2002", "2004")}
+    main(
+        tmp_path,
+        data_dir,
+        load_files,
+        model_years,
+        cache_dir=cache_dir,
+        output_format=output_format,
+    )
+    scenarios = ["load_base2002_model2035", "load_base2004_model2035"]
+    profiles = {
+        scenario: read_scenario_key(tmp_path / "store", scenario)
+        if output_format == "store"
+        else pd.read_csv(output_file(tmp_path, **parse_scenario_key(scenario)), index_col=0)
+        for scenario in scenarios
+    }
+
+    resolution, window = read_window(
+        tmp_path, scenarios, region="system", start_hour=100, end_hour=300, max_points=500
+    )
+    assert resolution == "hour"
+    assert list(window.index) == list(range(100, 300))
+    for scenario, df in profiles.items():
+        np.testing.assert_allclose(
+            window[scenario, "mean"], df.iloc[100:300].sum(axis=1), rtol=1e-6
+        )
+
+    if output_format == "csv":
+        resolution, window = read_window(
+            tmp_path, scenarios, region="3_houston", start_hour=8000, end_hour=8100
+        )
+        np.testing.assert_allclose(
+            window[scenarios[0], "max"], profiles[scenarios[0]]["3_houston"].iloc[8000:8100]
+        )
+
+    for max_points, expected, n_periods in (
+        (400, "day", 365),
+        (100, "week", 53),
+        (20, "month", 12),
+        (5, "month", 12),
+    ):
+        resolution, window = read_window(tmp_path, scenarios, max_points=max_points)
+        assert resolution == expected
+        assert len(window) == n_periods
+        assert window.index[0] == 0
+
+    # periods overlapping the window
+    resolution, window = read_window(
+        tmp_path, scenarios, start_hour=24 * 40, end_hour=24 * 70, max_points=10
+    )
+    assert resolution == "week"
+    assert list(window.index) == [24 * 35 + 24 * 7 * week for week in range(5)]
+
+    heatmap = read_heatmap(tmp_path, scenarios[0])
+    assert heatmap.shape == (12, 24)
+    np.testing.assert_allclose(
+        heatmap.mul([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], axis=0).to_numpy().sum(),
+        profiles[scenarios[0]].to_numpy().sum(),
+        rtol=1e-6,
+    )
+
+
+def test_build_pyramids_of_existing_outputs(tmp_path, data_dir, load_files, cache_dir):
+    load_files = {"2002": load_files["2002"]}
+    main(tmp_path, data_dir, load_files, [2035], cache_dir=cache_dir)
+    expected = read_pyramid(tmp_path, "load_base2002_model2035")
+    shutil.rmtree(tmp_path / "pyramid")
+
+    assert build_pyramids(tmp_path) == ["load_base2002_model2035"]
+    pyramid = read_pyramid(tmp_path, "load_base2002_model2035")
+    assert pyramid.keys() == expected.keys()
+    for name, values in pyramid.items():
+        np.testing.assert_array_equal(values, expected[name])
+
+
+@pytest.mark.parametrize("n_hours", [8784, 35040, 24])
+def test_pyramids_need_a_year_of_hours(n_hours):
+    with pytest.raises(ValueError):
+        scenario_pyramid(pd.DataFrame({"a": np.ones(n_hours)}))
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from load_profile import main
+from representative_periods import cluster_periods, reduce_outputs, reduce_profiles
+
+
+@pytest.fixture
+def profiles():
+    rng = np.random.default_rng(0)
+    hours = np.arange(8760)
+    shape = 1 + 0.3 * np.sin(2 * np.pi * hours / 24) + 0.2 * np.sin(2 * np.pi * hours / 8760)
+    return {
+        year: pd.DataFrame(
+            shape[:, None] * [100.0, 40.0, 5.0] + rng.normal(0, 2, (8760, 3)),
+            columns=["a", "b", "c"],
+        )
+        for year in ("2002", "2004")
+    }
+
+
+@pytest.mark.parametrize("method", ["kmeans", "kmedoids"])
+def test_representatives_cover_every_hour(profiles, method):
+    reduction = reduce_profiles(profiles, 6, period_hours=168, method=method, n_init=3)
+    weights, mapping = reduction["weights"], reduction["mapping"]
+
+    assert len(reduction["profiles"]) == 6 * 168
+    assert list(reduction["profiles"].columns) == ["a", "b", "c"]
+    assert weights["weight"].sum() == 2 * 8760
+    np.testing.assert_array_equal(
+        mapping.groupby("representative")["hours"].sum(), weights["weight"]
+    )
+    # 52 full weeks and a partial one per year
+    assert len(mapping) == 2 * 53
+    assert not mapping.groupby("profile")["full"].last().any()
+
+    # each representative is one of the periods it stands for
+    for row in weights.itertuples():
+        period = mapping[
+            (mapping["profile"] == row.profile) & (mapping["period"] == row.period)
+        ]
+        assert period["representative"].item() == row.representative
+        start = period["start_hour"].item()
+        np.testing.assert_array_equal(
+            reduction["profiles"].iloc[(row.representative - 1) * 168 : row.representative * 168],
+            profiles[row.profile].iloc[start : start + 168],
+        )
+
+
+def test_extreme_periods_are_kept(profiles):
+    profiles["2004"].iloc[5000, 1] = 1000.0
+    profiles["2002"].iloc[100, [0, 2]] = [2000.0, 100.0]
+
+    system = reduce_profiles(profiles, 4, period_hours=24, n_init=2)
+    assert system["weights"]["extreme"].tolist() == [True, False, False, False]
+    assert system["weights"].loc[0, ["profile", "period"]].tolist() == ["2002", 5]
+
+    regions = reduce_profiles(profiles, 6, period_hours=24, extreme_periods="regions", n_init=2)
+    extremes = regions["weights"][regions["weights"]["extreme"]]
+    assert sorted(zip(extremes["profile"], extremes["period"])) == [
+        ("2002", 5),
+        ("2004", 209),
+    ]
+    assert (extremes["weight"] >= 24).all()
+
+    with pytest.raises(ValueError):
+        reduce_profiles(profiles, 2, period_hours=24, extreme_periods="regions")
+
+
+def test_same_seed_same_periods(profiles):
+    first, second, other = (
+        reduce_profiles(profiles, 8, period_hours=24, seed=seed, n_init=2)
+        for seed in (1, 1, 2)
+    )
+    pd.testing.assert_frame_equal(first["weights"], second["weights"])
+    pd.testing.assert_frame_equal(first["mapping"], second["mapping"])
+    assert not first["mapping"].equals(other["mapping"])
+
+
+def test_clusters_of_separate_groups():
+    features = np.repeat([[0.0, 0.0], [10.0, 0.0], [0.0, 10.0]], 5, axis=0)
+    features += np.random.default_rng(0).normal(0, 0.1, features.shape)
+
+    for method in ("kmeans", "kmedoids"):
+        labels, representatives = cluster_periods(features, 3, method=method)
+        assert len(set(labels[:5])) == len(set(labels[5:10])) == len(set(labels[10:])) == 1
+        assert len(set(labels)) == 3
+        assert (labels[representatives] == np.arange(3)).all()
+
+
+def test_reduce_outputs(tmp_path, data_dir, load_files, model_years, cache_dir):
+    main(tmp_path, data_dir, load_files, model_years, cache_dir=cache_dir)
+
+    names = reduce_outputs(
+        tmp_path, n_representatives=4, period_hours=168, max_workers=1, n_init=2
+    )
+    assert sorted(names) == sorted(
+        f"load_base{base_year}_model{model_year}"
+        for base_year in load_files
+        for model_year in model_years
+    )
+    weights = pd.read_csv(
+        tmp_path / "representative_periods" / "load_base2002_model2035_weights.csv"
+    )
+    assert weights["weight"].sum() == 8760
+
+    names = reduce_outputs(
+        tmp_path,
+        across_weather_years=True,
+        n_representatives=4,
+        period_hours=168,
+        max_workers=2,
+        n_init=2,
+    )
+    assert sorted(names) == [f"model{model_year}" for model_year in model_years]
+    weights = pd.read_csv(tmp_path / "representative_periods" / "model2035_weights.csv")
+    assert weights["weight"].sum() == len(load_files) * 8760
+    profiles = pd.read_csv(
+        tmp_path / "representative_periods" / "model2035_representative_periods.csv",
+        index_col=0,
+    )
+    assert profiles.shape == (4 * 168, 16)
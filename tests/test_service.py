@@ -0,0 +1,131 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import numpy as np
+import pytest
+
+from load_profile import generate_16_region_load_profiles
+from service import (
+    fetch_profile,
+    new_profile_service,
+    serve,
+    service_profile,
+    service_stats,
+)
+
+
+@pytest.fixture
+def service(tmp_path, data_dir, load_files, cache_dir):
+    # a load file that can't be read
+    load_files = load_files | {"1999": tmp_path / "missing.xls"}
+    return new_profile_service(data_dir, load_files, cache_dir=cache_dir, max_profiles=2)
+
+
+@pytest.fixture
+def url(service):
+    """Address of service, served from a thread until the test ends"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(serve(service, port=port))
+
+    def run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+
+    yield f"http://127.0.0.1:{port}"
+
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join()
+    loop.close()
+
+
+def test_profiles_are_generated_once(
+    service, base_profiles, county_populations, ev_loads
+):
+    expected = generate_16_region_load_profiles(
+        base_profiles["2002"],
+        "2002",
+        [2030],
+        county_populations,
+        ev_loads,
+        outputs_to_file=False,
+    )[2030]
+
+    assert service_profile(service, 2002, 2030).equals(expected)
+    # an intermediate year before the base year is the same scenario
+    assert service_profile(service, "2002", 2030, intermediate_year=2002).equals(expected)
+
+    stats = service_stats(service)
+    assert stats["profiles"] == {"hits": 1, "misses": 1, "entries": 1}
+    assert stats["load_profiles"]["misses"] == 1
+
+
+def test_changing_a_profile_does_not_change_the_cache(service):
+    df = service_profile(service, "2002", 2030)
+    expected = df.copy()
+    df["1_dallas"] = 0.0
+    df.iloc[0] = -1.0
+
+    assert service_profile(service, "2002", 2030).equals(expected)
+
+
+def test_least_recently_used_profile_is_evicted(service):
+    for model_year in (2030, 2035, 2030, 2040, 2035):
+        service_profile(service, "2002", model_year)
+
+    stats = service_stats(service)["profiles"]
+    assert stats["entries"] == 2
+    # 2030 was used after 2035, so 2035 was evicted when 2040 was added
+    assert (stats["hits"], stats["misses"]) == (1, 4)
+
+
+def test_profiles_over_http(service, url):
+    df = fetch_profile(url, 2002, 2030)
+    np.testing.assert_allclose(
+        df.to_numpy(), service_profile(service, 2002, 2030).to_numpy(), rtol=1e-6
+    )
+    assert list(df.columns) == list(service_profile(service, 2002, 2030).columns)
+
+    with urlopen(f"{url}/profile?base_year=2002&model_year=2030") as response:
+        assert response.read().decode() == service_profile(service, 2002, 2030).to_csv()
+
+    with urlopen(f"{url}/stats") as response:
+        assert json.loads(response.read())["profiles"]["hits"] >= 1
+
+
+def test_bad_requests(url):
+    for query, status in [("base_year=1990&model_year=2030", 400), ("base_year=2002", 400)]:
+        with pytest.raises(HTTPError) as error:
+            urlopen(f"{url}/profile?{query}")
+        assert error.value.code == status
+
+    with pytest.raises(HTTPError) as error:
+        urlopen(f"{url}/other")
+    assert error.value.code == 404
+
+    # the service answers errors it doesn't expect, and keeps serving
+    with pytest.raises(HTTPError) as error:
+        urlopen(f"{url}/profile?base_year=1999&model_year=2030")
+    assert error.value.code == 500
+    assert "missing.xls" in json.loads(error.value.read())["error"]
+    with urlopen(f"{url}/stats") as response:
+        assert response.status == 200
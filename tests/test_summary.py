@@ -0,0 +1,90 @@
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from load_profile import main
+from summary import (
+    LDC_POINTS,
+    build_summary_index,
+    read_load_duration_curves,
+    read_summary,
+    scenario_summary,
+)
+
+
+def test_scenario_summary():
+    df = pd.DataFrame({"a": [1.0, 4.0, 2.0, 3.0], "b": [2.0, 0.0, 1.0, 2.0]})
+    summary = scenario_summary(df)
+
+    assert summary["regions"] == ["a", "b"]
+    assert summary["hours"] == 4
+    assert summary["energy"] == [10.0, 5.0, 15.0]
+    assert summary["peak"] == [4.0, 2.0, 5.0]
+    assert summary["peak_hour"] == [1, 0, 3]
+    assert summary["load_factor"] == pytest.approx([10 / 16, 5 / 8, 15 / 20])
+    assert len(summary["ldc"][2]) == len(LDC_POINTS)
+    assert summary["ldc"][2][0] == 5.0
+    assert summary["ldc"][2][-1] == 3.0
+
+
+@pytest.fixture(scope="module")
+def output_dir(tmp_path_factory, data_dir, load_files, model_years, cache_dir):
+    output_dir = tmp_path_factory.mktemp("outputs")
+    main(output_dir, data_dir, load_files, model_years, cache_dir=cache_dir)
+    return output_dir
+
+
+def test_summary_of_generated_outputs(output_dir, load_files, model_years):
+    summary = read_summary(output_dir)
+    assert len(summary) == len(load_files) * len(model_years) * 17
+
+    for base_year in load_files:
+        df = pd.read_csv(
+            output_dir / f"load_base_{base_year}" / f"load_base{base_year}_model2035.csv",
+            index_col=0,
+        )
+        rows = summary[
+            (summary["base_year"] == base_year) & (summary["model_year"] == 2035)
+        ].set_index("region")
+        np.testing.assert_allclose(rows["peak"], list(df.max()) + [df.sum(axis=1).max()])
+        np.testing.assert_allclose(rows["energy"], list(df.sum()) + [df.sum().sum()])
+
+    curves = read_load_duration_curves(output_dir, region="1_dallas")
+    assert list(curves.columns) == pytest.approx(list(LDC_POINTS))
+    peaks = summary[summary["region"] == "1_dallas"].set_index("scenario")["peak"]
+    np.testing.assert_allclose(curves[0.0], peaks[curves.index])
+    assert (curves.diff(axis=1).iloc[:, 1:] <= 0).all().all()
+
+
+@pytest.mark.parametrize("output_format", ["csv", "store"])
+def test_build_summary_index_of_existing_outputs(
+    tmp_path, output_dir, data_dir, load_files, model_years, cache_dir, output_format
+):
+    if output_format == "csv":
+        shutil.copytree(output_dir, tmp_path, dirs_exist_ok=True)
+    else:
+        main(
+            tmp_path,
+            data_dir,
+            load_files,
+            model_years,
+            cache_dir=cache_dir,
+            output_format="store",
+        )
+    expected = json.loads((tmp_path / "summary.json").read_text())
+    shutil.rmtree(tmp_path / "summary")
+    (tmp_path / "summary.json").unlink()
+
+    index = build_summary_index(tmp_path)
+    assert index == json.loads((tmp_path / "summary.json").read_text())
+    assert index["scenarios"].keys() == expected["scenarios"].keys()
+    for key, summary in index["scenarios"].items():
+        assert summary["regions"] == expected["scenarios"][key]["regions"]
+        assert summary["peak_hour"][-1] == expected["scenarios"][key]["peak_hour"][-1]
+        # stores are float32
+        np.testing.assert_allclose(
+            summary["energy"], expected["scenarios"][key]["energy"], rtol=1e-6
+        )
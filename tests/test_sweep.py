@@ -0,0 +1,45 @@
+from load_profile import main, read_ercot_load_profile
+from sweep import run_sweep, sweep_tasks
+
+
+def test_sweep_outputs_equal_main(
+    tmp_path, data_dir, load_files, model_years, cache_dir, assert_same_outputs
+):
+    load_files = {year: load_files[year] for year in ("2002", "2004")}
+    intermediate_profiles = {None: None, "2004": load_files["2004"]}
+    run_sweep(
+        tmp_path / "sweep",
+        data_dir,
+        load_files,
+        model_years,
+        intermediate_profiles=intermediate_profiles,
+        cache_dir=cache_dir,
+        max_workers=2,
+        print_timing=False,
+    )
+
+    # without and with intermediate scaling, in the same tree
+    main(tmp_path / "main", data_dir, load_files, model_years, cache_dir=cache_dir)
+    main(
+        tmp_path / "main",
+        data_dir,
+        load_files,
+        model_years,
+        intermediate_load=read_ercot_load_profile(load_files["2004"], cache_dir=cache_dir),
+        intermediate_year="2004",
+        cache_dir=cache_dir,
+    )
+    assert_same_outputs(tmp_path / "main", tmp_path / "sweep")
+
+
+def test_sweep_tasks_drop_intermediate_years_before_base_year(load_files, model_years):
+    tasks = sweep_tasks(
+        load_files, model_years, intermediate_profiles={None: None, "2004": "2004.xls"}
+    )
+
+    assert [(task["base_year"], task["intermediate_year"]) for task in tasks] == [
+        ("2002", None),
+        ("2002", "2004"),
+        ("2004", None),
+        ("2018", None),
+    ]
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from load_profile import main
+from targets import apply_targets, read_targets, target_report
+
+NAMES_BY_SCHEME = {"model_region": ["a", "b"], "county": ["x"]}
+
+
+def loads():
+    """(model year, hour, region) loads with a different shape in each region"""
+    hours = np.arange(100)
+    profile = np.stack(
+        [1000 + 300 * np.sin(hours / 7), 500 + 100 * np.cos(hours / 5), 1500 + hours],
+        axis=1,
+    )
+    return np.stack([profile, 1.1 * profile])
+
+
+def test_targets_are_met_and_other_regions_untouched():
+    original = loads()
+    transformed = original.copy()
+    targets = pd.DataFrame(
+        {
+            "scheme": ["model_region", "model_region"],
+            "region": ["a", "b"],
+            "year": [2035, 2035],
+            "energy": [120000.0, np.nan],
+            "peak": [1500.0, 700.0],
+        }
+    )
+
+    report = apply_targets(transformed, targets, NAMES_BY_SCHEME, [2030, 2035])
+
+    assert transformed[1, :, 0].sum() == pytest.approx(120000)
+    assert transformed[1, :, 0].max() == pytest.approx(1500)
+    assert transformed[1, :, 1].max() == pytest.approx(700)
+    # the peak target alone scales the load
+    assert report.set_index("region").loc["b", "beta"] == 0
+    # shape (hour of the peak) is kept
+    assert transformed[1, :, 0].argmax() == original[1, :, 0].argmax()
+    np.testing.assert_array_equal(transformed[0], original[0])
+    np.testing.assert_array_equal(transformed[:, :, 2], original[:, :, 2])
+
+
+def test_negative_loads_raise_before_changing_loads():
+    original = loads()
+    transformed = original.copy()
+    # a load factor of 0.1, far below the profile's
+    targets = pd.DataFrame(
+        {
+            "scheme": ["county"],
+            "region": ["x"],
+            "year": [2030],
+            "energy": [20000.0],
+            "peak": [2000.0],
+        }
+    )
+
+    with pytest.raises(ValueError, match="county x 2030"):
+        apply_targets(transformed, targets, NAMES_BY_SCHEME, [2030, 2035])
+    np.testing.assert_array_equal(transformed, original)
+
+
+def test_unreachable_load_factor_raises():
+    # a load factor of 10
+    targets = pd.DataFrame(
+        {
+            "scheme": ["model_region"],
+            "region": ["a"],
+            "year": [2030],
+            "energy": [1e6],
+            "peak": [1000.0],
+        }
+    )
+    with pytest.raises(ValueError):
+        apply_targets(loads(), targets, NAMES_BY_SCHEME, [2030, 2035])
+
+
+def test_read_targets_defaults_to_model_regions(tmp_path):
+    path = tmp_path / "targets.csv"
+    path.write_text("region,year,peak\na,2030,1000\n")
+
+    targets = read_targets(path)
+
+    assert list(targets.columns) == ["scheme", "region", "year", "energy", "peak"]
+    assert targets["scheme"].tolist() == ["model_region"]
+    assert targets["energy"].isna().all()
+
+
+def test_outputs_meet_targets(tmp_path, data_dir, load_files, model_years, cache_dir):
+    targets = pd.DataFrame(
+        {
+            "scheme": ["model_region", "model_region", "model_region"],
+            "region": ["3_houston", "1_dallas", "3_houston"],
+            "year": [2035, 2035, 2030],
+            "energy": [9e7, np.nan, np.nan],
+            "peak": [15000.0, 25000.0, 14000.0],
+        }
+    )
+    main(tmp_path, data_dir, load_files, model_years, cache_dir=cache_dir, targets=targets)
+
+    report = target_report(tmp_path, targets)
+    assert len(report) == len(load_files) * len(targets)
+    assert report["peak_error"].abs().max() < 1e-12
+    assert report["energy_error"].abs().max() < 1e-12
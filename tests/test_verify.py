@@ -0,0 +1,118 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from load_profile import main
+from verify import diff_trees, verify_tree
+
+
+@pytest.fixture(scope="module")
+def output_tree(tmp_path_factory, data_dir, load_files, model_years, cache_dir):
+    """CSV outputs of two base years, and the same outputs in a store"""
+    output_dir = tmp_path_factory.mktemp("outputs")
+    load_files = {year: load_files[year] for year in ("2002", "2004")}
+    main(output_dir / "csv", data_dir, load_files, model_years, cache_dir=cache_dir)
+    main(
+        output_dir / "store",
+        data_dir,
+        load_files,
+        model_years,
+        cache_dir=cache_dir,
+        output_format="store",
+    )
+    return output_dir
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_generated_outputs_pass(output_tree, data_dir, load_files, cache_dir, max_workers):
+    results = verify_tree(
+        output_tree,
+        data_dir=data_dir,
+        load_files=load_files,
+        cache_dir=cache_dir,
+        max_workers=max_workers,
+    )
+
+    # two base years and model years, as CSV files and in the store
+    assert len(results) == 8
+    assert results["ok"].all()
+    assert results["energy_ok"].all() and results["region_order_ok"].all()
+
+
+def test_broken_outputs_fail(tmp_path, output_tree, data_dir, load_files, cache_dir):
+    shutil.copytree(output_tree / "csv", tmp_path / "csv")
+    files = sorted((tmp_path / "csv").rglob("*.csv"))
+    df = pd.read_csv(files[0], index_col=0)
+    df.iloc[10, 0] = -1.0
+    df.to_csv(files[0])
+    pd.read_csv(files[1], index_col=0).iloc[:-1].to_csv(files[1])
+
+    results = verify_tree(
+        tmp_path, data_dir=data_dir, load_files=load_files, cache_dir=cache_dir, max_workers=1
+    ).set_index("output")
+
+    broken = [file.relative_to(tmp_path).as_posix() for file in files[:2]]
+    assert not results.loc[broken[0], "non_negative"]
+    assert not results.loc[broken[1], "rows_ok"]
+    assert not results.loc[broken, "energy_ok"].any()
+    assert results.drop(index=broken)["ok"].all()
+
+
+def test_diff_trees(tmp_path, output_tree):
+    shutil.copytree(output_tree / "csv", tmp_path / "csv")
+    files = sorted((tmp_path / "csv").rglob("*.csv"))
+    df = pd.read_csv(files[0], index_col=0)
+    df.iloc[:, 0] *= 1 + 1e-9
+    df.to_csv(files[0])
+    df = pd.read_csv(files[1], index_col=0)
+    df.iloc[100, 0] += 10
+    df.to_csv(files[1])
+    files[2].unlink()
+
+    differences = diff_trees(output_tree, tmp_path, max_workers=1).set_index("output")
+    key = [file.relative_to(tmp_path).as_posix() for file in files]
+
+    assert differences.loc[key[0], "status"] == "within_tolerance"
+    assert differences.loc[key[1], "status"] == "different"
+    assert differences.loc[key[1], "max_abs_diff"] == pytest.approx(10)
+    assert differences.loc[key[2], "status"] == "only_old"
+    assert differences.loc[key[3], "status"] == "equal"
+    # the store is only in output_tree
+    assert (differences["status"] == "only_old").sum() == 5
+    assert np.isnan(differences.loc[key[2], "max_abs_diff"])
+
+
+def test_targeted_outputs_pass_with_targets(tmp_path, data_dir, load_files, model_years, cache_dir):
+    targets = pd.DataFrame(
+        {
+            "scheme": ["model_region", "model_region"],
+            "region": ["3_houston", "1_dallas"],
+            "year": [2035, 2030],
+            "energy": [9e7, np.nan],
+            "peak": [15000.0, 25000.0],
+        }
+    )
+    load_files = {"2002": load_files["2002"]}
+    main(tmp_path, data_dir, load_files, model_years, cache_dir=cache_dir, targets=targets)
+
+    results = verify_tree(
+        tmp_path, data_dir=data_dir, load_files=load_files, cache_dir=cache_dir, max_workers=1
+    )
+    assert not results["energy_ok"].any()
+
+    results = verify_tree(
+        tmp_path,
+        data_dir=data_dir,
+        load_files=load_files,
+        cache_dir=cache_dir,
+        targets=targets,
+        max_workers=1,
+    )
+    assert results["ok"].all()
+    assert results["expected_total"].isna().all()
+
+    targets.loc[0, "peak"] = 16000.0
+    results = verify_tree(tmp_path, targets=targets, max_workers=1).set_index("output")
+    assert results["targets_ok"].tolist() == [True, False]
@@ -0,0 +1,432 @@
+"""
+ Verifies generated output trees and diffs two of them.
+
+ verify_tree checks every output (CSV files and binary stores, see output_store.py) under a
+ directory for its number of hours, region order, non-negative values and, given the load
+ files, conservation of energy against its base profile (or, for outputs with regions matched
+ to energy and peak targets, those regions' targets). diff_trees compares each output of
+ two trees numerically with tolerances. Files are read in parallel worker processes, and
+ stores are read through memory maps.
+ Options are described at bottom of script
+"""
+
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from extra_functions import DEFAULT_SCHEMES, aggregation_regions, drop_leap_days
+from load_profile import (
+    ev_load_array,
+    read_county_population_data,
+    read_ercot_load_profile,
+    year_scaling_factors,
+)
+from output_store import (
+    SCENARIO_PATTERN,
+    output_file,
+    parse_scenario_key,
+    read_scenario_key,
+    store_scenarios,
+)
+from targets import read_targets
+
+# outputs are read by workers in batches of this many files
+BATCH_SIZE = 16
+
+
+def output_sources(output_dir):
+    """Returns every output under output_dir (CSV files and scenarios of stores)
+
+    Args:
+        output_dir (pathlib.Path): output tree
+
+    Returns:
+        dict: keys are paths relative to output_dir (stores use the path the CSV file would have),
+              values are ("csv", path) or ("store", store directory, scenario name) tuples
+    """
+    output_dir = Path(output_dir)
+    sources = {}
+    for file in sorted(output_dir.rglob("load_base*_model*.csv")):
+        if SCENARIO_PATTERN.fullmatch(file.stem):
+            sources[file.relative_to(output_dir).as_posix()] = ("csv", file)
+
+    for index_file in sorted(output_dir.rglob("store/index.json")):
+        store_dir = index_file.parent
+        for key, scenario in store_scenarios(store_dir).items():
+            file = output_file(
+                store_dir.parent,
+                scenario["base_year"],
+                scenario["model_year"],
+                scenario["intermediate_year"],
+            )
+            sources[file.relative_to(output_dir).as_posix()] = (
+                "store",
+                store_dir,
+                key,
+            )
+
+    return sources
+
+
+def read_output(source):
+    """Returns region names and (hour, region) values of an output from output_sources"""
+    if source[0] == "store":
+        df = read_scenario_key(source[1], source[2])
+    else:
+        df = pd.read_csv(source[1], index_col=0, dtype=np.float64)
+
+    return list(df.columns), df.to_numpy(dtype=np.float64)
+
+
+def _check_batch(batch):
+    """Returns statistics of each output in a batch of (key, source) tuples"""
+    results = []
+    for key, source in batch:
+        columns, values = read_output(source)
+        results.append(
+            {
+                "output": key,
+                "rows": values.shape[0],
+                "columns": columns,
+                "min": values.min() if values.size else np.nan,
+                "total": values.sum(),
+                "region_totals": values.sum(axis=0),
+                "region_peaks": values.max(axis=0, initial=-np.inf),
+                "finite": bool(np.isfinite(values).all()),
+            }
+        )
+
+    return results
+
+
+def _diff_batch(batch):
+    """Returns differences of each pair of outputs in a batch of (key, old source, new source) tuples"""
+    results = []
+    for key, old_source, new_source in batch:
+        old_columns, old_values = read_output(old_source)
+        new_columns, new_values = read_output(new_source)
+
+        result = {
+            "output": key,
+            "same_columns": old_columns == new_columns,
+            "comparable": old_values.shape == new_values.shape
+            and set(old_columns) == set(new_columns),
+        }
+        if result["comparable"]:
+            # regions are compared by name, in case only their order changed
+            new_values = new_values[:, [new_columns.index(c) for c in old_columns]]
+            difference = np.abs(new_values - old_values)
+            result |= {
+                "max_abs_diff": difference.max() if difference.size else 0.0,
+                "max_rel_diff": (
+                    difference / np.maximum(np.abs(old_values), 1e-12)
+                ).max()
+                if difference.size
+                else 0.0,
+                "total_diff": new_values.sum() - old_values.sum(),
+            }
+        results.append(result)
+
+    return results
+
+
+def run_batches(function, items, max_workers):
+    """Runs function on batches of BATCH_SIZE items in a process pool
+
+    Args:
+        function (callable): takes a list of items and returns a list of results, must be
+                             importable from a worker process (a module-level function)
+        items (list): items to run function on
+        max_workers (int): number of worker processes, 1 runs in this process
+
+    Returns:
+        list: results of every batch, in the order of items
+    """
+    batches = [items[i : i + BATCH_SIZE] for i in range(0, len(items), BATCH_SIZE)]
+    if max_workers == 1:
+        return [result for batch in batches for result in function(batch)]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return [result for results in pool.map(function, batches) for result in results]
+
+
+def _output_scheme(key, scheme_names):
+    """Returns scheme of an output, from the folder containing its load_base_ folder"""
+    parts = Path(key).parts
+    for part_number, part in enumerate(parts[1:], start=1):
+        if part.startswith("load_base_") and parts[part_number - 1] in scheme_names:
+            return parts[part_number - 1]
+
+    return "model_region"
+
+
+def _output_scaling_factor(key, scaling_factor):
+    """Returns scaling factor of an output, from a scaling_<factor> folder written by sweep.py if any"""
+    for part in Path(key).parts:
+        match = re.fullmatch(r"scaling_([\d.]+)", part)
+        if match:
+            return float(match[1])
+
+    return scaling_factor
+
+
+def _target_checks(results, targets, rtol):
+    """Returns whether each output has targeted regions, and whether their energy and peak
+    match the targets (see targets.apply_targets)"""
+    targets = targets.set_index(["scheme", "year", "region"])[["energy", "peak"]]
+    targeted = []
+    targets_ok = []
+    for key, scheme, columns, totals, peaks in zip(
+        results["output"],
+        results["scheme"],
+        results["columns"],
+        results["region_totals"],
+        results["region_peaks"],
+    ):
+        model_year = parse_scenario_key(Path(key).stem)["model_year"]
+        found = False
+        ok = True
+        for region, total, peak in zip(columns, totals, peaks):
+            if (scheme, model_year, region) not in targets.index:
+                continue
+            found = True
+            energy_target, peak_target = targets.loc[(scheme, model_year, region)]
+            for value, target in ((total, energy_target), (peak, peak_target)):
+                ok &= bool(
+                    np.isnan(target) or np.isclose(value, target, rtol=rtol, atol=0)
+                )
+        targeted.append(found)
+        targets_ok.append(ok)
+
+    return targeted, targets_ok
+
+
+def verify_tree(
+    output_dir,
+    data_dir=None,
+    load_files=None,
+    scaling_factor=1.018,
+    ev_file="ev_extra_loads.csv",
+    cache_dir=None,
+    schemes=None,
+    targets=None,
+    n_hours=8760,
+    rtol=1e-6,
+    max_workers=None,
+):
+    """Checks every output under output_dir
+
+    Args:
+        output_dir (pathlib.Path): output tree
+        data_dir (pathlib.Path): directory containing county_population_data.csv and ev_file,
+                                 region order and energy aren't checked if None
+        load_files (dict): keys are base (and intermediate) years, values are paths to load files,
+                           energy isn't checked if None
+        scaling_factor (float like): Factor load was scaled by each year (outputs in scaling_<factor>
+                                     folders use that factor)
+        ev_file (str): name of EV load file in data_dir
+        cache_dir (pathlib.Path): directory for parsed input files, see read_ercot_load_profile
+        schemes (dict): county -> region aggregation schemes outputs were generated with,
+                        see extra_functions.aggregation_regions
+        targets (pandas.DataFrame): energy and peak targets outputs were generated with (see
+                                    targets.read_targets). Targeted regions are checked against
+                                    their targets, and outputs with targeted regions aren't
+                                    checked for conservation of energy
+        n_hours (int): expected number of hours of each output
+        rtol (float): relative tolerance of energy conservation
+        max_workers (int): number of worker processes, defaults to number of CPUs
+
+    Returns:
+        pandas.DataFrame: one row per output, with the result of each check and "ok" if all passed
+    """
+    if schemes is None:
+        schemes = DEFAULT_SCHEMES
+    sources = output_sources(output_dir)
+    results = pd.DataFrame(
+        run_batches(_check_batch, list(sources.items()), max_workers)
+    )
+    if results.empty:
+        return results
+
+    results["rows_ok"] = results["rows"] == n_hours
+    results["non_negative"] = results["min"] >= 0
+    results["ok"] = results["rows_ok"] & results["non_negative"] & results["finite"]
+    results["scheme"] = [_output_scheme(key, schemes) for key in results["output"]]
+
+    targeted = [False] * len(results)
+    if targets is not None:
+        targeted, results["targets_ok"] = _target_checks(results, targets, rtol)
+        results["ok"] &= results["targets_ok"]
+
+    if data_dir is not None:
+        county_populations = read_county_population_data(
+            Path(data_dir) / "county_population_data.csv"
+        )
+        _, orders = aggregation_regions(county_populations, schemes)
+        results["region_order_ok"] = [
+            columns == orders[scheme]
+            for columns, scheme in zip(results["columns"], results["scheme"])
+        ]
+        results["ok"] &= results["region_order_ok"]
+
+    if data_dir is not None and load_files is not None:
+        ev_loads = pd.read_csv(Path(data_dir) / ev_file)
+        zones = sorted(set(county_populations["cdr_zone"]))
+        profiles = {}
+        # split energy of each base profile and EV energy of each model year, computed once
+        base_totals = {}
+        ev_totals = {}
+
+        def read_profile(year):
+            if year not in profiles:
+                profiles[year] = read_ercot_load_profile(load_files[year], cache_dir=cache_dir)
+            return profiles[year]
+
+        expected = []
+        for key, is_targeted in zip(results["output"], targeted):
+            scenario = parse_scenario_key(Path(key).stem)
+            base_year = scenario["base_year"]
+            intermediate_year = scenario["intermediate_year"]
+            # targets change the energy of targeted regions, which are checked above instead
+            if is_targeted or base_year not in load_files or (
+                intermediate_year and str(intermediate_year) not in load_files
+            ):
+                expected.append(np.nan)
+                continue
+
+            # split energy of the base profile, see generate_16_region_load_array
+            if base_year not in base_totals:
+                base_profile = read_profile(base_year)
+                base_totals[base_year] = drop_leap_days(base_profile)[zones].sum().sum()
+            total = base_totals[base_year]
+            model_year = scenario["model_year"]
+            if model_year not in ev_totals:
+                ev_totals[model_year] = ev_load_array(ev_loads, [model_year]).sum()
+
+            intermediate_load = None
+            if intermediate_year:
+                intermediate_load = read_profile(str(intermediate_year))
+            year_factor = year_scaling_factors(
+                base_year,
+                [model_year],
+                total,
+                scaling_factor=_output_scaling_factor(key, scaling_factor),
+                intermediate_year=intermediate_year,
+                intermediate_load=intermediate_load,
+            )[0]
+            expected.append(year_factor * total + ev_totals[model_year])
+
+        results["expected_total"] = expected
+        results["energy_ok"] = results["expected_total"].isna() | np.isclose(
+            results["total"], results["expected_total"], rtol=rtol, atol=0
+        )
+        results["ok"] &= results["energy_ok"]
+
+    return results.drop(columns=["columns", "region_totals", "region_peaks"])
+
+
+def diff_trees(old_dir, new_dir, atol=1e-6, rtol=1e-6, max_workers=None):
+    """Compares every output present in two output trees
+
+    Args:
+        old_dir (pathlib.Path): reference output tree
+        new_dir (pathlib.Path): output tree to compare
+        atol (float): absolute tolerance (MW)
+        rtol (float): relative tolerance
+        max_workers (int): number of worker processes, defaults to number of CPUs
+
+    Returns:
+        pandas.DataFrame: one row per output, "status" is "equal", "within_tolerance",
+                          "different", "only_old" or "only_new"
+    """
+    old_sources = output_sources(old_dir)
+    new_sources = output_sources(new_dir)
+    common = [
+        (key, old_sources[key], new_sources[key])
+        for key in old_sources
+        if key in new_sources
+    ]
+
+    results = pd.DataFrame(
+        run_batches(_diff_batch, common, max_workers),
+        columns=[
+            "output",
+            "same_columns",
+            "comparable",
+            "max_abs_diff",
+            "max_rel_diff",
+            "total_diff",
+        ],
+    )
+    comparable = results["comparable"].astype(bool)
+    within = comparable & (
+        (results["max_abs_diff"] <= atol) | (results["max_rel_diff"] <= rtol)
+    )
+    results["status"] = np.where(
+        comparable & (results["max_abs_diff"] == 0),
+        "equal",
+        np.where(within, "within_tolerance", "different"),
+    )
+
+    missing = pd.DataFrame(
+        [{"output": key, "status": "only_old"} for key in old_sources if key not in new_sources]
+        + [{"output": key, "status": "only_new"} for key in new_sources if key not in old_sources]
+    )
+
+    return pd.concat([results, missing], ignore_index=True)
+
+
+if __name__ == "__main__":
+    ###### OPTIONS ######
+
+    input_dir = Path("inputs")  # location of input files
+    output_dir = Path("outputs")  # output tree to verify
+    reference_dir = None  # output tree to diff output_dir against (None to skip)
+    data_dir = Path(
+        "data"
+    )  # location of data, looks for "county_population_data.csv" and "ev_extra_loads.csv"
+    cache_dir = input_dir / ".cache"  # location of parsed input files (None to disable)
+    scaling_factor = 1.018  # annual load growth outputs were generated with
+    targets_file = None  # energy and peak targets outputs were generated with (None if not used)
+
+    # load files of base (and intermediate) years, for checking energy
+    load_files = {
+        str(year): input_dir / f"{year}_ercot_hourly_load_data.xls"
+        for year in range(2002, 2015)
+    }
+    load_files.update({"2015": input_dir / "native_load_2015.xls"})
+    load_files.update(
+        {
+            str(year): input_dir / f"native_Load_{year}.xlsx"
+            for year in range(2016, 2018)
+        }
+    )
+    load_files.update(
+        {
+            str(year): input_dir / f"Native_Load_{year}.xlsx"
+            for year in range(2018, 2021)
+        }
+    )
+    load_files.update({"2021": input_dir / "Native_Load_2021_NOShed.xlsx"})
+
+    ###### END OPTIONS ######
+    results = verify_tree(
+        output_dir,
+        data_dir=data_dir,
+        load_files=load_files,
+        scaling_factor=scaling_factor,
+        cache_dir=cache_dir,
+        targets=read_targets(targets_file) if targets_file else None,
+    )
+    failed = results[~results["ok"]]
+    print(f"{len(results) - len(failed)} of {len(results)} outputs passed")
+    if len(failed):
+        print(failed.to_string(index=False))
+
+    if reference_dir is not None:
+        differences = diff_trees(reference_dir, output_dir)
+        print(differences["status"].value_counts().to_string())
+        print(differences[differences["status"] == "different"].to_string(index=False))